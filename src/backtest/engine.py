@@ -0,0 +1,303 @@
+"""
+Backtest vectorizado de la estrategia de la caja sobre el caché parquet.
+
+Para cada día y símbolo calcula la caja, el filtro de amplitud, el primer
+cierre de 5 min fuera de la caja y el resultado de las dos órdenes que
+coloca `StrategyAi.ejecutar_ordenes`:
+    orden 1: mitad del volumen, SL en el lado opuesto de la caja, TP = 1 amplitud
+    orden 2: mitad del volumen, mismo SL, sin TP (runner hasta el cierre)
+
+Todo se resuelve con operaciones de arrays sobre la serie completa (sin
+bucles por día). No necesita acceso a la API.
+
+Las velas del caché (TIMEFRAME, 1 min por defecto) se agregan a velas de
+5 min antes del cálculo: el monitor en vivo detecta el breakout sobre
+velas de 5 min (breakout_monitor._fetch_5min).
+
+Supuestos:
+    - La dirección sigue al breakout (ABOVE → LONG, BELOW → SHORT); no se
+      modela la decisión de la IA.
+    - La orden pendiente se llena en el borde de la caja al cierre de la
+      vela de señal.
+    - Si SL y TP se tocan en la misma vela, cuenta el SL (conservador).
+    - Horas en UTC, como BOX_START/BOX_END; por defecto los mismos valores
+      que preprocess_data.
+
+Uso:
+    backtest --symbols US500,US100 --from 2024-01-01 --to 2025-12-31
+"""
+
+import os
+import argparse
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from preprocess.process_pipeline import (
+    DATA_LOADER_PATH, DEFAULT_BOX_START, DEFAULT_BOX_END, MAX_AMPLITUD,
+)
+from preprocess.breakout_monitor import MONITOR_WINDOW
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+RESULTS_PATH = os.path.join(DATA_LOADER_PATH, "backtest")
+# Velas del monitor en vivo (breakout_monitor._fetch_5min)
+BAR_SECONDS = 300
+
+_NO_ROW = np.iinfo(np.int64).max
+_OHLC = ("time", "open", "high", "low", "close")
+
+
+@dataclass(frozen=True)
+class BacktestParams:
+    box_start: str = DEFAULT_BOX_START
+    box_end: str = DEFAULT_BOX_END
+    max_amplitud: float = MAX_AMPLITUD          # % — corte de preprocess_data
+    window_seconds: int = MONITOR_WINDOW        # ventana de monitoreo post caja
+    exit_hour: str | None = None       # cierre del runner ("HH:MM"); None = última vela del día
+
+
+def _hhmm(value: str) -> int:
+    """ "HH:MM" → segundos desde medianoche."""
+    hh, mm = value.strip()[:5].split(":")
+    return int(hh) * 3600 + int(mm) * 60
+
+
+def _first_per_day(mask: np.ndarray, day_idx: np.ndarray, n_days: int) -> np.ndarray:
+    """Fila de la primera coincidencia de `mask` por día (_NO_ROW si no hay)."""
+    out = np.full(n_days, _NO_ROW, dtype=np.int64)
+    rows = np.flatnonzero(mask)
+    if rows.size:
+        days, pos = np.unique(day_idx[rows], return_index=True)
+        out[days] = rows[pos]
+    return out
+
+
+def backtest_arrays(
+    t: np.ndarray, o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray,
+    params: BacktestParams,
+) -> dict[str, np.ndarray]:
+    """
+    Núcleo del backtest sobre arrays de velas ordenadas por `t` (unix s).
+    Retorna columnas por día (una fila por día con datos).
+    """
+    t = np.asarray(t, dtype=np.int64)
+    rows = np.arange(t.size, dtype=np.int64)
+    day = t // 86400
+    sod = t - day * 86400
+    days, day_idx = np.unique(day, return_inverse=True)
+    n = days.size
+
+    bs, be = _hhmm(params.box_start), _hhmm(params.box_end)
+    exit_s = _hhmm(params.exit_hour) if params.exit_hour else 86400
+
+    # ── Caja y amplitud ────────────────────────────────────────────────
+    in_box = (sod >= bs) & (sod <= be)
+    box_high = np.full(n, -np.inf)
+    box_low = np.full(n, np.inf)
+    np.maximum.at(box_high, day_idx[in_box], h[in_box])
+    np.minimum.at(box_low, day_idx[in_box], l[in_box])
+    has_box = np.isfinite(box_high) & np.isfinite(box_low) & (box_low > 0)
+
+    amplitud = np.full(n, np.nan)
+    amplitud[has_box] = np.round(
+        (box_high[has_box] - box_low[has_box]) / box_low[has_box] * 100, 2
+    )
+    tradeable = has_box & (amplitud <= params.max_amplitud)
+
+    # ── Primer cierre fuera de la caja en la ventana de monitoreo ──────
+    bh_r, bl_r = box_high[day_idx], box_low[day_idx]
+    in_win = (sod > be) & (sod <= be + params.window_seconds) & tradeable[day_idx]
+    above = in_win & (c > bh_r)
+    below = in_win & (c < bl_r)
+    signal_row = _first_per_day(above | below, day_idx, n)
+    has_signal = signal_row != _NO_ROW
+
+    direction = np.zeros(n, dtype=np.int8)
+    direction[has_signal] = np.where(above[signal_row[has_signal]], 1, -1)
+
+    amp_pts = np.where(has_signal, box_high - box_low, np.nan)
+    entry = np.where(direction == 1, box_high, np.where(direction == -1, box_low, np.nan))
+    stop = np.where(direction == 1, box_low, np.where(direction == -1, box_high, np.nan))
+    tp = entry + direction * amp_pts
+
+    # ── Trayectoria posterior a la señal (mismo día, hasta exit_hour) ──
+    sig_r = signal_row[day_idx]
+    dir_r = direction[day_idx]
+    after = has_signal[day_idx] & (rows > sig_r) & (sod <= exit_s)
+    sl_hit = after & np.where(dir_r == 1, l <= stop[day_idx], h >= stop[day_idx])
+    tp_hit = after & np.where(dir_r == 1, h >= tp[day_idx], l <= tp[day_idx])
+    first_sl = _first_per_day(sl_hit, day_idx, n)
+    first_tp = _first_per_day(tp_hit, day_idx, n)
+
+    last_row = np.where(has_signal, signal_row, -1)
+    np.maximum.at(last_row, day_idx[after], rows[after])
+    eod_close = np.where(has_signal, c[np.clip(last_row, 0, None)], np.nan)
+    eod_pnl = (eod_close - entry) * direction
+
+    # Orden 1: TP antes que SL → +amp; SL (incluida misma vela) → -amp; si no, cierre
+    leg1_tp = has_signal & (first_tp < first_sl)
+    leg1_sl = has_signal & (first_sl != _NO_ROW) & ~leg1_tp
+    leg1_pnl = np.where(leg1_tp, amp_pts, np.where(leg1_sl, -amp_pts, eod_pnl))
+    leg1_exit = np.where(leg1_tp, "TP", np.where(leg1_sl, "SL", "EOD"))
+
+    # Orden 2 (runner): SL o cierre
+    leg2_sl = has_signal & (first_sl != _NO_ROW)
+    leg2_pnl = np.where(leg2_sl, -amp_pts, eod_pnl)
+    leg2_exit = np.where(leg2_sl, "SL", "EOD")
+
+    pnl_pts = (leg1_pnl + leg2_pnl) / 2      # cada orden lleva la mitad del volumen
+    signal_time = np.where(has_signal, t[np.clip(signal_row, 0, t.size - 1)], -1)
+
+    return {
+        "day": days * 86400,
+        "box_high": np.where(has_box, box_high, np.nan),
+        "box_low": np.where(has_box, box_low, np.nan),
+        "amplitud": amplitud,
+        "tradeable": tradeable,
+        "signal": np.where(direction == 1, "ABOVE", np.where(direction == -1, "BELOW", "NONE")),
+        "signal_time": signal_time,
+        "entry": entry,
+        "stop": stop,
+        "tp": tp,
+        "leg1_exit": np.where(has_signal, leg1_exit, ""),
+        "leg1_pnl": np.where(has_signal, leg1_pnl, np.nan),
+        "leg2_exit": np.where(has_signal, leg2_exit, ""),
+        "leg2_pnl": np.where(has_signal, leg2_pnl, np.nan),
+        "pnl_pts": np.where(has_signal, pnl_pts, np.nan),
+        "pnl_pct": np.where(has_signal, pnl_pts / entry * 100, np.nan),
+    }
+
+
+def resample_ohlc(df: pd.DataFrame, seconds: int = BAR_SECONDS) -> pd.DataFrame:
+    """
+    Agrega velas ordenadas y sin duplicados a velas de `seconds` (apertura
+    alineada a múltiplos de `seconds`, como las de Capital.com). El tamaño
+    de origen se deduce de los datos; si ya es `seconds` se retorna `df`.
+    """
+    t = df["time"].to_numpy(np.int64)
+    step = int(np.diff(t).min()) if t.size > 1 else seconds
+    if step == seconds:
+        return df
+    if step > seconds or seconds % step:
+        raise ValueError(f"No se pueden armar velas de {seconds}s desde velas de {step}s")
+    bucket = t // seconds * seconds
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], t.size] - 1
+    return pd.DataFrame({
+        "time": bucket[starts],
+        "open": df["open"].to_numpy(float)[starts],
+        "high": np.maximum.reduceat(df["high"].to_numpy(float), starts),
+        "low": np.minimum.reduceat(df["low"].to_numpy(float), starts),
+        "close": df["close"].to_numpy(float)[ends],
+    })
+
+
+def load_candles(symbol: str, start: int | None = None, end: int | None = None,
+                 path: str = DATA_LOADER_PATH, bar_seconds: int | None = BAR_SECONDS) -> pd.DataFrame:
+    """
+    Velas OHLC del parquet del símbolo, ordenadas y sin duplicados, agregadas
+    a velas de `bar_seconds` (None = las del caché tal cual).
+    """
+    file = os.path.join(path, f"{symbol}.parquet")
+    if not os.path.exists(file):
+        raise FileNotFoundError(f"Sin caché parquet para {symbol}: {file}")
+    filters = []
+    if start is not None:
+        filters.append(("time", ">=", start))
+    if end is not None:
+        filters.append(("time", "<=", end))
+    df = pd.read_parquet(file, engine="pyarrow", columns=list(_OHLC), filters=filters or None)
+    df = df.drop_duplicates(subset=["time"]).sort_values("time").reset_index(drop=True)
+    return resample_ohlc(df, bar_seconds) if bar_seconds else df
+
+
+def backtest_symbol(symbol: str, params: BacktestParams, start: int | None = None,
+                    end: int | None = None, path: str = DATA_LOADER_PATH) -> pd.DataFrame:
+    df = load_candles(symbol, start, end, path)
+    cols = backtest_arrays(
+        df["time"].to_numpy(), df["open"].to_numpy(float), df["high"].to_numpy(float),
+        df["low"].to_numpy(float), df["close"].to_numpy(float), params,
+    )
+    out = pd.DataFrame(cols)
+    out.insert(0, "symbol", symbol)
+    out["date"] = pd.to_datetime(out.pop("day"), unit="s", utc=True).dt.strftime("%Y-%m-%d")
+    return out
+
+
+def run_backtest(symbols: list[str], params: BacktestParams | None = None,
+                 start: int | None = None, end: int | None = None,
+                 path: str = DATA_LOADER_PATH) -> pd.DataFrame:
+    """Backtest de varios símbolos; tabla con una fila por símbolo y día."""
+    params = params or BacktestParams()
+    frames = [backtest_symbol(s, params, start, end, path) for s in symbols]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def summarize(results: pd.DataFrame) -> dict:
+    """Métricas agregadas de una tabla de resultados."""
+    trades = results[results["signal"] != "NONE"]
+    wins = trades["pnl_pts"] > 0
+    gross_win = trades.loc[wins, "pnl_pct"].sum()
+    gross_loss = -trades.loc[~wins, "pnl_pct"].sum()
+    return {
+        "days": int(len(results)),
+        "tradeable_days": int(results["tradeable"].sum()),
+        "trades": int(len(trades)),
+        "win_rate": round(float(wins.mean()) * 100, 2) if len(trades) else None,
+        "pnl_pct": round(float(trades["pnl_pct"].sum()), 4),
+        "avg_pnl_pct": round(float(trades["pnl_pct"].mean()), 4) if len(trades) else None,
+        "profit_factor": round(float(gross_win / gross_loss), 3) if gross_loss > 0 else None,
+    }
+
+
+def save_results(results: pd.DataFrame, name: str | None = None) -> str:
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    name = name or datetime.now(timezone.utc).strftime("results_%Y%m%dT%H%M%S")
+    file = os.path.join(RESULTS_PATH, f"{name}.parquet")
+    results.to_parquet(file, engine="pyarrow", index=False)
+    return file
+
+
+def _parse_date(value: str | None, end_of_day: bool = False) -> int | None:
+    if not value:
+        return None
+    ts = int(pd.Timestamp(value, tz="UTC").timestamp())
+    # "--to 2025-12-31" incluye todo ese día
+    return ts + 86399 if end_of_day and len(value) == 10 else ts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest vectorizado de la estrategia de la caja")
+    parser.add_argument("--symbols", default=os.getenv("SYMBOLS", "US500"))
+    parser.add_argument("--from", dest="start", default=None, help="YYYY-MM-DD (UTC)")
+    parser.add_argument("--to", dest="end", default=None, help="YYYY-MM-DD (UTC)")
+    parser.add_argument("--box-start", default=BacktestParams.box_start)
+    parser.add_argument("--box-end", default=BacktestParams.box_end)
+    parser.add_argument("--max-amplitud", type=float, default=BacktestParams.max_amplitud)
+    parser.add_argument("--window", type=int, default=BacktestParams.window_seconds,
+                        help="ventana de monitoreo en segundos")
+    parser.add_argument("--exit-hour", default=None)
+    parser.add_argument("--out", default=None, help="nombre del parquet de resultados")
+    args = parser.parse_args()
+
+    params = BacktestParams(
+        box_start=args.box_start, box_end=args.box_end,
+        max_amplitud=args.max_amplitud, window_seconds=args.window,
+        exit_hour=args.exit_hour,
+    )
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+    results = run_backtest(symbols, params, _parse_date(args.start), _parse_date(args.end, end_of_day=True))
+    file = save_results(results, args.out)
+
+    log.info("[backtest] %s | %s", symbols, asdict(params))
+    for sym, df_sym in results.groupby("symbol"):
+        log.info("[backtest] %s: %s", sym, summarize(df_sym))
+    log.info("[backtest] resultados -> %s", file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Replay acelerado del modo LIVE de `monitor_breakout`.
+
+Conduce velas de 5 min grabadas (el caché parquet agregado a 5 min con
+backtest.engine.resample_ohlc) a través del bucle live real —polling,
+puntero `last_checked`, renovación de token— con un reloj virtual que
+avanza `speed` veces más rápido que el real. `price_capital`
+y el login se sustituyen por dobles locales que solo devuelven velas ya
+cerradas en el instante virtual, así que no hay llamadas a la API.
+
+Por cada día reporta la latencia de detección (cierre de la vela de señal
+→ detección), peticiones por sesión, renovaciones de token y si la señal
+coincide con la del backtest vectorizado.
+
+Uso:
+    monitor_replay --symbols US500 --from 2025-01-01 --to 2025-06-30 --speed 10000
+    monitor_replay --symbols US500,US100 --speed 0 --workers 8   # sin esperas reales
+"""
+
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+
+import numpy as np
+import pandas as pd
+
+from backtest.engine import (
+    BAR_SECONDS, BacktestParams, DATA_LOADER_PATH, backtest_arrays, load_candles, save_results,
+    _parse_date, _hhmm,
+)
+from preprocess.breakout_monitor import monitor_breakout
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+# Velas que sirve el doble de price_capital: las de 5 min que pide el monitor
+CANDLE_SECONDS = BAR_SECONDS
+
+
+class ReplayClock:
+    """
+    Reloj virtual. `sleep(s)` avanza `s` segundos virtuales y duerme
+    `s / speed` reales (speed <= 0: sin espera real).
+    """
+
+    def __init__(self, start: int, speed: float = 1000.0):
+        self.t = float(start)
+        self.speed = speed
+
+    def now(self) -> int:
+        return int(self.t)
+
+    def advance(self, seconds: float):
+        self.t += seconds
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+        if self.speed > 0:
+            time.sleep(seconds / self.speed)
+
+
+class RecordedFeed:
+    """
+    Doble de `price_capital` + login sobre velas grabadas. Solo entrega
+    velas cerradas en el instante virtual (apertura + 5 min <= reloj).
+    """
+
+    def __init__(self, candles: pd.DataFrame, clock: ReplayClock, api_latency: float = 0.0):
+        self.candles = candles
+        self._t = candles["time"].to_numpy(np.int64)
+        self.clock = clock
+        self.api_latency = api_latency
+        self.requests = 0
+        self.empty = 0
+        self.logins = 0
+        self.refreshes = 0
+
+    def fetch(self, symbol: str, from_unix: int, to_unix: int, sec_token: str, cst: str):
+        self.requests += 1
+        self.clock.advance(self.api_latency)
+        closed_until = self.clock.now() - CANDLE_SECONDS
+        lo = np.searchsorted(self._t, from_unix, side="left")
+        hi = np.searchsorted(self._t, min(to_unix, closed_until), side="right")
+        if hi <= lo:
+            self.empty += 1
+            return None
+        return self.candles.iloc[lo:hi].reset_index(drop=True)
+
+    def login(self, refresh: bool = False):
+        self.logins += 1
+        self.refreshes += int(refresh)
+        return "replay-token", "replay-cst"
+
+
+@dataclass
+class ReplayDay:
+    symbol: str
+    date: str
+    box_high: float
+    box_low: float
+    signal: str
+    signal_time: int
+    expected_signal: str
+    expected_time: int
+    match: bool
+    detected_at: int
+    latency_s: float
+    requests: int
+    empty_responses: int
+    logins: int
+    token_refreshes: int
+    virtual_s: int
+    wall_s: float
+
+
+def replay_day(symbol: str, candles: pd.DataFrame, box_high: float, box_low: float,
+               box_end_unix: int, window_seconds: int, expected: tuple[str, int],
+               speed: float = 1000.0, poll_interval: int = 60, start_delay: int = CANDLE_SECONDS,
+               api_latency: float = 0.0) -> ReplayDay:
+    """
+    Ejecuta el bucle live de un día. El reloj arranca `start_delay`
+    segundos después de la apertura de la última vela de la caja.
+    """
+    start = box_end_unix + start_delay
+    clock = ReplayClock(start, speed)
+    feed = RecordedFeed(candles, clock, api_latency)
+
+    t0 = time.perf_counter()
+    result = monitor_breakout(
+        symbol, box_high, box_low, box_end_unix,
+        window_seconds=window_seconds, poll_interval=poll_interval,
+        clock=clock.now, sleep=clock.sleep, fetch=feed.fetch, login=feed.login,
+    )
+    wall_s = time.perf_counter() - t0
+
+    detected_at = clock.now() if result else -1
+    signal = result["breakout_state"] if result else "NONE"
+    signal_time = int(result["signal_time"]) if result else -1
+    latency = detected_at - (signal_time + CANDLE_SECONDS) if result else np.nan
+    return ReplayDay(
+        symbol=symbol,
+        date=pd.Timestamp(box_end_unix, unit="s", tz="UTC").strftime("%Y-%m-%d"),
+        box_high=box_high, box_low=box_low,
+        signal=signal, signal_time=signal_time,
+        expected_signal=expected[0], expected_time=expected[1],
+        match=(signal, signal_time) == expected,
+        detected_at=detected_at, latency_s=latency,
+        requests=feed.requests, empty_responses=feed.empty,
+        logins=feed.logins, token_refreshes=feed.refreshes,
+        virtual_s=clock.now() - start, wall_s=round(wall_s, 4),
+    )
+
+
+def replay_symbol(symbol: str, params: BacktestParams, start: int | None = None,
+                  end: int | None = None, workers: int = 4, path: str = DATA_LOADER_PATH,
+                  **kwargs) -> list[ReplayDay]:
+    """Replay de todos los días operables de `symbol` (filtro de amplitud incluido)."""
+    df = load_candles(symbol, start, end, path, bar_seconds=CANDLE_SECONDS)
+    cols = backtest_arrays(
+        df["time"].to_numpy(), df["open"].to_numpy(float), df["high"].to_numpy(float),
+        df["low"].to_numpy(float), df["close"].to_numpy(float), params,
+    )
+    be = _hhmm(params.box_end)
+    days = np.flatnonzero(cols["tradeable"])
+    log.info("[replay] %s: %d días operables de %d", symbol, days.size, cols["day"].size)
+
+    t = df["time"].to_numpy(np.int64)
+
+    def _one(i: int) -> ReplayDay:
+        box_end_unix = int(cols["day"][i]) + be
+        lo = np.searchsorted(t, box_end_unix, side="left")
+        hi = np.searchsorted(t, box_end_unix + params.window_seconds, side="right")
+        window = df.iloc[lo:hi].reset_index(drop=True)
+        expected = (str(cols["signal"][i]), int(cols["signal_time"][i]))
+        return replay_day(symbol, window, float(cols["box_high"][i]), float(cols["box_low"][i]),
+                          box_end_unix, params.window_seconds, expected, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="replay") as pool:
+        return list(pool.map(_one, days))
+
+
+def summarize_replay(table: pd.DataFrame) -> dict:
+    hits = table[table["signal"] != "NONE"]
+    lat = hits["latency_s"]
+    return {
+        "days": int(len(table)),
+        "signals": int(len(hits)),
+        "mismatches": int((~table["match"]).sum()),
+        "latency_mean_s": round(float(lat.mean()), 1) if len(hits) else None,
+        "latency_p50_s": round(float(lat.quantile(0.5)), 1) if len(hits) else None,
+        "latency_p95_s": round(float(lat.quantile(0.95)), 1) if len(hits) else None,
+        "latency_max_s": round(float(lat.max()), 1) if len(hits) else None,
+        "requests_per_session": round(float(table["requests"].mean()), 1) if len(table) else None,
+        "empty_ratio": round(float(table["empty_responses"].sum() / max(table["requests"].sum(), 1)), 3),
+        "token_refreshes": int(table["token_refreshes"].sum()),
+        "wall_s": round(float(table["wall_s"].sum()), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay acelerado del monitor de breakout (modo live)")
+    parser.add_argument("--symbols", default=os.getenv("SYMBOLS", "US500"))
+    parser.add_argument("--from", dest="start", default=None, help="YYYY-MM-DD (UTC)")
+    parser.add_argument("--to", dest="end", default=None, help="YYYY-MM-DD (UTC)")
+    parser.add_argument("--box-start", default=BacktestParams.box_start)
+    parser.add_argument("--box-end", default=BacktestParams.box_end)
+    parser.add_argument("--max-amplitud", type=float, default=BacktestParams.max_amplitud)
+    parser.add_argument("--window", type=int, default=BacktestParams.window_seconds)
+    parser.add_argument("--speed", type=float, default=1000.0,
+                        help="factor de aceleración del reloj (0 = sin esperas reales)")
+    parser.add_argument("--poll", type=int, default=60, help="poll_interval del monitor (s)")
+    parser.add_argument("--start-delay", type=int, default=CANDLE_SECONDS,
+                        help="segundos tras la apertura de la última vela de la caja")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="latencia virtual por petición (s)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--out", default=None, help="nombre del parquet de resultados")
+    args = parser.parse_args()
+
+    params = BacktestParams(box_start=args.box_start, box_end=args.box_end,
+                            max_amplitud=args.max_amplitud, window_seconds=args.window)
+    start, end = _parse_date(args.start), _parse_date(args.end, end_of_day=True)
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+
+    rows = []
+    for symbol in symbols:
+        days = replay_symbol(symbol, params, start, end, workers=args.workers,
+                             speed=args.speed, poll_interval=args.poll,
+                             start_delay=args.start_delay, api_latency=args.api_latency)
+        rows.extend(asdict(d) for d in days)
+    table = pd.DataFrame(rows)
+    if table.empty:
+        log.warning("[replay] sin días operables en el rango")
+        return
+
+    file = save_results(table, args.out or f"monitor_replay_{int(time.time())}")
+    for sym, df_sym in table.groupby("symbol"):
+        log.info("[replay] %s: %s", sym, summarize_replay(df_sym))
+    log.info("[replay] resultados -> %s", file)
+
+
+if __name__ == "__main__":
+    main()
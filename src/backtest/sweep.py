@@ -0,0 +1,151 @@
+"""
+Búsqueda de parámetros (grid / aleatoria) sobre el backtest vectorizado.
+
+Evalúa combinaciones de ventana de caja, amplitud máxima y ventana de
+monitoreo sobre el histórico cacheado con un pool de procesos. Las velas
+se cargan una vez y se comparten por memoria compartida (utils.shm): cada
+tarea solo recibe los parámetros.
+
+Uso:
+    sweep --symbols US500 --box-start 13:00,13:30 --box-end 14:25,14:55 \\
+          --max-amplitud 0.5,0.75,1.0 --window 3600,7200 --workers 8
+    sweep --symbols US100 --random 200 ...      # muestreo aleatorio del grid
+"""
+
+import os
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from backtest.engine import (
+    BacktestParams, RESULTS_PATH, backtest_arrays, load_candles, summarize, _parse_date,
+)
+from utils.logger import get_logger
+from utils.shm import share_arrays, attach_arrays, release
+
+log = get_logger(__name__)
+
+_COLUMNS = ("time", "open", "high", "low", "close")
+
+# Estado por worker: {símbolo: {columna: vista np}} + bloques abiertos
+_WORKER_ARRAYS: dict = {}
+_WORKER_BLOCKS: list = []
+
+
+def grid(space: dict[str, list]) -> list[BacktestParams]:
+    """Producto cartesiano de los valores de cada parámetro."""
+    keys = list(space)
+    return [BacktestParams(**dict(zip(keys, values)))
+            for values in itertools.product(*(space[k] for k in keys))]
+
+
+def random_search(space: dict[str, list], n: int, seed: int = 0) -> list[BacktestParams]:
+    """`n` combinaciones distintas muestreadas del grid."""
+    combos = grid(space)
+    if n >= len(combos):
+        return combos
+    return random.Random(seed).sample(combos, n)
+
+
+def _init_worker(handles: dict):
+    global _WORKER_ARRAYS, _WORKER_BLOCKS
+    for symbol, sym_handles in handles.items():
+        arrays, blocks = attach_arrays(sym_handles)
+        _WORKER_ARRAYS[symbol] = arrays
+        _WORKER_BLOCKS.extend(blocks)
+
+
+def _evaluate(params: BacktestParams) -> dict:
+    frames = []
+    for symbol, a in _WORKER_ARRAYS.items():
+        cols = backtest_arrays(a["time"], a["open"], a["high"], a["low"], a["close"], params)
+        df = pd.DataFrame(cols)
+        df["symbol"] = symbol
+        frames.append(df)
+    results = pd.concat(frames, ignore_index=True)
+    row = asdict(params)
+    row.update(summarize(results))
+    return row
+
+
+def run_sweep(symbols: list[str], combos: list[BacktestParams], workers: int | None = None,
+              start: int | None = None, end: int | None = None,
+              rank_by: str = "pnl_pct") -> pd.DataFrame:
+    """Evalúa `combos` en paralelo y retorna la tabla ordenada por `rank_by`."""
+    handles, blocks = {}, []
+    try:
+        for symbol in symbols:
+            df = load_candles(symbol, start, end)
+            sym_handles, sym_blocks = share_arrays({
+                "time": df["time"].to_numpy("int64"),
+                **{c: df[c].to_numpy("float64") for c in _COLUMNS[1:]},
+            })
+            handles[symbol] = sym_handles
+            blocks.extend(sym_blocks)
+            log.info("[sweep] %s: %d velas en memoria compartida", symbol, len(df))
+
+        workers = workers or os.cpu_count() or 1
+        log.info("[sweep] evaluando %d combinaciones con %d procesos", len(combos), workers)
+        chunksize = max(1, len(combos) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(handles,)) as pool:
+            rows = list(pool.map(_evaluate, combos, chunksize=chunksize))
+    finally:
+        release(blocks)
+
+    table = pd.DataFrame(rows)
+    return table.sort_values(rank_by, ascending=False, na_position="last").reset_index(drop=True)
+
+
+def _split(value: str, cast=str) -> list:
+    return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+def main():
+    defaults = BacktestParams()
+    parser = argparse.ArgumentParser(description="Búsqueda de parámetros del backtest de la caja")
+    parser.add_argument("--symbols", default=os.getenv("SYMBOLS", "US500"))
+    parser.add_argument("--from", dest="start", default=None, help="YYYY-MM-DD (UTC)")
+    parser.add_argument("--to", dest="end", default=None, help="YYYY-MM-DD (UTC)")
+    parser.add_argument("--box-start", default=defaults.box_start, help="lista HH:MM separada por comas")
+    parser.add_argument("--box-end", default=defaults.box_end, help="lista HH:MM separada por comas")
+    parser.add_argument("--max-amplitud", default=str(defaults.max_amplitud), help="lista de % separada por comas")
+    parser.add_argument("--window", default=str(defaults.window_seconds), help="lista de segundos separada por comas")
+    parser.add_argument("--random", type=int, default=0, help="N combinaciones aleatorias (0 = grid completo)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rank-by", default="pnl_pct",
+                        choices=["pnl_pct", "avg_pnl_pct", "win_rate", "profit_factor"])
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    space = {
+        "box_start": _split(args.box_start),
+        "box_end": _split(args.box_end),
+        "max_amplitud": _split(args.max_amplitud, float),
+        "window_seconds": _split(args.window, int),
+    }
+    combos = random_search(space, args.random, args.seed) if args.random else grid(space)
+    symbols = _split(args.symbols)
+
+    table = run_sweep(symbols, combos, args.workers,
+                      _parse_date(args.start), _parse_date(args.end, end_of_day=True),
+                      rank_by=args.rank_by)
+
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    file = os.path.join(RESULTS_PATH, datetime.now(timezone.utc).strftime("sweep_%Y%m%dT%H%M%S.parquet"))
+    table.to_parquet(file, engine="pyarrow", index=False)
+
+    log.info("[sweep] top %d por %s:", args.top, args.rank_by)
+    for line in table.head(args.top).to_string(index=False).splitlines():
+        log.info("[sweep] %s", line)
+    log.info("[sweep] tabla completa -> %s", file)
+
+
+if __name__ == "__main__":
+    main()
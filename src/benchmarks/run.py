@@ -0,0 +1,313 @@
+"""
+Micro-benchmarks de los kernels de datos y features.
+
+Mide tiempo (min / mediana de varias repeticiones) y pico de memoria
+(tracemalloc, corrida aparte) de cada kernel sobre velas sintéticas de
+varios tamaños. El resultado es JSON y puede compararse con un baseline
+guardado: una mediana por encima de baseline × (1 + tolerancia) es una
+regresión y el proceso termina con código 1 (apto para CI).
+
+Kernels cuyo import falla (ej. pandas_ta ausente) se reportan como
+"skipped" en vez de abortar la suite.
+
+Uso:
+    bench                                        # tamaños por defecto
+    bench --bars 10000,100000,1000000 --kernels build_vp_ohlc,standar_data
+    bench --save-baseline                        # guarda src/benchmarks/baseline.json
+    bench --baseline src/benchmarks/baseline.json --tolerance 0.25
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import logging
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), "..", "data_loader", "benchmarks")
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_BARS = "10000,100000"
+# Ignorar diferencias en kernels más rápidos que esto (ruido del reloj)
+NOISE_FLOOR_S = 0.001
+
+
+@dataclass
+class BenchResult:
+    kernel: str
+    bars: int
+    status: str                 # ok | skipped | error
+    runs: int = 0
+    min_s: float | None = None
+    median_s: float | None = None
+    peak_mb: float | None = None
+    detail: str = ""
+
+
+# ── Kernels ────────────────────────────────────────────────────────────
+# Cada setup recibe las velas y un directorio temporal y retorna la
+# función a medir (sin argumentos). Los imports van dentro para que un
+# módulo no disponible solo salte su kernel.
+
+def _setup_standar_data(df, tmp):
+    from tools_bot.standar_data import standar_data
+    raw = synthetic.capital_prices(df)
+    return lambda: standar_data(raw)
+
+
+def _setup_merge(df, tmp):
+    from preprocess.process_pipeline import merge_and_deduplicate
+    old, new = synthetic.overlapping_chunks(df)
+    return lambda: merge_and_deduplicate(old, new)
+
+
+def _setup_save_parquet(df, tmp):
+    from preprocess.process_pipeline import save_parquet
+    return lambda: save_parquet(df, "BENCH", tmp)
+
+
+def _setup_loader_file(df, tmp):
+    from preprocess import process_pipeline as pp
+    pp.save_parquet(df, "BENCH", tmp)
+    start, end = int(df["time"].iloc[0]), int(df["time"].iloc[-1])
+
+    def run():
+        pp._frame_cache.clear()          # medir la lectura del parquet, no el caché en memoria
+        return pp.loader_file("BENCH", start, end, tmp)
+    return run
+
+
+def _setup_rsi_pivots(df, tmp):
+    from tools_bot.utils_trading_rsi import rsi
+    from preprocess.process_pipeline import rsi_pivots
+    return lambda: rsi_pivots(df, rsi(df))
+
+
+def _setup_box(df, tmp):
+    from tools_bot.box import box_strategy
+    mid = int(df["time"].iloc[len(df) // 2])
+    return lambda: box_strategy(df, mid, mid + 7200)
+
+
+def _setup_build_vp(df, tmp):
+    from tools_bot.utils_trading_vp import build_vp_ohlc
+    return lambda: build_vp_ohlc(df)
+
+
+def _setup_build_vp_stream(df, tmp):
+    from tools_bot.utils_trading_vp import build_vp_stream
+    return lambda: build_vp_stream(lambda: (df.iloc[i:i + 65536] for i in range(0, len(df), 65536)))
+
+
+def _setup_value_area(df, tmp):
+    from tools_bot.utils_trading_vp import build_vp_ohlc, value_area
+    centers, vp = build_vp_ohlc(df)
+    return lambda: value_area(centers, vp)
+
+
+def _setup_find_peaks(df, tmp):
+    from tools_bot.utils_trading_vp import build_vp_ohlc, find_peaks_simple
+    centers, vp = build_vp_ohlc(df)
+    return lambda: find_peaks_simple(centers, vp)
+
+
+def _setup_check_candles(df, tmp):
+    from preprocess.breakout_monitor import _check_candles
+    # Caja que contiene todo: peor caso, recorre todas las velas
+    hi, lo = float(df["high"].max()) + 1, float(df["low"].min()) - 1
+    return lambda: _check_candles(df, hi, lo)
+
+
+def _setup_panel_screen(df, tmp):
+    from tools_bot import panel
+    # Universo de 50 símbolos con las mismas velas escaladas
+    frames = {f"S{k}": df.assign(**{c: df[c] * (1 + k / 100) for c in ("open", "high", "low", "close")})
+              for k in range(50)}
+    mid = int(df["time"].iloc[len(df) // 2])
+
+    def run():
+        return panel.screen(panel.align(frames), mid, mid + 7200)
+    return run
+
+
+# nombre -> (setup, máximo de velas por defecto; None = sin límite)
+KERNELS: dict[str, tuple[Callable, int | None]] = {
+    "standar_data": (_setup_standar_data, None),
+    "merge_and_deduplicate": (_setup_merge, None),
+    "save_parquet": (_setup_save_parquet, None),
+    "loader_file": (_setup_loader_file, None),
+    "rsi_pivots": (_setup_rsi_pivots, 200_000),
+    "box_strategy": (_setup_box, None),
+    "build_vp_ohlc": (_setup_build_vp, None),
+    "build_vp_stream": (_setup_build_vp_stream, None),
+    "value_area": (_setup_value_area, 200_000),
+    "find_peaks_simple": (_setup_find_peaks, 200_000),
+    "_check_candles": (_setup_check_candles, 200_000),
+    "panel_screen": (_setup_panel_screen, 20_000),
+}
+
+
+# ── Medición ───────────────────────────────────────────────────────────
+
+def _time(fn: Callable, repeat: int, budget_s: float) -> list[float]:
+    """Al menos 3 corridas (o `repeat` si es menor) y hasta `repeat` mientras quede presupuesto."""
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeat:
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+        if len(times) >= min(3, repeat) and time.perf_counter() - started > budget_s:
+            break
+    return times
+
+
+def _peak_mb(fn: Callable) -> float:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 2**20, 3)
+
+
+def bench_kernel(name: str, df: pd.DataFrame, repeat: int = 5, budget_s: float = 2.0,
+                 memory: bool = True) -> BenchResult:
+    setup, _ = KERNELS[name]
+    tmp = tempfile.mkdtemp(prefix="bench_")
+    try:
+        try:
+            fn = setup(df, tmp)
+        except ImportError as e:
+            return BenchResult(name, len(df), "skipped", detail=f"import: {e}")
+        try:
+            times = _time(fn, repeat, budget_s)
+            peak = _peak_mb(fn) if memory else None
+        except Exception as e:
+            log.error("[bench] %s (%d velas) falló → %s", name, len(df), e, exc_info=True)
+            return BenchResult(name, len(df), "error", detail=repr(e))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return BenchResult(name, len(df), "ok", runs=len(times), min_s=round(min(times), 6),
+                       median_s=round(float(np.median(times)), 6), peak_mb=peak)
+
+
+def run_suite(bars: list[int], kernels: list[str] | None = None, repeat: int = 5,
+              budget_s: float = 2.0, no_limit: bool = False, memory: bool = True,
+              seed: int = 0) -> dict:
+    kernels = kernels or list(KERNELS)
+    results = []
+    for n in bars:
+        df = synthetic.ohlcv(n, seed=seed)
+        for name in kernels:
+            limit = KERNELS[name][1]
+            if limit and n > limit and not no_limit:
+                results.append(BenchResult(name, n, "skipped", detail=f"límite {limit} velas (--no-limit)"))
+                continue
+            res = bench_kernel(name, df, repeat, budget_s, memory)
+            log.info("[bench] %-22s %9d velas | %s | mediana=%s s | pico=%s MB",
+                     name, n, res.status, res.median_s, res.peak_mb)
+            results.append(res)
+    return {"meta": _meta(seed, repeat), "results": [asdict(r) for r in results]}
+
+
+def _meta(seed: int, repeat: int) -> dict:
+    return {
+        "created": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+        "repeat": repeat,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.25) -> list[dict]:
+    """Filas kernel/velas con ratio mediana actual / baseline y marca de regresión."""
+    base = {(r["kernel"], r["bars"]): r for r in baseline["results"] if r["status"] == "ok"}
+    rows = []
+    for r in current["results"]:
+        b = base.get((r["kernel"], r["bars"]))
+        if r["status"] != "ok" or b is None:
+            continue
+        ratio = r["median_s"] / b["median_s"] if b["median_s"] else None
+        regression = (ratio is not None and ratio > 1 + tolerance
+                      and r["median_s"] - b["median_s"] > NOISE_FLOOR_S)
+        rows.append({"kernel": r["kernel"], "bars": r["bars"], "baseline_s": b["median_s"],
+                     "current_s": r["median_s"], "ratio": round(ratio, 3) if ratio else None,
+                     "regression": regression})
+    return rows
+
+
+def _save(data: dict, file: str) -> str:
+    os.makedirs(os.path.dirname(os.path.abspath(file)), exist_ok=True)
+    with open(file, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    return file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de kernels de datos y features")
+    parser.add_argument("--bars", default=DEFAULT_BARS, help="tamaños separados por comas")
+    parser.add_argument("--kernels", default="", help=f"subconjunto de: {','.join(KERNELS)}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=2.0, help="segundos máx por kernel y tamaño")
+    parser.add_argument("--no-limit", action="store_true", help="ignorar el máximo de velas de kernels lentos")
+    parser.add_argument("--no-memory", action="store_true", help="omitir la medición de memoria")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="fichero JSON de salida")
+    parser.add_argument("--baseline", default=None, help="JSON de baseline para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="regresión si mediana > baseline×(1+tol)")
+    parser.add_argument("--save-baseline", action="store_true", help=f"guardar en {BASELINE_FILE}")
+    args = parser.parse_args()
+
+    kernels = [k.strip() for k in args.kernels.split(",") if k.strip()] or None
+    unknown = set(kernels or []) - set(KERNELS)
+    if unknown:
+        parser.error(f"kernels desconocidos: {sorted(unknown)}")
+    bars = [int(b) for b in args.bars.split(",") if b.strip()]
+
+    data = run_suite(bars, kernels, args.repeat, args.budget, args.no_limit,
+                     not args.no_memory, args.seed)
+    out = args.out or os.path.join(
+        RESULTS_PATH, datetime.now(timezone.utc).strftime("bench_%Y%m%dT%H%M%S.json"))
+    log.info("[bench] resultados -> %s", _save(data, out))
+    if args.save_baseline:
+        log.info("[bench] baseline -> %s", _save(data, BASELINE_FILE))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(data, baseline, args.tolerance)
+        for row in rows:
+            log.log(logging.ERROR if row["regression"] else logging.INFO,
+                    "[bench] %-22s %9d velas | baseline=%.6fs actual=%.6fs ×%s%s",
+                    row["kernel"], row["bars"], row["baseline_s"], row["current_s"],
+                    row["ratio"], "  ← REGRESIÓN" if row["regression"] else "")
+        if any(r["regression"] for r in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
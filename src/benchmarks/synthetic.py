@@ -0,0 +1,95 @@
+"""
+Generadores de velas OHLCV sintéticas para los benchmarks.
+
+Paseo aleatorio reproducible (seed) con calendario realista: sin fines de
+semana, cierre diario de mercado y huecos aleatorios (cortes del feed).
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def ohlcv(
+    n_bars: int,
+    tf_seconds: int = 60,
+    start: str = "2024-01-01",
+    base: float = 5000.0,
+    seed: int = 0,
+    weekends: bool = False,
+    daily_close: tuple[int, int] | None = (21 * 3600, 22 * 3600),
+    gap_prob: float = 0.0005,
+    gap_max_bars: int = 30,
+) -> pd.DataFrame:
+    """
+    `n_bars` velas estandarizadas (time, open, high, low, close, volume).
+
+    weekends=False quita sábados y domingos; `daily_close` es la pausa
+    diaria (segundos desde medianoche UTC, [inicio, fin)); `gap_prob` es
+    la probabilidad por vela de abrir un hueco de hasta `gap_max_bars`.
+    """
+    rng = np.random.default_rng(seed)
+    t0 = int(pd.Timestamp(start, tz="UTC").timestamp()) // tf_seconds * tf_seconds
+
+    # Generar calendario de sobra y recortar tras filtrar
+    times = np.empty(0, dtype=np.int64)
+    span = int(n_bars * 1.6) + 1000
+    while times.size < n_bars:
+        t = t0 + np.arange(span, dtype=np.int64) * tf_seconds
+        keep = np.ones(t.size, dtype=bool)
+        if not weekends:
+            weekday = (t // 86400 + 3) % 7          # 1970-01-01 fue jueves
+            keep &= weekday < 5
+        if daily_close is not None:
+            sod = t % 86400
+            keep &= ~((sod >= daily_close[0]) & (sod < daily_close[1]))
+        if gap_prob > 0:
+            starts = np.flatnonzero(rng.random(t.size) < gap_prob)
+            lengths = rng.integers(1, gap_max_bars + 1, starts.size)
+            diff = np.zeros(t.size + 1, dtype=np.int64)
+            np.add.at(diff, starts, 1)
+            np.add.at(diff, np.minimum(starts + lengths, t.size), -1)
+            keep &= np.cumsum(diff[:-1]) == 0
+        times = t[keep]
+        span *= 2
+    times = times[:n_bars]
+
+    step = base * 0.0004 * np.sqrt(tf_seconds / 60)
+    close = base + rng.normal(0, step, n_bars).cumsum()
+    open_ = np.concatenate(([base], close[:-1])) + rng.normal(0, step * 0.1, n_bars)
+    wick = np.abs(rng.normal(0, step * 0.6, (2, n_bars)))
+    high = np.maximum(open_, close) + wick[0]
+    low = np.minimum(open_, close) - wick[1]
+    volume = rng.integers(1, 3000, n_bars).astype(float)
+    # Algunas velas sin volumen (el VP las ignora)
+    volume[rng.random(n_bars) < 0.01] = 0.0
+
+    return pd.DataFrame({
+        "time": times, "open": open_, "high": high, "low": low, "close": close, "volume": volume,
+    })
+
+
+def capital_prices(df: pd.DataFrame, spread: float = 0.6) -> pd.DataFrame:
+    """Mismas velas en el formato crudo de Capital.com (entrada de `standar_data`)."""
+    half = spread / 2
+    iso = pd.to_datetime(df["time"], unit="s").dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+    def _bid_ask(col: str) -> list[dict]:
+        v = df[col].to_numpy()
+        return [{"bid": b, "ask": a} for b, a in zip((v - half).tolist(), (v + half).tolist())]
+
+    return pd.DataFrame({
+        "snapshotTime": iso,
+        "snapshotTimeUTC": iso,
+        "openPrice": _bid_ask("open"),
+        "closePrice": _bid_ask("close"),
+        "highPrice": _bid_ask("high"),
+        "lowPrice": _bid_ask("low"),
+        "lastTradedVolume": df["volume"].astype("int64").to_numpy(),
+    })
+
+
+def overlapping_chunks(df: pd.DataFrame, overlap: float = 0.1) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """(caché existente, descarga nueva) con `overlap` de velas repetidas, como en load_or_fetch."""
+    cut = int(len(df) * 0.8)
+    back = int(len(df) * overlap)
+    return df.iloc[:cut].copy(), df.iloc[max(0, cut - back):].copy()
@@ -1,13 +1,21 @@
+import os
 import requests
 import pandas as pd
+from dotenv import load_dotenv
+from broker_api import transport
 from utils.logger import get_logger
 from utils.retry import retry
 
+load_dotenv()
 log = get_logger(__name__)
 
-SIMPLE_BASE = "https://rest.simplefx.com"
-SIMPLE_URL = "https://candles-core.simplefx.com" 
-CAPITAL_URL = "https://api-capital.backend-capital.com/"
+# URLs base configurables (ej. broker_api.mock_server en local)
+SIMPLE_BASE = os.getenv("SIMPLE_BASE", "https://rest.simplefx.com")
+SIMPLE_URL = os.getenv("SIMPLE_URL", "https://candles-core.simplefx.com")
+CAPITAL_URL = os.getenv("CAPITAL_URL", "https://api-capital.backend-capital.com/")
+# Tiempo máximo (s) que una descarga de velas puede pasar reintentando:
+# el monitor no debe quedarse minutos bloqueado dentro de la ventana de 2 h
+PRICE_DEADLINE_S = float(os.getenv("PRICE_DEADLINE_S", "120"))
 
 
 @retry(max_retries=3, backoff=2.0, exceptions=(requests.RequestException,))
@@ -17,14 +25,14 @@ def login_simple(client: str, api_key: str):
         "clientId": client,
         "clientSecret": api_key,
     }
-    resp = requests.post(url, json=body, timeout=20)
+    resp = transport.request("POST", url, json_body=body, timeout=20)
     resp.raise_for_status()
     data = resp.json()
     log.info("Login SimpleFX exitoso")
     return data
 
 
-@retry(max_retries=5, backoff=1.5, exceptions=(requests.RequestException,))
+@retry(max_retries=5, backoff=1.5, deadline=PRICE_DEADLINE_S, exceptions=(requests.RequestException,))
 def price_simple(symbol: str, timeframe: int, start: int | None = None, end: int | None = None) -> pd.DataFrame | None:
     url = f"{SIMPLE_URL}/api/v3/candles"
     params = {
@@ -36,7 +44,7 @@ def price_simple(symbol: str, timeframe: int, start: int | None = None, end: int
     if end is not None:
         params["timeTo"] = end
 
-    resp = requests.get(url, params=params, timeout=20)
+    resp = transport.request("GET", url, params=params, timeout=20)
     resp.raise_for_status()
     payload = resp.json()
     df = pd.DataFrame(payload["data"])
@@ -53,9 +61,9 @@ def login_capital(email: str, pwd: str, api_key: str) -> dict:
         "X-CAP-API-KEY": api_key,
         "Content-Type": "application/json",
     }
-    resp = requests.post(
-        f"{CAPITAL_URL}/api/v1/session",
-        json=payload, headers=headers, timeout=20,
+    resp = transport.request(
+        "POST", f"{CAPITAL_URL}/api/v1/session",
+        json_body=payload, headers=headers, timeout=20,
     )
     resp.raise_for_status()
 
@@ -71,7 +79,8 @@ def login_capital(email: str, pwd: str, api_key: str) -> dict:
     return {"CST": cst, "X-SECURITY-TOKEN": xst}
 
 
-@retry(max_retries=20, backoff=1.5, initial_delay=0.5, exceptions=(requests.RequestException,))
+@retry(max_retries=20, backoff=1.5, initial_delay=0.5, deadline=PRICE_DEADLINE_S,
+       exceptions=(requests.RequestException,))
 def price_capital(
     symbol: str, time_resolution: str, from_date: str, to_date: str,
     max_number: str, toke_c: str, cst_token: str,
@@ -88,7 +97,7 @@ def price_capital(
         "to": to_date,
     }
 
-    resp = requests.get(url, params=params, headers=headers, timeout=20)
+    resp = transport.request("GET", url, params=params, headers=headers, timeout=20)
     resp.raise_for_status()
     payload = resp.json()
     df = pd.DataFrame(payload["prices"])
@@ -0,0 +1,142 @@
+"""
+Variante asyncio de `broker_api.api_requests`.
+
+Mismas funciones que la versión síncrona pero como corutinas, compartiendo
+un único pool de conexiones (httpx.AsyncClient) por event loop.
+
+Uso:
+    from broker_api.async_requests import login_capital, price_capital, close_client
+
+    async def main():
+        tokens = await login_capital(email, pwd, api_key)
+        df = await price_capital("US500", "MINUTE_5", desde, hasta, "500",
+                                 tokens["X-SECURITY-TOKEN"], tokens["CST"])
+        await close_client()
+"""
+
+import os
+import asyncio
+import httpx
+import pandas as pd
+from broker_api import transport
+from broker_api.api_requests import SIMPLE_BASE, SIMPLE_URL, CAPITAL_URL, PRICE_DEADLINE_S
+from utils.logger import get_logger
+from utils.retry import async_retry
+
+log = get_logger(__name__)
+
+MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("ASYNC_MAX_KEEPALIVE", "20"))
+
+_CLIENT: httpx.AsyncClient | None = None
+_CLIENT_LOOP: asyncio.AbstractEventLoop | None = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Devuelve el AsyncClient compartido del loop actual (lo crea si no existe)."""
+    global _CLIENT, _CLIENT_LOOP
+    loop = asyncio.get_running_loop()
+    if _CLIENT is None or _CLIENT.is_closed or _CLIENT_LOOP is not loop:
+        _CLIENT = httpx.AsyncClient(
+            timeout=20,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE,
+            ),
+        )
+        _CLIENT_LOOP = loop
+    return _CLIENT
+
+
+async def close_client():
+    """Cierra el pool compartido. Llamar al final del event loop."""
+    global _CLIENT, _CLIENT_LOOP
+    if _CLIENT is not None and not _CLIENT.is_closed:
+        await _CLIENT.aclose()
+    _CLIENT, _CLIENT_LOOP = None, None
+
+
+@async_retry(max_retries=3, backoff=2.0, exceptions=(httpx.HTTPError,))
+async def login_simple(client: str, api_key: str):
+    url = f"{SIMPLE_BASE}/api/v3/auth/key"
+    body = {
+        "clientId": client,
+        "clientSecret": api_key,
+    }
+    resp = await transport.async_request(get_client(), "POST", url, json_body=body)
+    resp.raise_for_status()
+    data = resp.json()
+    log.info("Login SimpleFX exitoso (async)")
+    return data
+
+
+@async_retry(max_retries=5, backoff=1.5, deadline=PRICE_DEADLINE_S, exceptions=(httpx.HTTPError,))
+async def price_simple(symbol: str, timeframe: int, start: int | None = None, end: int | None = None) -> pd.DataFrame | None:
+    url = f"{SIMPLE_URL}/api/v3/candles"
+    params = {
+        "symbol": symbol,
+        "cPeriod": timeframe,
+    }
+    if start is not None:
+        params["timeFrom"] = start
+    if end is not None:
+        params["timeTo"] = end
+
+    resp = await transport.async_request(get_client(), "GET", url, params=params)
+    resp.raise_for_status()
+    payload = resp.json()
+    df = pd.DataFrame(payload["data"])
+    return df
+
+
+@async_retry(max_retries=3, backoff=2.0, exceptions=(httpx.HTTPError,))
+async def login_capital(email: str, pwd: str, api_key: str) -> dict:
+    payload = {
+        "identifier": email,
+        "password": pwd,
+    }
+    headers = {
+        "X-CAP-API-KEY": api_key,
+        "Content-Type": "application/json",
+    }
+    resp = await transport.async_request(
+        get_client(), "POST", f"{CAPITAL_URL}/api/v1/session",
+        json_body=payload, headers=headers,
+    )
+    resp.raise_for_status()
+
+    cst = resp.headers.get("CST")
+    xst = resp.headers.get("X-SECURITY-TOKEN")
+
+    if not cst or not xst:
+        raise RuntimeError(
+            f"Login Capital.com: respuesta sin tokens (CST={cst}, XST={xst})"
+        )
+
+    log.info("Login Capital.com exitoso (async)")
+    return {"CST": cst, "X-SECURITY-TOKEN": xst}
+
+
+@async_retry(max_retries=20, backoff=1.5, initial_delay=0.5, deadline=PRICE_DEADLINE_S,
+             exceptions=(httpx.HTTPError,))
+async def price_capital(
+    symbol: str, time_resolution: str, from_date: str, to_date: str,
+    max_number: str, toke_c: str, cst_token: str,
+) -> pd.DataFrame | None:
+    url = f"{CAPITAL_URL}/api/v1/prices/{symbol}"
+    headers = {
+        "X-SECURITY-TOKEN": toke_c,
+        "CST": cst_token,
+    }
+    params = {
+        "resolution": time_resolution,
+        "max": max_number,
+        "from": from_date,
+        "to": to_date,
+    }
+
+    resp = await transport.async_request(get_client(), "GET", url, params=params, headers=headers)
+    resp.raise_for_status()
+    payload = resp.json()
+    df = pd.DataFrame(payload["prices"])
+    return df
@@ -1,7 +1,12 @@
 import os
+import time
+import threading
 from dotenv import load_dotenv
 from broker_api.api_requests import login_capital, login_simple
+from broker_api import async_requests
 from utils.logger import get_logger
+from utils.tracing import span, traced
+from utils import metrics
 
 load_dotenv()
 log = get_logger(__name__)
@@ -15,23 +20,68 @@ API_KEY = os.getenv("API_KEY")
 ID = os.getenv("ID")
 KEY = os.getenv("KEY")
 
+# Capital.com expira la sesión tras 10 min sin uso: se reutiliza por debajo de eso
+SESSION_TTL = int(os.getenv("SESSION_TTL", "480"))
 
+LOGINS = metrics.counter("broker_logins_total", "Sesiones de broker (api = login real)",
+                         ["broker", "source"])
+
+_session_lock = threading.Lock()
+_capital_session: tuple[str, str] | None = None
+_capital_session_ts = 0.0
+
+
+@traced("login.simple")
 def sesion_simple() -> str:
     """Inicia sesión en SimpleFX y retorna el token Bearer."""
     if not ID or not KEY:
         raise RuntimeError("Variables ID y KEY de SimpleFX no configuradas en .env")
     data = login_simple(ID, KEY)
+    LOGINS.inc(broker="simplefx", source="api")
     token = data["data"]["token"]
     log.info("Sesión SimpleFX activa")
     return token
 
 
-def sesion_capitalcom() -> tuple[str, str]:
-    """Inicia sesión en Capital.com y retorna (security_token, cst)."""
+def sesion_capitalcom(refresh: bool = False) -> tuple[str, str]:
+    """
+    Inicia sesión en Capital.com y retorna (security_token, cst).
+    Reutiliza la sesión del proceso mientras tenga menos de SESSION_TTL
+    segundos; `refresh=True` fuerza un login nuevo.
+    """
+    global _capital_session, _capital_session_ts
     if not EMAIL or not PASSWORD or not API_KEY:
         raise RuntimeError("Variables EMAIL, PASSWORD o API_KEY no configuradas en .env")
-    c = login_capital(EMAIL, PASSWORD, API_KEY)
-    cst = c["CST"]
-    security_token = c["X-SECURITY-TOKEN"]
+    with _session_lock:
+        age = time.monotonic() - _capital_session_ts
+        if not refresh and _capital_session is not None and age < SESSION_TTL:
+            LOGINS.inc(broker="capital", source="cached")
+            return _capital_session
+        with span("login.capital", refresh=refresh):
+            c = login_capital(EMAIL, PASSWORD, API_KEY)
+        LOGINS.inc(broker="capital", source="api")
+        cst = c["CST"]
+        security_token = c["X-SECURITY-TOKEN"]
+        _capital_session = (security_token, cst)
+        _capital_session_ts = time.monotonic()
     log.info("Sesión Capital.com activa")
-    return security_token, cst
\ No newline at end of file
+    return security_token, cst
+
+
+async def asesion_simple() -> str:
+    """Versión asyncio de `sesion_simple` (usa el pool compartido)."""
+    if not ID or not KEY:
+        raise RuntimeError("Variables ID y KEY de SimpleFX no configuradas en .env")
+    data = await async_requests.login_simple(ID, KEY)
+    token = data["data"]["token"]
+    log.info("Sesión SimpleFX activa (async)")
+    return token
+
+
+async def asesion_capitalcom() -> tuple[str, str]:
+    """Versión asyncio de `sesion_capitalcom`. Retorna (security_token, cst)."""
+    if not EMAIL or not PASSWORD or not API_KEY:
+        raise RuntimeError("Variables EMAIL, PASSWORD o API_KEY no configuradas en .env")
+    c = await async_requests.login_capital(EMAIL, PASSWORD, API_KEY)
+    log.info("Sesión Capital.com activa (async)")
+    return c["X-SECURITY-TOKEN"], c["CST"]
@@ -1,14 +1,19 @@
+import os
 import uuid
 import requests
+from dotenv import load_dotenv
+from broker_api import transport
 from utils.logger import get_logger
 from utils.retry import retry
 
+load_dotenv()
 log = get_logger(__name__)
 
-URL = "https://rest.simplefx.com"
+URL = os.getenv("SIMPLE_BASE", "https://rest.simplefx.com")
 
 
-@retry(max_retries=2, backoff=2.0, exceptions=(requests.RequestException,))
+# budget=False: la orden no compite con los reintentos de velas por el presupuesto
+@retry(max_retries=2, backoff=2.0, exceptions=(requests.RequestException,), budget=False)
 def orden_pending(
     token: str, account: str, symbol: str, side: str, reality: str,
     volumen: float, entry_price: float, stop_price: float,
@@ -36,7 +41,7 @@ def orden_pending(
         "Enviando orden %s %s %.2f vol @ %.2f | SL=%.2f | TP=%s",
         side, symbol, volumen, entry_price, stop_price, takeprofit_price,
     )
-    order = requests.post(url, headers=headers, json=body, timeout=20)
+    order = transport.request("POST", url, headers=headers, json_body=body, timeout=20)
     if order.status_code >= 400:
         log.error("SimpleFX error %d: %s", order.status_code, order.text)
     order.raise_for_status()
@@ -44,7 +49,7 @@ def orden_pending(
     return order
 
 
-@retry(max_retries=2, backoff=2.0, exceptions=(requests.RequestException,))
+@retry(max_retries=2, backoff=2.0, exceptions=(requests.RequestException,), budget=False)
 def change_position(
     token: str, account: str, id_trade: int, reality: str,
     takeprofit_price: float | None = None, stop_price: float | None = None,
@@ -62,7 +67,7 @@ def change_position(
         body["StopLoss"] = stop_price
 
     log.info("Modificando posición %d | TP=%s | SL=%s", id_trade, takeprofit_price, stop_price)
-    order_change = requests.put(url, headers=headers, json=body, timeout=20)
+    order_change = transport.request("PUT", url, headers=headers, json_body=body, timeout=20)
     order_change.raise_for_status()
     log.info("Posición modificada: %s", order_change.json())
     return order_change
\ No newline at end of file
@@ -0,0 +1,436 @@
+"""
+Servidor local que imita los endpoints de Capital.com y SimpleFX.
+
+Permite probar carga, concurrencia de descargas, reintentos y envío de
+órdenes sin red ni cuentas reales. Solo stdlib (ThreadingHTTPServer).
+
+Endpoints:
+    POST /api/v1/session                    login Capital.com (headers CST / X-SECURITY-TOKEN)
+    GET  /api/v1/prices/{epic}              velas Capital.com (resolution, max, from, to)
+    POST /api/v3/auth/key                   login SimpleFX ({"data": {"token": ...}})
+    GET  /api/v3/candles                    velas SimpleFX (symbol, cPeriod, timeFrom, timeTo)
+    POST /api/v3/trading/orders/pending     orden pendiente SimpleFX (Bearer)
+    PUT  /api/v3/trading/orders/market      modificar posición SimpleFX (Bearer)
+    GET  /mock/stats                        contadores por endpoint, 429, fallos, órdenes
+    POST /mock/fail                         fallar las próximas N peticiones ({"status": 503, "count": 3, "path": "/prices"})
+    POST /mock/reset                        reinicia contadores, sesiones y órdenes
+
+Las velas son sintéticas y deterministas (paseo aleatorio por símbolo y
+día, sin fines de semana): la misma consulta siempre devuelve lo mismo.
+
+Uso:
+    mock_broker --port 8765 --latency 0.15 --jitter 0.05 --rate-limit 10 --fail-rate 0.02
+
+    # .env del bot
+    CAPITAL_URL=http://127.0.0.1:8765
+    SIMPLE_URL=http://127.0.0.1:8765
+    SIMPLE_BASE=http://127.0.0.1:8765
+
+    # en proceso (benchmarks)
+    server, base_url = start_mock_server(latency=0.05)
+    ...
+    server.shutdown()
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import zlib
+import random
+import argparse
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+MOCK_HOST = os.getenv("MOCK_HOST", "127.0.0.1")
+MOCK_PORT = int(os.getenv("MOCK_PORT", "8765"))
+
+# Resoluciones Capital.com → segundos
+RESOLUTION_SECONDS = {
+    "MINUTE": 60, "MINUTE_5": 300, "MINUTE_15": 900, "MINUTE_30": 1800,
+    "HOUR": 3600, "HOUR_4": 14400, "DAY": 86400,
+}
+_BASE_PRICE = {"US500": 5000.0, "US100": 18000.0, "US30": 39000.0, "DE40": 18000.0, "UK100": 8000.0}
+_SPREAD = 0.6
+
+
+@dataclass
+class MockConfig:
+    latency: float = 0.0            # s de latencia base por petición
+    jitter: float = 0.0             # s extra uniforme [0, jitter]
+    page_limit: int = 1000          # máximo de velas por petición (Capital "max")
+    rate_limit: float = 0.0         # peticiones/s por endpoint (0 = sin límite)
+    retry_after: int = 1            # valor del header Retry-After en 429
+    fail_rate: float = 0.0          # probabilidad de 5xx aleatorio
+    fail_status: tuple = (500, 502, 503)
+    session_ttl: int = 600          # s de validez de los tokens Capital.com
+    seed: int = 0
+
+
+@dataclass
+class MockState:
+    counts: Counter = field(default_factory=Counter)
+    throttled: Counter = field(default_factory=Counter)
+    failed: Counter = field(default_factory=Counter)
+    sessions: dict = field(default_factory=dict)        # (xst, cst) -> último uso
+    tokens: set = field(default_factory=set)            # Bearer SimpleFX
+    orders: list = field(default_factory=list)
+    forced: deque = field(default_factory=deque)        # [(status, path)] fallos forzados
+    windows: dict = field(default_factory=dict)         # endpoint -> deque de timestamps
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+# ── Velas sintéticas ───────────────────────────────────────────────────
+
+@lru_cache(maxsize=256)
+def _day_minutes(symbol: str, day: int, seed: int) -> np.ndarray:
+    """OHLCV de 1 min de un día (1440 x 5) — paseo aleatorio determinista."""
+    rng = np.random.default_rng([zlib.crc32(symbol.encode()), day, seed])
+    base = _BASE_PRICE.get(symbol, 1000.0)
+    drift = rng.normal(0, base * 0.0004, 1440).cumsum()
+    close = base * (1 + 0.02 * np.sin(day / 9.0)) + drift
+    open_ = np.concatenate(([close[0] - drift[0]], close[:-1]))
+    wick = np.abs(rng.normal(0, base * 0.0002, (2, 1440)))
+    high = np.maximum(open_, close) + wick[0]
+    low = np.minimum(open_, close) - wick[1]
+    volume = rng.integers(50, 2000, 1440).astype(float)
+    return np.column_stack([open_, high, low, close, volume])
+
+
+def synthetic_candles(symbol: str, tf_seconds: int, start: int, end: int,
+                      seed: int = 0) -> list[tuple]:
+    """[(time, open, high, low, close, volume)] con apertura en [start, end], sin fines de semana."""
+    tf_seconds = max(60, tf_seconds)
+    first = -(-start // tf_seconds) * tf_seconds
+    out = []
+    for t in range(first, end + 1, tf_seconds):
+        day, sod = divmod(t, 86400)
+        if datetime.fromtimestamp(t, timezone.utc).weekday() >= 5:
+            continue
+        m = _day_minutes(symbol, day, seed)
+        i = sod // 60
+        j = min(1440, i + tf_seconds // 60)
+        block = m[i:j]
+        out.append((t, float(block[0, 0]), float(block[:, 1].max()), float(block[:, 2].min()),
+                    float(block[-1, 3]), float(block[:, 4].sum())))
+    return out
+
+
+def _iso(ts: int) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _parse_iso(value: str) -> int:
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+
+
+def _bid_ask(price: float) -> dict:
+    return {"bid": round(price - _SPREAD / 2, 2), "ask": round(price + _SPREAD / 2, 2)}
+
+
+# ── Handler ────────────────────────────────────────────────────────────
+
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = "MockBroker/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def cfg(self) -> MockConfig:
+        return self.server.config
+
+    @property
+    def state(self) -> MockState:
+        return self.server.state
+
+    def log_message(self, fmt, *args):
+        log.debug("[mock] %s - %s", self.address_string(), fmt % args)
+
+    # ── utilidades ─────────────────────────────────────────────────────
+    def _send(self, status: int, payload: dict | None = None, headers: dict | None = None):
+        body = json.dumps(payload or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def _route(self) -> tuple[str, dict]:
+        parts = urlsplit(self.path)
+        path = re.sub("/+", "/", parts.path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        return path, query
+
+    def _throttled(self, endpoint: str) -> bool:
+        if self.cfg.rate_limit <= 0:
+            return False
+        now = time.monotonic()
+        with self.state.lock:
+            window = self.state.windows.setdefault(endpoint, deque())
+            while window and now - window[0] > 1.0:
+                window.popleft()
+            if len(window) >= self.cfg.rate_limit:
+                self.state.throttled[endpoint] += 1
+                return True
+            window.append(now)
+        return False
+
+    def _injected_failure(self, path: str) -> int | None:
+        with self.state.lock:
+            for i, (status, prefix) in enumerate(self.state.forced):
+                if not prefix or prefix in path:
+                    del self.state.forced[i]
+                    return status
+        if self.cfg.fail_rate and self.server.rng.random() < self.cfg.fail_rate:
+            return self.server.rng.choice(self.cfg.fail_status)
+        return None
+
+    def _capital_auth(self) -> bool:
+        key = (self.headers.get("X-SECURITY-TOKEN"), self.headers.get("CST"))
+        now = time.monotonic()
+        with self.state.lock:
+            last = self.state.sessions.get(key)
+            if last is None or now - last > self.cfg.session_ttl:
+                self.state.sessions.pop(key, None)
+                return False
+            self.state.sessions[key] = now
+        return True
+
+    def _simple_auth(self) -> bool:
+        auth = self.headers.get("Authorization", "")
+        return auth.startswith("Bearer ") and auth[7:] in self.state.tokens
+
+    def _dispatch(self, method: str):
+        path, query = self._route()
+        if path.startswith("/mock/"):
+            return self._control(method, path)
+
+        endpoint = f"{method} {re.sub(r'/prices/[^/]+$', '/prices/{epic}', path)}"
+        with self.state.lock:
+            self.state.counts[endpoint] += 1
+
+        delay = self.cfg.latency + (self.server.rng.random() * self.cfg.jitter if self.cfg.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        if self._throttled(endpoint):
+            return self._send(429, {"errorCode": "error.too-many.requests"},
+                              {"Retry-After": str(self.cfg.retry_after)})
+        status = self._injected_failure(path)
+        if status:
+            with self.state.lock:
+                self.state.failed[endpoint] += 1
+            headers = {"Retry-After": str(self.cfg.retry_after)} if status in (429, 503) else None
+            return self._send(status, {"errorCode": f"error.mock.{status}"}, headers)
+
+        handler = _ROUTES.get((method, re.sub(r"/prices/[^/]+$", "/prices/", path)))
+        if handler is None:
+            return self._send(404, {"errorCode": "error.not-found"})
+        return handler(self, path, query)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    # ── control del mock ───────────────────────────────────────────────
+    def _control(self, method: str, path: str):
+        state = self.state
+        if method == "GET" and path == "/mock/stats":
+            with state.lock:
+                return self._send(200, {
+                    "requests": dict(state.counts),
+                    "throttled": dict(state.throttled),
+                    "failed": dict(state.failed),
+                    "sessions": len(state.sessions),
+                    "orders": list(state.orders),
+                })
+        if method == "POST" and path == "/mock/fail":
+            body = self._body()
+            with state.lock:
+                for _ in range(int(body.get("count", 1))):
+                    state.forced.append((int(body.get("status", 503)), body.get("path", "")))
+            return self._send(200, {"queued": len(state.forced)})
+        if method == "POST" and path == "/mock/reset":
+            self.server.state = MockState()
+            return self._send(200, {})
+        return self._send(404, {"errorCode": "error.not-found"})
+
+    # ── Capital.com ────────────────────────────────────────────────────
+    def capital_session(self, path, query):
+        body = self._body()
+        if not self.headers.get("X-CAP-API-KEY"):
+            return self._send(400, {"errorCode": "error.null.api.key"})
+        if not body.get("identifier") or not body.get("password"):
+            return self._send(400, {"errorCode": "error.invalid.details"})
+        cst, xst = uuid.uuid4().hex, uuid.uuid4().hex
+        with self.state.lock:
+            self.state.sessions[(xst, cst)] = time.monotonic()
+        return self._send(200, {"accountType": "CFD", "currencyIsoCode": "USD"},
+                          {"CST": cst, "X-SECURITY-TOKEN": xst})
+
+    def capital_prices(self, path, query):
+        if not self._capital_auth():
+            return self._send(401, {"errorCode": "error.invalid.session.token"})
+        epic = path.rsplit("/", 1)[-1]
+        tf = RESOLUTION_SECONDS.get(query.get("resolution", "MINUTE"))
+        if tf is None:
+            return self._send(400, {"errorCode": "error.invalid.resolution"})
+        max_n = int(query.get("max", 10))
+        if max_n > self.cfg.page_limit:
+            return self._send(400, {"errorCode": "error.invalid.max"})
+        try:
+            start = _parse_iso(query["from"])
+            end = _parse_iso(query["to"])
+        except (KeyError, ValueError):
+            return self._send(400, {"errorCode": "error.invalid.from"})
+        candles = synthetic_candles(epic, tf, start, end, self.cfg.seed)[:max_n]
+        prices = [{
+            "snapshotTime": _iso(t), "snapshotTimeUTC": _iso(t),
+            "openPrice": _bid_ask(o), "closePrice": _bid_ask(c),
+            "highPrice": _bid_ask(h), "lowPrice": _bid_ask(l),
+            "lastTradedVolume": int(v),
+        } for t, o, h, l, c, v in candles]
+        return self._send(200, {"prices": prices, "instrumentType": "INDICES",
+                                "tickSize": 0.1, "pipPosition": 0})
+
+    # ── SimpleFX ───────────────────────────────────────────────────────
+    def simple_auth(self, path, query):
+        body = self._body()
+        if not body.get("clientId") or not body.get("clientSecret"):
+            return self._send(401, {"code": 401, "message": "Invalid credentials"})
+        token = uuid.uuid4().hex
+        with self.state.lock:
+            self.state.tokens.add(token)
+        return self._send(200, {"data": {"token": token}})
+
+    def simple_candles(self, path, query):
+        try:
+            tf = int(query["cPeriod"])
+            start = int(query.get("timeFrom", 0))
+            end = int(query.get("timeTo", int(time.time())))
+        except (KeyError, ValueError):
+            return self._send(400, {"code": 400, "message": "Invalid parameters"})
+        candles = synthetic_candles(query.get("symbol", "US500"), tf, start, end,
+                                    self.cfg.seed)[-self.cfg.page_limit:]
+        data = [{"time": t, "open": o, "high": h, "low": l, "close": c, "volume": v}
+                for t, o, h, l, c, v in candles]
+        return self._send(200, {"data": data})
+
+    def simple_pending(self, path, query):
+        if not self._simple_auth():
+            return self._send(401, {"code": 401, "message": "Unauthorized"})
+        body = self._body()
+        missing = [k for k in ("ActivationPrice", "Symbol", "Volume", "Side", "Login", "Reality")
+                   if k not in body]
+        if missing or body.get("Side") not in ("BUY", "SELL"):
+            return self._send(400, {"code": 400, "message": f"Invalid order: {missing or body.get('Side')}"})
+        with self.state.lock:
+            order = {"id": len(self.state.orders) + 1, "type": "pending", **body}
+            self.state.orders.append(order)
+        return self._send(200, {"code": 200, "data": {"orders": [order]}})
+
+    def simple_market(self, path, query):
+        if not self._simple_auth():
+            return self._send(401, {"code": 401, "message": "Unauthorized"})
+        body = self._body()
+        with self.state.lock:
+            order = next((o for o in self.state.orders if o["id"] == body.get("Id")), None)
+            if order is None:
+                return self._send(404, {"code": 404, "message": "Position not found"})
+            for key in ("TakeProfit", "StopLoss"):
+                if key in body:
+                    order[key] = body[key]
+        return self._send(200, {"code": 200, "data": {"marketOrders": [order]}})
+
+
+_ROUTES = {
+    ("POST", "/api/v1/session"): MockHandler.capital_session,
+    ("GET", "/api/v1/prices/"): MockHandler.capital_prices,
+    ("POST", "/api/v3/auth/key"): MockHandler.simple_auth,
+    ("GET", "/api/v3/candles"): MockHandler.simple_candles,
+    ("POST", "/api/v3/trading/orders/pending"): MockHandler.simple_pending,
+    ("PUT", "/api/v3/trading/orders/market"): MockHandler.simple_market,
+}
+
+
+class MockBrokerServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], config: MockConfig | None = None):
+        super().__init__(address, MockHandler)
+        self.config = config or MockConfig()
+        self.state = MockState()
+        self.rng = random.Random(self.config.seed)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_mock_server(host: str = MOCK_HOST, port: int = 0, **config) -> tuple[MockBrokerServer, str]:
+    """Arranca el mock en un hilo daemon (port=0 = puerto libre). Retorna (server, base_url)."""
+    server = MockBrokerServer((host, port), MockConfig(**config))
+    threading.Thread(target=server.serve_forever, name="mock-broker", daemon=True).start()
+    log.info("[mock] escuchando en %s | %s", server.base_url, server.config)
+    return server, server.base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock local de Capital.com y SimpleFX")
+    parser.add_argument("--host", default=MOCK_HOST)
+    parser.add_argument("--port", type=int, default=MOCK_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="latencia base por petición (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latencia extra aleatoria (s)")
+    parser.add_argument("--page-limit", type=int, default=1000, help="máximo de velas por petición")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="peticiones/s por endpoint (0 = off)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="probabilidad de 5xx aleatorio")
+    parser.add_argument("--session-ttl", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency, jitter=args.jitter, page_limit=args.page_limit,
+        rate_limit=args.rate_limit, retry_after=args.retry_after, fail_rate=args.fail_rate,
+        session_ttl=args.session_ttl, seed=args.seed,
+    )
+    server = MockBrokerServer((args.host, args.port), config)
+    log.info("[mock] escuchando en %s | %s", server.base_url, config)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Capa de transporte HTTP común a broker_api y a las tools web.
+
+Todas las peticiones salen por aquí: una única `requests.Session` con pool
+de conexiones (sync) o el AsyncClient de `async_requests` (async), más un
+modo cassette para grabar y reproducir respuestas reales:
+
+    CASSETTE_MODE=off       petición normal (por defecto)
+    CASSETTE_MODE=record    petición real + guarda la respuesta en CASSETTE_DIR
+    CASSETTE_MODE=replay    responde desde CASSETTE_DIR sin red (falta → CassetteMissError)
+    CASSETTE_DIR=...        por defecto data_loader/cassettes
+    CASSETTE_TIMING=1       en replay, esperar el tiempo de respuesta grabado
+
+Cada petición distinta (método, URL, params y body sin credenciales) es
+un fichero {host}/{sha1}.json.gz con la lista de respuestas en orden de
+llegada; en replay se sirven en ese orden y se repite la última. Los
+tokens de sesión nunca se graban: los headers CST/X-SECURITY-TOKEN y el
+body de los logins quedan como "cassette".
+
+Cada host tiene un circuit breaker: tras CIRCUIT_FAILURES fallos seguidos
+(error de red o 5xx) el circuito se abre y las peticiones a ese host fallan
+al instante con CircuitOpenError durante CIRCUIT_COOLDOWN_S; después pasa
+una petición de prueba y, si responde, se cierra.
+
+    CIRCUIT_FAILURES=5      fallos seguidos que abren el circuito (0 = off)
+    CIRCUIT_COOLDOWN_S=30   segundos abierto antes de la petición de prueba
+
+Las peticiones reales pasan antes por utils.rate_limit (RATE_LIMITS); un
+429 frena el bucket entero durante su Retry-After.
+
+Uso:
+    from broker_api import transport
+    resp = transport.request("GET", url, params=params, headers=headers, timeout=20)
+    resp = await transport.async_request(client, "GET", url, params=params)
+"""
+
+import os
+import re
+import json
+import gzip
+import time
+import base64
+import hashlib
+import asyncio
+import threading
+from collections import Counter
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from dotenv import load_dotenv
+
+from utils.logger import get_logger
+from utils.tracing import span
+from utils.retry import parse_retry_after
+from utils import metrics, rate_limit
+
+load_dotenv()
+log = get_logger(__name__)
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_DIR = os.getenv(
+    "CASSETTE_DIR", os.path.join(os.path.dirname(__file__), "..", "data_loader", "cassettes")
+)
+CASSETTE_TIMING = os.getenv("CASSETTE_TIMING", "0").lower() in ("1", "true", "yes")
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", "5"))
+CIRCUIT_COOLDOWN_S = float(os.getenv("CIRCUIT_COOLDOWN_S", "30"))
+
+# Campos que nunca entran en la clave ni en el fichero
+_SECRET_FIELDS = {"identifier", "password", "clientId", "clientSecret"}
+_SECRET_HEADERS = {"cst", "x-security-token"}
+_KEEP_HEADERS = {"content-type", "cst", "x-security-token", "retry-after"}
+# Respuestas de login: el body (token Bearer de SimpleFX, datos de la cuenta
+# de Capital.com) se graba con la misma forma pero sin ningún valor
+_AUTH_ENDPOINTS = {"/api/v1/session", "/api/v3/auth/key"}
+
+HTTP_REQUESTS = metrics.counter(
+    "broker_http_requests_total", "Peticiones HTTP a los brokers", ["host", "endpoint", "method", "status"])
+HTTP_LATENCY = metrics.histogram(
+    "broker_http_request_seconds", "Latencia de las peticiones HTTP", ["endpoint"])
+CIRCUIT_STATE = metrics.gauge(
+    "broker_circuit_open", "Circuito del host abierto (1) o cerrado (0)", ["host"])
+CIRCUIT_REJECTED = metrics.counter(
+    "broker_circuit_rejected_total", "Peticiones rechazadas con el circuito abierto", ["host"])
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+_cassette_lock = threading.Lock()
+_recorded: Counter = Counter()     # clave -> respuestas grabadas en este proceso
+_replayed: Counter = Counter()     # clave -> respuestas servidas en este proceso
+
+
+class CassetteMissError(LookupError):
+    """No hay respuesta grabada para la petición en modo replay."""
+
+
+class CircuitOpenError(RuntimeError):
+    """El host acumuló demasiados fallos; la petición no se envió."""
+
+    circuit_open = True     # utils.retry no reintenta estos errores
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"Circuito abierto para {host} (reintentar en {retry_in:.0f}s)")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class _Circuit:
+    """Circuit breaker de un host: cerrado → abierto → prueba → cerrado."""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def before(self):
+        if CIRCUIT_FAILURES <= 0:
+            return
+        with self.lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + CIRCUIT_COOLDOWN_S - time.monotonic()
+            if remaining > 0 or self.probing:
+                CIRCUIT_REJECTED.inc(host=self.host)
+                raise CircuitOpenError(self.host, max(remaining, 0.0))
+            self.probing = True     # esta petición es la prueba
+
+    def after(self, ok: bool | None):
+        """ok=None: la petición no llegó al host (cassette); solo libera la prueba."""
+        if CIRCUIT_FAILURES <= 0:
+            return
+        with self.lock:
+            self.probing = False
+            if ok is None:
+                return
+            if ok:
+                if self.opened_at is not None:
+                    log.info("[transport] circuito %s cerrado", self.host)
+                    CIRCUIT_STATE.set(0, host=self.host)
+                self.failures, self.opened_at = 0, None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= CIRCUIT_FAILURES:
+                if self.opened_at is None:
+                    log.warning("[transport] circuito %s abierto tras %d fallos seguidos",
+                                self.host, self.failures)
+                    CIRCUIT_STATE.set(1, host=self.host)
+                self.opened_at = time.monotonic()
+
+
+_circuits: dict[str, _Circuit] = {}
+_circuits_lock = threading.Lock()
+
+
+def circuit(host: str) -> _Circuit:
+    with _circuits_lock:
+        c = _circuits.get(host)
+        if c is None:
+            c = _circuits[host] = _Circuit(host)
+        return c
+
+
+def reset_circuits():
+    """Cierra todos los circuitos (tests, nueva corrida)."""
+    with _circuits_lock:
+        _circuits.clear()
+
+
+def get_session() -> requests.Session:
+    """Session compartida (keep-alive + pool de HTTP_POOL_SIZE conexiones por host)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+# ── Cassettes ──────────────────────────────────────────────────────────
+
+def _redact(body):
+    if isinstance(body, dict):
+        return {k: ("***" if k in _SECRET_FIELDS else v) for k, v in body.items()}
+    return body
+
+
+def _placeholder(value):
+    """Misma estructura JSON con cada valor reemplazado por "cassette"."""
+    if isinstance(value, dict):
+        return {k: _placeholder(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_placeholder(v) for v in value]
+    return "cassette"
+
+
+def _redact_content(endpoint: str, content: bytes) -> bytes:
+    if endpoint not in _AUTH_ENDPOINTS:
+        return content
+    try:
+        return json.dumps(_placeholder(json.loads(content))).encode()
+    except ValueError:
+        return b""
+
+
+def cassette_key(method: str, url: str, params: dict | None = None, body=None) -> tuple[str, str]:
+    """(host, sha1) de la petición; independiente de la librería HTTP y de las credenciales."""
+    parts = urlsplit(url)
+    path = "/" + "/".join(p for p in parts.path.split("/") if p)
+    query = sorted((str(k), str(v)) for k, v in (params or {}).items())
+    material = json.dumps([method.upper(), parts.netloc, path, parts.query, query, _redact(body)],
+                          sort_keys=True, default=str)
+    return parts.netloc or "local", hashlib.sha1(material.encode()).hexdigest()
+
+
+def _cassette_file(host: str, key: str) -> str:
+    return os.path.join(CASSETTE_DIR, host.replace(":", "_"), f"{key}.json.gz")
+
+
+def _load(file: str) -> dict | None:
+    try:
+        with gzip.open(file, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _save_entry(method: str, url: str, params, body, entry: dict):
+    host, key = cassette_key(method, url, params, body)
+    file = _cassette_file(host, key)
+    with _cassette_lock:
+        # Primera grabación del proceso: reemplaza; las siguientes se encadenan
+        data = _load(file) if _recorded[key] else None
+        data = data or {"request": {"method": method.upper(), "url": url,
+                                    "params": params, "body": _redact(body)},
+                        "responses": []}
+        data["responses"].append(entry)
+        _recorded[key] += 1
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        tmp = f"{file}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, file)
+
+
+def _next_entry(method: str, url: str, params, body) -> dict:
+    host, key = cassette_key(method, url, params, body)
+    data = _load(_cassette_file(host, key))
+    if not data or not data["responses"]:
+        raise CassetteMissError(f"Sin cassette para {method.upper()} {url} params={params}")
+    with _cassette_lock:
+        i = min(_replayed[key], len(data["responses"]) - 1)
+        _replayed[key] += 1
+    return data["responses"][i]
+
+
+def _entry(endpoint: str, status: int, headers, content: bytes, elapsed: float) -> dict:
+    kept = {k: ("cassette" if k.lower() in _SECRET_HEADERS else v)
+            for k, v in headers.items() if k.lower() in _KEEP_HEADERS}
+    return {
+        "status": status,
+        "headers": kept,
+        "body": base64.b64encode(_redact_content(endpoint, content)).decode("ascii"),
+        "elapsed": round(elapsed, 4),
+    }
+
+
+def _to_requests(entry: dict, method: str, url: str, params) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = entry["status"]
+    resp.headers = CaseInsensitiveDict(entry["headers"])
+    resp._content = base64.b64decode(entry["body"])
+    resp.encoding = requests.utils.get_encoding_from_headers(resp.headers) or "utf-8"
+    resp.request = requests.Request(method.upper(), url, params=params).prepare()
+    resp.url = resp.request.url
+    resp.reason = "CASSETTE"
+    resp.elapsed = timedelta(seconds=entry.get("elapsed", 0.0))
+    return resp
+
+
+def _endpoint(url: str) -> str:
+    """Plantilla del endpoint para spans y labels: "/api/v1/prices/{epic}"."""
+    path = "/" + "/".join(p for p in urlsplit(url).path.split("/") if p)
+    return re.sub(r"/prices/[^/]+$", "/prices/{epic}", path)
+
+
+def _throttled(resp, host: str, endpoint: str):
+    """Un 429 frena a todos los hilos/corutinas del mismo bucket, no solo al que lo recibió."""
+    if resp.status_code != 429:
+        return
+    wait = parse_retry_after(resp.headers)
+    rate_limit.penalize(host, endpoint, 1.0 if wait is None else wait)
+
+
+def _settle(breaker: _Circuit, method: str, host: str, endpoint: str, status, elapsed: float):
+    """Métricas de la petición + resultado para el circuito (red o 5xx = fallo)."""
+    HTTP_REQUESTS.inc(host=host, endpoint=endpoint, method=method.upper(), status=status)
+    HTTP_LATENCY.observe(elapsed, endpoint=endpoint)
+    breaker.after(ok=None if status == "miss" else isinstance(status, int) and status < 500)
+
+
+def request(method: str, url: str, *, params: dict | None = None, json_body=None,
+            **kwargs) -> requests.Response:
+    """Petición sync por la Session compartida (o el cassette según CASSETTE_MODE)."""
+    host, endpoint = urlsplit(url).netloc, _endpoint(url)
+    breaker = circuit(host)
+    breaker.before()
+    status = "error"
+    t0 = time.perf_counter()
+    try:
+        with span(f"http.{method.upper()} {endpoint}", host=host) as sp:
+            resp = _request(method, url, params, json_body, **kwargs)
+            status = resp.status_code
+            sp.set(status=status)
+        return resp
+    except CassetteMissError:
+        status = "miss"
+        raise
+    finally:
+        _settle(breaker, method, host, endpoint, status, time.perf_counter() - t0)
+
+
+def _request(method: str, url: str, params, json_body, **kwargs) -> requests.Response:
+    if CASSETTE_MODE == "replay":
+        entry = _next_entry(method, url, params, json_body)
+        if CASSETTE_TIMING:
+            time.sleep(entry.get("elapsed", 0.0))
+        return _to_requests(entry, method, url, params)
+
+    host, endpoint = urlsplit(url).netloc, _endpoint(url)
+    rate_limit.acquire(host, endpoint)
+    t0 = time.perf_counter()
+    resp = get_session().request(method, url, params=params, json=json_body, **kwargs)
+    _throttled(resp, host, endpoint)
+    if CASSETTE_MODE == "record":
+        _save_entry(method, url, params, json_body,
+                    _entry(endpoint, resp.status_code, resp.headers, resp.content,
+                           time.perf_counter() - t0))
+    return resp
+
+
+async def async_request(client, method: str, url: str, *, params: dict | None = None,
+                        json_body=None, **kwargs):
+    """Igual que `request` sobre un httpx.AsyncClient; devuelve httpx.Response."""
+    host, endpoint = urlsplit(url).netloc, _endpoint(url)
+    breaker = circuit(host)
+    breaker.before()
+    status = "error"
+    t0 = time.perf_counter()
+    try:
+        with span(f"http.{method.upper()} {endpoint}", host=host) as sp:
+            resp = await _async_request(client, method, url, params, json_body, **kwargs)
+            status = resp.status_code
+            sp.set(status=status)
+        return resp
+    except CassetteMissError:
+        status = "miss"
+        raise
+    finally:
+        _settle(breaker, method, host, endpoint, status, time.perf_counter() - t0)
+
+
+async def _async_request(client, method: str, url: str, params, json_body, **kwargs):
+    import httpx
+
+    if CASSETTE_MODE == "replay":
+        entry = _next_entry(method, url, params, json_body)
+        if CASSETTE_TIMING:
+            await asyncio.sleep(entry.get("elapsed", 0.0))
+        return httpx.Response(
+            entry["status"], headers=entry["headers"], content=base64.b64decode(entry["body"]),
+            request=httpx.Request(method.upper(), url, params=params),
+        )
+
+    host, endpoint = urlsplit(url).netloc, _endpoint(url)
+    await rate_limit.acquire_async(host, endpoint)
+    t0 = time.perf_counter()
+    resp = await client.request(method, url, params=params, json=json_body, **kwargs)
+    _throttled(resp, host, endpoint)
+    if CASSETTE_MODE == "record":
+        await asyncio.to_thread(
+            _save_entry, method, url, params, json_body,
+            _entry(endpoint, resp.status_code, resp.headers, resp.content,
+                   time.perf_counter() - t0),
+        )
+    return resp
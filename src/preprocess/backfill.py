@@ -0,0 +1,328 @@
+"""
+Backfill histórico masivo y reanudable de los cachés de velas.
+
+Planifica símbolos × timeframes × rango en chunks de N días, los descarga
+con concurrencia acotada (el rate limiter y los reintentos de broker_api
+siguen aplicando a cada petición) y deja cada chunk terminado en
+data_loader/backfill/{symbol}_{tf}/ como checkpoint: si el proceso se
+corta, la siguiente corrida con el mismo rango solo descarga los chunks
+que faltan. Cuando todos los chunks de un par están listos se fusionan
+con su parquet de caché y se borra el staging.
+
+Destinos:
+    TIMEFRAME (principal)   data_loader/{symbol}.parquet
+    MINUTE (si no es el principal)  data_loader/vp/{symbol}_vp.parquet (Volume Profile)
+    otro                    data_loader/{symbol}_{tf}.parquet
+
+Si el rango no toca el caché existente se extiende hasta él, para no dejar
+huecos internos que la detección por bordes de load_or_fetch no ve. Los
+tramos ya descargados quedan en el sidecar {name}.coverage.json del caché
+(incluidos fines de semana sin velas), así repetir el comando no vuelve a
+pedir nada.
+
+Uso:
+    backfill --symbols US500,US100 --timeframes MINUTE_5,MINUTE --from 2025-01-01
+    backfill --from 2025-01-01 --to 2025-06-30 --chunk-days 7 --workers 4
+"""
+
+import os
+import json
+import time
+import shutil
+import contextvars
+import argparse
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from broker_api.login import sesion_capitalcom
+from preprocess.process_pipeline import (
+    DATA_LOADER_PATH, VP_LOADER_PATH, DEFAULT_TIMEFRAME, TIMEFRAME_SECONDS,
+    fetch_from_api, merge_and_deduplicate, save_parquet, loader_file, parquet_time_bounds,
+    load_coverage, save_coverage, missing_ranges,
+)
+from tools_bot.interval_fecha import date_ranges
+from tools_bot.time_now import _unix_to_iso
+from utils.logger import get_logger
+from utils.retry import run_budget
+from utils import metrics
+
+log = get_logger(__name__)
+
+BACKFILL_PATH = os.path.join(DATA_LOADER_PATH, "backfill")
+BACKFILL_CHUNK_DAYS = int(os.getenv("BACKFILL_CHUNK_DAYS", "7"))
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "4"))
+_COLUMNS = ["time", "open", "high", "low", "close", "volume"]
+
+CHUNKS = metrics.counter("backfill_chunks_total", "Chunks del backfill por resultado",
+                         ["timeframe", "result"])
+
+
+@dataclass(frozen=True)
+class Chunk:
+    symbol: str
+    timeframe: str
+    start: int
+    end: int
+    closed: bool            # False: llega a velas aún abiertas, no sirve como checkpoint
+
+    @property
+    def file(self) -> str:
+        suffix = "" if self.closed else ".open"
+        return os.path.join(_staging_dir(self.symbol, self.timeframe),
+                            f"chunk_{self.start}_{self.end}{suffix}.parquet")
+
+    def requests(self, max_candles: int = 500) -> int:
+        """Peticiones price_capital del chunk (mismo troceo que fetch_from_api)."""
+        return len(date_ranges(self.start, self.end, time=TIMEFRAME_SECONDS.get(self.timeframe, 60),
+                               values=max_candles))
+
+
+@dataclass
+class PairReport:
+    symbol: str
+    timeframe: str
+    start: int
+    end: int
+    chunks: int = 0
+    resumed: int = 0
+    fetched: int = 0
+    failed: int = 0
+    candles: int = 0
+    requests: int = 0
+    merged_rows: int | None = None
+    errors: list[str] = field(default_factory=list)
+
+
+def _staging_dir(symbol: str, timeframe: str) -> str:
+    return os.path.join(BACKFILL_PATH, f"{symbol}_{timeframe}")
+
+
+def destination(symbol: str, timeframe: str) -> tuple[str, str]:
+    """(directorio, nombre) del parquet de caché que alimenta el timeframe."""
+    if timeframe == DEFAULT_TIMEFRAME:
+        return DATA_LOADER_PATH, symbol
+    if timeframe == "MINUTE":
+        return VP_LOADER_PATH, f"{symbol}_vp"
+    return DATA_LOADER_PATH, f"{symbol}_{timeframe}"
+
+
+# ── Plan ───────────────────────────────────────────────────────────────
+
+def plan(symbol: str, timeframe: str, start_unix: int, end_unix: int,
+         chunk_days: int = BACKFILL_CHUNK_DAYS, now: int | None = None) -> list[Chunk]:
+    """
+    Chunks alineados a múltiplos de `chunk_days` desde epoch (dos corridas
+    con rangos parecidos comparten checkpoints). El rango se extiende hasta
+    el caché existente si no lo toca y se omiten los chunks que el caché ya
+    cubre por completo (bordes del parquet + sidecar de cobertura).
+    """
+    now = now or int(time.time())
+    tf_seconds = TIMEFRAME_SECONDS.get(timeframe, 60)
+    folder, name = destination(symbol, timeframe)
+    file = os.path.join(folder, f"{name}.parquet")
+    bounds = parquet_time_bounds(file) if os.path.exists(file) else None
+    covered = load_coverage(name, folder) + ([bounds] if bounds else [])
+    if bounds is not None:
+        if end_unix < bounds[0] - tf_seconds:
+            log.info("[backfill] %s %s: extendiendo hasta el inicio del caché (%s)",
+                     symbol, timeframe, _unix_to_iso(bounds[0]))
+            end_unix = bounds[0] - 1
+        if start_unix > bounds[1] + tf_seconds:
+            log.info("[backfill] %s %s: extendiendo desde el final del caché (%s)",
+                     symbol, timeframe, _unix_to_iso(bounds[1]))
+            start_unix = bounds[1] + 1
+
+    closed_until = now - tf_seconds
+    step = chunk_days * 86400
+    chunks = []
+    k = start_unix // step
+    while k * step <= end_unix:
+        a, b = max(start_unix, k * step), min(end_unix, (k + 1) * step - 1)
+        if missing_ranges(covered, a, b):
+            chunks.append(Chunk(symbol, timeframe, a, b, closed=b <= closed_until))
+        k += 1
+    return chunks
+
+
+def is_done(chunk: Chunk) -> bool:
+    return chunk.closed and os.path.exists(chunk.file)
+
+
+# ── Descarga ───────────────────────────────────────────────────────────
+
+def fetch_chunk(chunk: Chunk, max_candles: int = 500) -> int:
+    """Descarga un chunk y lo guarda en staging (escritura atómica). Retorna las velas."""
+    df = fetch_from_api(chunk.symbol, chunk.timeframe, chunk.start, chunk.end, max_candles)
+    if df.empty:
+        # Chunk sin velas (fin de semana/feriado): checkpoint vacío
+        df = pd.DataFrame({col: pd.Series(dtype="int64" if col == "time" else "float64")
+                           for col in _COLUMNS})
+    os.makedirs(os.path.dirname(chunk.file), exist_ok=True)
+    tmp = f"{chunk.file}.tmp"
+    df.to_parquet(tmp, engine="pyarrow", index=False)
+    os.replace(tmp, chunk.file)
+    return len(df)
+
+
+def merge_pair(symbol: str, timeframe: str, chunks: list[Chunk], now: int | None = None) -> int:
+    """
+    Fusiona los chunks en el parquet de caché y borra el staging. La vela en
+    curso no se guarda: en el caché ganaría a la versión cerrada y los bordes
+    del parquet la darían por cubierta. Retorna filas totales.
+    """
+    now = now or int(time.time())
+    closed_until = now - TIMEFRAME_SECONDS.get(timeframe, 60)     # apertura de la última cerrada
+    parts = [pd.read_parquet(c.file, engine="pyarrow") for c in chunks if os.path.exists(c.file)]
+    parts = [p[p["time"] <= closed_until] for p in parts]
+    parts = [p for p in parts if not p.empty]
+    folder, name = destination(symbol, timeframe)
+    _, df_full = loader_file(symb=name, start=0, end=0, path=folder)
+    if parts:
+        df_full = merge_and_deduplicate(df_full, pd.concat(parts, ignore_index=True))
+        save_parquet(df_full, name, path=folder)
+    # Solo los chunks cerrados cuentan como cubiertos (las velas abiertas se vuelven a pedir)
+    save_coverage(name, folder, load_coverage(name, folder) +
+                  [(c.start, c.end) for c in chunks if c.closed])
+    shutil.rmtree(_staging_dir(symbol, timeframe), ignore_errors=True)
+    return 0 if df_full is None else len(df_full)
+
+
+def run_backfill(symbols: list[str], timeframes: list[str], start_unix: int, end_unix: int,
+                 chunk_days: int = BACKFILL_CHUNK_DAYS, workers: int = BACKFILL_WORKERS,
+                 max_candles: int = 500) -> list[PairReport]:
+    """
+    Planifica, descarga los chunks pendientes en paralelo y fusiona cada par
+    completo. Los reintentos gastan el presupuesto de la corrida que llama
+    (`main` abre uno con run_budget).
+    """
+    pairs = {}
+    pending = []
+    for symbol in symbols:
+        for timeframe in timeframes:
+            chunks = plan(symbol, timeframe, start_unix, end_unix, chunk_days)
+            report = PairReport(symbol, timeframe, start_unix, end_unix, chunks=len(chunks))
+            report.resumed = sum(is_done(c) for c in chunks)
+            pairs[(symbol, timeframe)] = (chunks, report)
+            pending += [c for c in chunks if not is_done(c)]
+            CHUNKS.inc(report.resumed, timeframe=timeframe, result="resumed")
+            log.info("[backfill] %s %s: %d chunk(s) pendientes fuera del caché, %d ya descargados",
+                     symbol, timeframe, len(chunks), report.resumed)
+
+    if pending:
+        sesion_capitalcom()         # un login antes de abrir los hilos
+    t0 = time.perf_counter()
+    done = 0
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="backfill")
+    try:
+        futures = {pool.submit(contextvars.copy_context().run, fetch_chunk, c, max_candles): c
+                   for c in pending}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            report = pairs[(chunk.symbol, chunk.timeframe)][1]
+            try:
+                candles = future.result()
+            except Exception as e:
+                CHUNKS.inc(timeframe=chunk.timeframe, result="failed")
+                report.failed += 1
+                report.errors.append(f"{_unix_to_iso(chunk.start)}: {e}")
+                log.error("[backfill] %s %s chunk %s falló: %s", chunk.symbol, chunk.timeframe,
+                          _unix_to_iso(chunk.start), e)
+                continue
+            CHUNKS.inc(timeframe=chunk.timeframe, result="fetched")
+            # as_completed entrega en este hilo: los contadores no necesitan lock
+            report.fetched += 1
+            report.candles += candles
+            report.requests += chunk.requests(max_candles)
+            done += 1
+            elapsed = time.perf_counter() - t0
+            log.info("[backfill] %d/%d chunks | %s %s %s +%d velas | %.0f velas/s",
+                     done, len(pending), chunk.symbol, chunk.timeframe,
+                     _unix_to_iso(chunk.start)[:10], candles,
+                     sum(r.candles for _, r in pairs.values()) / elapsed if elapsed else 0.0)
+    except KeyboardInterrupt:
+        log.warning("[backfill] interrumpido: los chunks terminados quedan en %s", BACKFILL_PATH)
+        pool.shutdown(wait=True, cancel_futures=True)
+        raise
+    pool.shutdown(wait=True)
+
+    for (symbol, timeframe), (chunks, report) in pairs.items():
+        if not chunks:
+            continue
+        if report.failed:
+            log.warning("[backfill] %s %s: %d chunk(s) fallidos, no se fusiona (reintentar reanuda)",
+                        symbol, timeframe, report.failed)
+            continue
+        report.merged_rows = merge_pair(symbol, timeframe, chunks)
+        log.info("[backfill] %s %s: caché fusionado -> %d filas", symbol, timeframe, report.merged_rows)
+    return [report for _, report in pairs.values()]
+
+
+def throughput(reports: list[PairReport], elapsed: float) -> dict:
+    candles = sum(r.candles for r in reports)
+    requests = sum(r.requests for r in reports)
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "candles": candles,
+        "requests": requests,
+        "candles_per_s": round(candles / elapsed, 1) if elapsed else None,
+        "requests_per_s": round(requests / elapsed, 2) if elapsed else None,
+        "chunks_fetched": sum(r.fetched for r in reports),
+        "chunks_resumed": sum(r.resumed for r in reports),
+        "chunks_failed": sum(r.failed for r in reports),
+    }
+
+
+def save_report(reports: list[PairReport], summary: dict) -> str:
+    os.makedirs(BACKFILL_PATH, exist_ok=True)
+    file = os.path.join(BACKFILL_PATH, datetime.now(timezone.utc).strftime("report_%Y%m%dT%H%M%S.json"))
+    with open(file, "w", encoding="utf-8") as f:
+        json.dump({"summary": summary, "pairs": [asdict(r) for r in reports]}, f, indent=2)
+    return file
+
+
+def _parse_date(value: str, end_of_day: bool = False) -> int:
+    dt = datetime.fromisoformat(value)
+    if len(value) == 10 and end_of_day:
+        dt = dt.replace(hour=23, minute=59, second=59)
+    return int(dt.replace(tzinfo=dt.tzinfo or timezone.utc).timestamp())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill histórico reanudable de los cachés de velas")
+    parser.add_argument("--symbols", default=os.getenv("SYMBOLS", "US500"))
+    parser.add_argument("--timeframes", default=DEFAULT_TIMEFRAME,
+                        help="lista separada por comas (MINUTE alimenta el caché de VP)")
+    parser.add_argument("--from", dest="start", required=True, help="YYYY-MM-DD[THH:MM:SS] (UTC)")
+    parser.add_argument("--to", dest="end", default=None, help="por defecto ahora")
+    parser.add_argument("--chunk-days", type=int, default=BACKFILL_CHUNK_DAYS)
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    parser.add_argument("--max-candles", type=int, default=500)
+    args = parser.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+    timeframes = [t.strip() for t in args.timeframes.split(",") if t.strip()]
+    start_unix = _parse_date(args.start)
+    end_unix = _parse_date(args.end, end_of_day=True) if args.end else int(time.time())
+
+    t0 = time.perf_counter()
+    with run_budget():
+        reports = run_backfill(symbols, timeframes, start_unix, end_unix,
+                               args.chunk_days, args.workers, args.max_candles)
+    summary = throughput(reports, time.perf_counter() - t0)
+    file = save_report(reports, summary)
+
+    for r in reports:
+        log.info("[backfill] %-8s %-9s chunks=%d nuevos=%d reanudados=%d fallidos=%d velas=%d",
+                 r.symbol, r.timeframe, r.chunks, r.fetched, r.resumed, r.failed, r.candles)
+    log.info("[backfill] %d velas, %d peticiones en %.1fs | %.0f velas/s | %.2f peticiones/s -> %s",
+             summary["candles"], summary["requests"], summary["elapsed_s"],
+             summary["candles_per_s"] or 0.0, summary["requests_per_s"] or 0.0, file)
+    if summary["chunks_failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
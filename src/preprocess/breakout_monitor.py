@@ -1,3 +1,4 @@
+import os
 import time as time_mod
 from datetime import datetime, timezone
 
@@ -6,9 +7,27 @@ from broker_api.api_requests import price_capital
 from tools_bot.standar_data import standar_data
 from tools_bot.time_now import _unix_to_iso
 from utils.logger import get_logger
+from utils.tracing import span
+from utils import metrics
 
 log = get_logger(__name__)
 
+# Ventana de monitoreo post caja (s); ajustable con backtest.sweep
+MONITOR_WINDOW = int(os.getenv("MONITOR_WINDOW", "7200"))
+
+POLLS = metrics.counter("monitor_polls_total", "Consultas de velas del monitor", ["symbol", "mode"])
+POLL_ERRORS = metrics.counter("monitor_poll_errors_total", "Errores de API en el monitor", ["symbol"])
+BREAKOUTS = metrics.counter("monitor_breakouts_total", "Resultado del monitoreo",
+                            ["symbol", "state", "mode"])
+TOKEN_REFRESHES = metrics.counter("monitor_token_refresh_total", "Renovaciones de sesión", ["result"])
+DETECTION_LATENCY = metrics.histogram(
+    "monitor_detection_latency_seconds", "Cierre de la vela de señal → detección (modo live)",
+    ["symbol"], buckets=(5, 15, 30, 60, 90, 120, 180, 300, 600))
+
+def _now() -> int:
+    return int(datetime.now(timezone.utc).timestamp())
+
+
 def _check_candles(df, box_high: float, box_low: float) -> dict | None:
     for _, row in df.iterrows():
         close = float(row["close"])
@@ -46,30 +65,52 @@ def monitor_breakout(
     box_high: float,
     box_low: float,
     box_end_unix: int,
-    window_seconds: int = 7200,
+    window_seconds: int = MONITOR_WINDOW,
     poll_interval: int = 60,
+    clock=None,
+    sleep=None,
+    fetch=None,
+    login=None,
 ) -> dict | None:
-    
+    """
+    Vigila el primer cierre de 5 min fuera de la caja.
+
+    `clock`, `sleep`, `fetch` y `login` permiten reemplazar el reloj, la
+    espera, la descarga de velas y el login (ver backtest.monitor_replay);
+    por defecto son el reloj real, time.sleep, `_fetch_5min` y
+    `sesion_capitalcom`.
+    """
+    clock = clock or _now
+    sleep = sleep or time_mod.sleep
+    fetch = fetch or _fetch_5min
+    login = login or sesion_capitalcom
+
     monitor_end = box_end_unix + window_seconds
-    now = int(datetime.now(timezone.utc).timestamp())
+    now = clock()
 
-    security_token, cst = sesion_capitalcom()
+    security_token, cst = login()
 
     # ── Modo histórico ──────────────────────────────────────────────
     if monitor_end <= now:
         log.info("[monitor] %s: modo HISTÓRICO (%s → %s)",
                  symbol, _unix_to_iso(box_end_unix), _unix_to_iso(monitor_end))
 
-        df = _fetch_5min(symbol, box_end_unix, monitor_end, security_token, cst)
+        with span("monitor.historical", symbol=symbol):
+            df = fetch(symbol, box_end_unix, monitor_end, security_token, cst)
+        POLLS.inc(symbol=symbol, mode="historical")
         if df is None:
             log.warning("[monitor] %s: sin velas 5 min en ventana histórica", symbol)
             return None
 
         result = _check_candles(df, box_high, box_low)
+        BREAKOUTS.inc(symbol=symbol, state=result["breakout_state"] if result else "NONE",
+                      mode="historical")
         if result:
             log.info("[monitor] %s: BREAKOUT %s close=%.2f @ %s",
                      symbol, result['breakout_state'], result['candle_close'],
-                     _unix_to_iso(result['signal_time']))
+                     _unix_to_iso(result['signal_time']),
+                     extra={"symbol": symbol, "stage": "monitor", "mode": "historical",
+                            "signal_time": result['signal_time']})
         else:
             log.info("[monitor] %s: sin breakout en ventana de 2 h", symbol)
         return result
@@ -84,34 +125,45 @@ def monitor_breakout(
     TOKEN_REFRESH = 25 * 60  # 25 minutos
 
     while True:
-        current = int(datetime.now(timezone.utc).timestamp())
+        current = clock()
         if current >= monitor_end:
             log.info("[monitor] %s: ventana de 2 h expirada → sin breakout", symbol)
+            BREAKOUTS.inc(symbol=symbol, state="NONE", mode="live")
             return None
 
         # Renovar token si lleva mucho tiempo
         token_age += poll_interval
         if token_age >= TOKEN_REFRESH:
             try:
-                security_token, cst = sesion_capitalcom()
+                security_token, cst = login(refresh=True)
                 token_age = 0
+                TOKEN_REFRESHES.inc(result="ok")
                 log.info("[monitor] %s: sesión Capital.com renovada", symbol)
             except Exception as e:
+                TOKEN_REFRESHES.inc(result="error")
                 log.error("[monitor] %s: error renovando sesión → %s", symbol, e)
 
         try:
-            df = _fetch_5min(symbol, last_checked, current,
-                             security_token, cst)
+            with span("monitor.poll", symbol=symbol):
+                df = fetch(symbol, last_checked, current,
+                           security_token, cst)
         except Exception as e:
+            POLL_ERRORS.inc(symbol=symbol)
             log.warning("[monitor] %s: error API → %s, reintentando...", symbol, e)
-            time_mod.sleep(poll_interval)
+            sleep(poll_interval)
             continue
 
+        POLLS.inc(symbol=symbol, mode="live")
         if df is not None and not df.empty:
             result = _check_candles(df, box_high, box_low)
             if result:
+                BREAKOUTS.inc(symbol=symbol, state=result["breakout_state"], mode="live")
+                latency = clock() - (result["signal_time"] + 300)
+                DETECTION_LATENCY.observe(latency, symbol=symbol)
                 log.info("[monitor] %s: BREAKOUT %s close=%.2f",
-                         symbol, result['breakout_state'], result['candle_close'])
+                         symbol, result['breakout_state'], result['candle_close'],
+                         extra={"symbol": symbol, "stage": "monitor", "mode": "live",
+                                "signal_time": result['signal_time'], "latency_s": latency})
                 return result
             # Avanzar puntero para no reprocesar velas
             last_checked = int(df["time"].max())
@@ -119,4 +171,4 @@ def monitor_breakout(
         remaining = (monitor_end - current) // 60
         log.debug("[monitor] %s: sin breakout | quedan %d min | próximo check en %ds",
                   symbol, remaining, poll_interval)
-        time_mod.sleep(poll_interval)
+        sleep(poll_interval)
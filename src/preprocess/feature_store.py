@@ -0,0 +1,366 @@
+"""
+Feature store diario materializado: VP, estado del RSI y caja por símbolo/día.
+
+Las ventanas START_VP–END_VP de dos días seguidos se solapan casi por
+completo; en lugar de recalcular todo desde las velas crudas, cada día UTC
+cerrado se guarda una vez en FEATURE_STORE_PATH/{symbol}/:
+
+    vp_segments.parquet tramos del Volume Profile del día (cuerpo/mechas de
+                        cada vela, utils_trading_vp.ohlc_segments) + low/high;
+                        la ventana se rehace sobre su propia rejilla y da el
+                        mismo resultado que vp_features_compose
+    days_{tf}.parquet   estado del RSI al cierre del día (último close,
+                        medias de Wilder, nº de velas, dos últimos RSI),
+                        picos/valles confirmados ese día y caja del día
+
+`preprocess_data` arma el dict `features` multi-día con los días guardados
+y solo lee velas crudas para los tramos sin día completo (inicio parcial y
+sesión en curso); al final `update_*` materializa los días que se cerraron.
+
+Configuración (.env):
+    FEATURE_STORE=true          usar y actualizar el store
+    FEATURE_STORE_PATH=...      por defecto data_loader/features
+"""
+
+import os
+import json
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from tools_bot.box import box_strategy
+from tools_bot.utils_trading_vp import ohlc_segments, merge_segments
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+FEATURE_STORE = os.getenv("FEATURE_STORE", "true").lower() in ("1", "true", "yes")
+FEATURE_STORE_PATH = os.getenv(
+    "FEATURE_STORE_PATH", os.path.join(os.path.dirname(__file__), "..", "data_loader", "features")
+)
+RSI_LENGTH = 14
+RSI_PIVOT_EPS = 1e-6        # igual que process_pipeline.RSI_PIVOT_EPS
+DAY = 86400
+VP_FILE = "vp_segments.parquet"
+
+_lock = threading.Lock()
+
+
+# ── Lectura / escritura ────────────────────────────────────────────────
+
+def _file(symbol: str, name: str) -> str:
+    return os.path.join(FEATURE_STORE_PATH, symbol, name)
+
+
+def _days_name(timeframe: str) -> str:
+    return f"days_{timeframe}.parquet"
+
+
+def _read(symbol: str, name: str) -> pd.DataFrame:
+    try:
+        return pd.read_parquet(_file(symbol, name), engine="pyarrow")
+    except (OSError, ValueError):
+        return pd.DataFrame()
+
+
+def _append(symbol: str, name: str, rows: list[dict]):
+    """Agrega filas nuevas (por `day`) de forma atómica; las existentes no se tocan."""
+    if not rows:
+        return
+    file = _file(symbol, name)
+    with _lock:
+        old = _read(symbol, name)
+        new = pd.DataFrame(rows)
+        if not old.empty:
+            new = new[~new["day"].isin(old["day"])]
+            new = pd.concat([old, new], ignore_index=True)
+        new = new.sort_values("day").reset_index(drop=True)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        tmp = f"{file}.tmp"
+        new.to_parquet(tmp, engine="pyarrow", index=False)
+        os.replace(tmp, file)
+
+
+def _complete_days(covered_from: int, covered_until: int, now: int) -> list[int]:
+    """Días UTC enteros dentro de [covered_from, covered_until] y ya cerrados."""
+    first = -(-covered_from // DAY) * DAY
+    last_end = min(covered_until + 1, now)
+    return list(range(first, last_end - DAY + 1, DAY))
+
+
+def _hhmm(value: str) -> int:
+    hh, mm = value.strip()[:5].split(":")
+    return int(hh) * 3600 + int(mm) * 60
+
+
+# ── RSI ────────────────────────────────────────────────────────────────
+
+def _wilder(closes: np.ndarray, state: dict | None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Medias de Wilder de ganancias/pérdidas por vela. Sin estado: ewm como
+    pandas_ta (adjust=True, min_periods); con estado: sigue la recursión
+    desde las medias y el close guardados al cierre del día anterior.
+    """
+    alpha = 1.0 / RSI_LENGTH
+    if state is None:
+        delta = pd.Series(closes).diff()
+        ewm = dict(alpha=alpha, min_periods=RSI_LENGTH)
+    else:
+        delta = pd.Series(np.diff(np.concatenate([[state["last_close"]], closes])))
+        ewm = dict(alpha=alpha, adjust=False)
+    gain, loss = delta.clip(lower=0), -delta.clip(upper=0)
+    if state is not None:
+        # La semilla entra como primer valor de la recursión y se descarta
+        gain = pd.concat([pd.Series([state["avg_gain"]]), gain], ignore_index=True)
+        loss = pd.concat([pd.Series([state["avg_loss"]]), loss], ignore_index=True)
+    g = gain.ewm(**ewm).mean().to_numpy()
+    l = loss.ewm(**ewm).mean().to_numpy()
+    if state is not None:
+        g, l = g[1:], l[1:]
+    return g, l
+
+
+def _rsi(g: np.ndarray, l: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 100 * g / (g + l)
+
+
+def _pivots(times, closes, rsi, state: dict | None, n_before: int) -> list[dict]:
+    """
+    Picos/valles de `rsi` con los dos últimos RSI del estado como prefijo,
+    para no perder el pivote en la última vela del día anterior. Cada uno
+    lleva su `ordinal` (índice de vela en la cadena) y el de la vela que lo
+    confirma (`confirmed`), que decide el día en que se guarda.
+    """
+    prev = [state["r_prev"], state["r_last"]] if state else [np.nan, np.nan]
+    vals = np.concatenate([prev, rsi])
+    t = np.concatenate([[-1, state["last_time"] if state else -1], times])
+    c = np.concatenate([[np.nan, state["last_close"] if state else np.nan], closes])
+    mid, left, right = vals[1:-1], vals[:-2], vals[2:]
+    with np.errstate(invalid="ignore"):
+        is_peak = (mid - left > RSI_PIVOT_EPS) & (mid - right > RSI_PIVOT_EPS)
+        is_valley = (left - mid > RSI_PIVOT_EPS) & (right - mid > RSI_PIVOT_EPS)
+    idx = np.flatnonzero(is_peak | is_valley) + 1
+    return [
+        {"time": int(t[i]), "close": float(c[i]), "rsi": float(vals[i]),
+         "type": "peak" if peak else "valley",
+         "ordinal": n_before - 2 + int(i), "confirmed": int(t[i + 1])}
+        for i, peak in zip(idx.tolist(), is_peak[idx - 1].tolist())
+    ]
+
+
+def _state_of(record) -> dict:
+    return {k: record[k] for k in ("last_time", "last_close", "avg_gain", "avg_loss",
+                                   "n", "r_prev", "r_last")}
+
+
+# ── Actualización ──────────────────────────────────────────────────────
+
+def update_days(symbol: str, timeframe: str, df: pd.DataFrame, covered_from: int,
+                covered_until: int, box_start: str, box_end: str, warmup: int,
+                now: int | None = None) -> int:
+    """
+    Materializa los días cerrados de `df` (velas del timeframe principal que
+    cubren [covered_from, covered_until] sin huecos) posteriores al último
+    día guardado. Continúa la cadena del RSI si `df` empieza justo después
+    del último estado; si no, la reinicia y solo guarda días con al menos
+    `warmup` velas previas. Retorna los días agregados.
+    """
+    now = now or int(pd.Timestamp.now(tz="UTC").timestamp())
+    if df is None or df.empty:
+        return 0
+    stored = _read(symbol, _days_name(timeframe))
+    last = stored.iloc[-1] if not stored.empty else None
+    days = _complete_days(covered_from, covered_until, now)
+    if last is not None:
+        days = [d for d in days if d > int(last["day"])]
+    if not days:
+        return 0
+
+    chained = last is not None and covered_from <= int(last["last_time"]) + 1
+    state = _state_of(last) if chained else None
+    bars = df[(df["time"] > (int(last["last_time"]) if chained else -1))
+              & (df["time"] < days[-1] + DAY)]
+    if bars.empty:
+        return 0
+    times = bars["time"].to_numpy(np.int64)
+    closes = bars["close"].to_numpy(float)
+    g, l = _wilder(closes, state)
+    rsi = _rsi(g, l)
+    n_before = int(state["n"]) if state else (int(last["n"]) if last is not None else 0)
+    pivots = pd.DataFrame(_pivots(times, closes, rsi, state, n_before))
+    bs, be = _hhmm(box_start), _hhmm(box_end)
+
+    rows = []
+    for day in days:
+        end = int(np.searchsorted(times, day + DAY))      # velas [0, end) hasta el cierre del día
+        if end == 0 or times[end - 1] < day:
+            continue                                       # día sin velas (mercado cerrado)
+        if not chained and end < warmup:
+            continue                                       # RSI aún sin estabilizar
+        i = end - 1
+        day_pivots = pivots[(pivots["confirmed"] >= day) & (pivots["confirmed"] < day + DAY)] \
+            if not pivots.empty else pivots
+        high, low, amplitud = box_strategy(bars, day + bs, day + be)
+        rows.append({
+            "day": day,
+            "last_time": int(times[i]),
+            "last_close": float(closes[i]),
+            "avg_gain": float(g[i]),
+            "avg_loss": float(l[i]),
+            "n": n_before + end,
+            "r_prev": float(rsi[i - 1]) if i > 0 else (state["r_last"] if state else np.nan),
+            "r_last": float(rsi[i]),
+            "pivots": json.dumps(day_pivots.drop(columns="confirmed").to_dict("records")),
+            "box_hours": f"{box_start}-{box_end}",
+            "box_high": np.nan if high is None else float(high),
+            "box_low": np.nan if low is None else float(low),
+            "amplitud": np.nan if amplitud is None else float(amplitud),
+        })
+    _append(symbol, _days_name(timeframe), rows)
+    if rows:
+        log.info("[store] %s: %d día(s) %s materializados (RSI %s)",
+                 symbol, len(rows), timeframe, "encadenado" if chained else "reiniciado")
+    return len(rows)
+
+
+def update_vp(symbol: str, df_vp: pd.DataFrame, covered_from: int, covered_until: int,
+              now: int | None = None, body_w: float = 0.70) -> int:
+    """
+    Guarda los tramos del Volume Profile de cada día cerrado de `df_vp` (velas
+    de 1 min que cubren [covered_from, covered_until]); los días sin velas
+    quedan vacíos.
+    """
+    now = now or int(pd.Timestamp.now(tz="UTC").timestamp())
+    if df_vp is None or df_vp.empty:
+        df_vp = pd.DataFrame({"time": np.empty(0, np.int64)})
+    stored = _read(symbol, VP_FILE)
+    known = set(stored["day"].tolist()) if not stored.empty else set()
+    rows = []
+    times = df_vp["time"].to_numpy(np.int64)
+    for day in _complete_days(covered_from, covered_until, now):
+        if day in known:
+            continue
+        a, b = np.searchsorted(times, [day, day + DAY])
+        g = df_vp.iloc[a:b]
+        if g.empty:
+            # Día sin velas (fin de semana/feriado): se guarda vacío para no volver a pedirlo
+            rows.append({"day": day, "low": np.nan, "high": np.nan, "seg_lo": [], "seg_hi": [],
+                         "seg_vol": [], "seg_kind": []})
+            continue
+        lo, hi, vol, kind = ohlc_segments(g["open"], g["high"], g["low"], g["close"],
+                                          g["volume"], body_w, kinds=True)
+        rows.append({"day": day, "low": float(g["low"].min()), "high": float(g["high"].max()),
+                     "seg_lo": lo, "seg_hi": hi, "seg_vol": vol, "seg_kind": kind})
+    _append(symbol, VP_FILE, rows)
+    if rows:
+        log.info("[store] %s: %d día(s) de tramos VP materializados", symbol, len(rows))
+    return len(rows)
+
+
+# ── Consulta ───────────────────────────────────────────────────────────
+
+@dataclass
+class VpPlan:
+    """Días del store dentro de la ventana + tramos que hay que leer crudos."""
+    days: pd.DataFrame
+    raw_ranges: list[tuple[int, int]] = field(default_factory=list)
+
+
+def plan_vp(symbol: str, start_unix: int, end_unix: int) -> VpPlan:
+    stored = _read(symbol, VP_FILE) if FEATURE_STORE else pd.DataFrame()
+    if not stored.empty:
+        stored = stored[(stored["day"] >= start_unix) & (stored["day"] + DAY - 1 <= end_unix)]
+    ranges, cursor = [], start_unix
+    for day in (stored["day"].tolist() if not stored.empty else []):
+        if day > cursor:
+            ranges.append((cursor, day - 1))
+        cursor = day + DAY
+    if cursor <= end_unix:
+        ranges.append((cursor, end_unix))
+    return VpPlan(days=stored, raw_ranges=ranges)
+
+
+def vp_segments(plan: VpPlan, raw_parts: list[tuple[int, pd.DataFrame]], body_w: float = 0.70):
+    """
+    Tramos (lo, hi, vol) de la ventana en el orden de build_vp_ohlc + (pmin,
+    pmax): días guardados y tramos crudos `(desde, velas)` intercalados por tiempo.
+    """
+    pieces = []                         # (inicio, (lo, hi, vol, kind), low, high)
+    for rec in plan.days.itertuples():
+        if len(rec.seg_lo) == 0:
+            continue
+        pieces.append((int(rec.day), (rec.seg_lo, rec.seg_hi, rec.seg_vol, rec.seg_kind),
+                       rec.low, rec.high))
+    for start, part in raw_parts:
+        if part is None or part.empty:
+            continue
+        segments = ohlc_segments(part["open"], part["high"], part["low"], part["close"],
+                                 part["volume"], body_w, kinds=True)
+        pieces.append((start, segments, float(part["low"].min()), float(part["high"].max())))
+    if not pieces:
+        return (np.empty(0), np.empty(0), np.empty(0)), np.nan, np.nan
+    pieces.sort(key=lambda p: p[0])
+    segments = merge_segments([p[1] for p in pieces])
+    return segments, min(p[2] for p in pieces), max(p[3] for p in pieces)
+
+
+def rsi_state(symbol: str, timeframe: str, end_unix: int) -> dict | None:
+    """Último registro diario con cierre <= end_unix (estado + pivotes previos) o None."""
+    if not FEATURE_STORE:
+        return None
+    stored = _read(symbol, _days_name(timeframe))
+    if stored.empty:
+        return None
+    upto = stored[stored["day"] + DAY - 1 <= end_unix]
+    if upto.empty:
+        return None
+    record = upto.iloc[-1]
+    state = _state_of(record)
+    state["day"] = int(record["day"])
+    state["history"] = upto
+    return state
+
+
+def rsi_features(state: dict, tail: pd.DataFrame, horizon: int) -> tuple[float | None, list[dict]]:
+    """
+    rsi_last y picos/valles de las últimas `horizon` velas: estado del store
+    + velas crudas posteriores (`tail`, puede estar vacío).
+    """
+    if tail is not None and not tail.empty:
+        times = tail["time"].to_numpy(np.int64)
+        closes = tail["close"].to_numpy(float)
+        g, l = _wilder(closes, state)
+        rsi = _rsi(g, l)
+        fresh = _pivots(times, closes, rsi, state, int(state["n"]))
+        rsi_last = float(rsi[-1])
+        total = int(state["n"]) + len(times)
+    else:
+        fresh, rsi_last, total = [], float(state["r_last"]), int(state["n"])
+
+    # Pivotes guardados de los días que caen en el horizonte
+    stored = []
+    for raw in state["history"]["pivots"].iloc[::-1]:
+        points = json.loads(raw)
+        stored = points + stored
+        if points and points[0]["ordinal"] < total - horizon:
+            break
+    points = [p for p in stored + fresh if p["ordinal"] >= total - horizon]
+    return rsi_last, [{k: p[k] for k in ("time", "close", "rsi", "type")} for p in points]
+
+
+def box(symbol: str, timeframe: str, day: int, box_start: str, box_end: str):
+    """(high, low, amplitud) guardados para el día y horario de caja, o None."""
+    if not FEATURE_STORE:
+        return None
+    stored = _read(symbol, _days_name(timeframe))
+    if stored.empty:
+        return None
+    hit = stored[(stored["day"] == day) & (stored["box_hours"] == f"{box_start}-{box_end}")]
+    if hit.empty or pd.isna(hit["box_high"].iloc[0]):
+        return None
+    rec = hit.iloc[0]
+    amplitud = None if pd.isna(rec["amplitud"]) else float(rec["amplitud"])
+    return float(rec["box_high"]), float(rec["box_low"]), amplitud
@@ -1,15 +1,32 @@
 import os
+import json
+import time
+import threading
+import contextvars
+from collections import OrderedDict
+from functools import partial
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from dataclasses import dataclass
 from broker_api.login import sesion_capitalcom
 from broker_api.api_requests import price_capital, price_simple
 from tools_bot.interval_fecha import date_ranges
-from tools_bot.time_now import unix_time
+from tools_bot.time_now import unix_time, _unix_to_iso
 from tools_bot.box import box_strategy
 from tools_bot.utils_trading_rsi import rsi
-from tools_bot.utils_trading_vp import vp_features_compose
+from tools_bot.utils_trading_vp import (
+    vp_features_compose, vp_features_from_segments, vp_features_stream,
+)
 from tools_bot.standar_data import standar_data
 from utils.logger import get_logger
+from utils.tracing import span, traced
+from utils import metrics
+from utils.shm import SharedFrame, share_frame, read_frame, release
+from preprocess import feature_store
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -23,6 +40,8 @@ DEFAULT_END = os.getenv("END_VP")
 DEFAULT_BOX_DATE = os.getenv("BOX_DATE")  # "YYYY-MM-DD", si no se pasa usa end_date
 DEFAULT_BOX_START = os.getenv("BOX_START", "08:00")
 DEFAULT_BOX_END = os.getenv("BOX_END", "09:55")
+# Amplitud máxima de la caja (%) para operar; ajustable con backtest.sweep
+MAX_AMPLITUD = float(os.getenv("MAX_AMPLITUD", "1.0"))
 
 DATA_LOADER_PATH = os.path.join(
     os.path.dirname(__file__), "..", "data_loader"
@@ -30,6 +49,61 @@ DATA_LOADER_PATH = os.path.join(
 VP_LOADER_PATH = os.path.join(
     os.path.dirname(__file__), "..", "data_loader", "vp"
 )
+WARM_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "data_loader", "warm"
+)
+SIMPLE_LOADER_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "data_loader", "simple"
+)
+
+# Caché en memoria de parquets ya leídos: {ruta: (mtime_ns, DataFrame)}, LRU
+# acotado a FRAME_CACHE_MB (el modo servicio lee parquets de todos los símbolos)
+FRAME_CACHE = os.getenv("FRAME_CACHE", "true").lower() in ("1", "true", "yes")
+FRAME_CACHE_MB = float(os.getenv("FRAME_CACHE_MB", "512"))
+_frame_cache: OrderedDict[str, tuple[int, pd.DataFrame]] = OrderedDict()
+_frame_bytes: dict[str, int] = {}
+_frame_lock = threading.Lock()
+
+# Ventana de cada indicador:
+#   warmup  – velas previas para estabilizar el indicador. El RSI de Wilder
+#             olvida el arranque como (13/14)^n: con 250 velas el error es ~1e-8
+#             (depende del nº de velas, no del timeframe)
+#   horizon – segundos cuyo resultado se usa (picos/valles recientes del RSI);
+#             se pasan a velas con TIMEFRAME_SECONDS del timeframe de la corrida
+RSI_WARMUP = int(os.getenv("RSI_WARMUP", "250"))
+RSI_PIVOT_SECONDS = int(os.getenv("RSI_PIVOT_SECONDS", "86400"))   # último día
+# Diferencias de RSI menores son empates: con closes repetidos el RSI se
+# mantiene y solo varía el redondeo, que no debe crear picos/valles
+RSI_PIVOT_EPS = 1e-6
+
+# Backend de la etapa de features (RSI, picos, VP): threads | processes | inline
+FEATURE_EXECUTOR = os.getenv("FEATURE_EXECUTOR", "threads").lower()
+FEATURE_WORKERS = int(os.getenv("FEATURE_WORKERS", "0")) or None
+_feature_pool = None
+_feature_pool_lock = threading.Lock()
+
+# Hilos de I/O por símbolo: SimpleFX y VP se cargan mientras baja Capital.com
+PREPROCESS_IO_WORKERS = int(os.getenv("PREPROCESS_IO_WORKERS", "4"))
+_io_pool: ThreadPoolExecutor | None = None
+_io_pool_lock = threading.Lock()
+
+# VP de rangos largos leyendo el parquet por lotes (memoria constante)
+VP_STREAM_DAYS = float(os.getenv("VP_STREAM_DAYS", "30"))
+VP_BATCH_ROWS = int(os.getenv("VP_BATCH_ROWS", "65536"))
+# Row groups acotados: la lectura por lotes solo descomprime los que solapan el rango
+PARQUET_ROW_GROUP = 65536
+
+CACHE_LOOKUPS = metrics.counter(
+    "cache_lookups_total", "Resultado de la consulta al caché parquet "
+    "(hit | partial | refetch | miss)", ["kind", "result"])
+FRAME_CACHE_LOOKUPS = metrics.counter(
+    "frame_cache_total", "Caché en memoria de parquets por mtime (hit | miss | evict)", ["result"])
+API_CANDLES = metrics.counter(
+    "api_candles_total", "Velas descargadas de Capital.com", ["timeframe"])
+API_CHUNKS = metrics.counter(
+    "api_chunks_total", "Bloques (peticiones price_capital) por descarga", ["timeframe"])
+SIMPLE_CANDLES = metrics.counter(
+    "api_simple_candles_total", "Velas descargadas de SimpleFX", ["timeframe"])
 
 # Mapeo de timeframe Capital.com -> segundos por vela (para date_ranges)
 TIMEFRAME_SECONDS = {
@@ -44,6 +118,35 @@ TIMEFRAME_SECONDS = {
 }
 
 
+@dataclass(frozen=True)
+class Lookback:
+    """Ventana de un indicador: calentamiento (velas) + horizonte usado (segundos)."""
+    warmup: int
+    horizon_seconds: int
+
+    def horizon(self, timeframe: str) -> int:
+        """Velas del timeframe que cubren el horizonte."""
+        return -(-self.horizon_seconds // TIMEFRAME_SECONDS.get(timeframe, 60))
+
+    def bars(self, timeframe: str) -> int:
+        return self.warmup + self.horizon(timeframe)
+
+
+FEATURE_LOOKBACK = {
+    "rsi": Lookback(warmup=RSI_WARMUP, horizon_seconds=RSI_PIVOT_SECONDS),
+}
+
+
+def feature_window(df: pd.DataFrame, feature: str, timeframe: str) -> pd.DataFrame:
+    """Últimas `FEATURE_LOOKBACK[feature].bars(timeframe)` velas de `df` (vista, sin copiar)."""
+    bars = FEATURE_LOOKBACK[feature].bars(timeframe)
+    return df.iloc[-bars:] if len(df) > bars else df
+
+
+class NoCandlesError(RuntimeError):
+    """La API no devolvió velas para el rango pedido (mercado cerrado, rango futuro)."""
+
+
 @dataclass
 class PreprocessResult:
     symbols: str
@@ -53,6 +156,92 @@ class PreprocessResult:
     features: dict
 
 
+def load_warm_report(symbol: str) -> dict | None:
+    """Último reporte de warm-up del símbolo (ver preprocess.warmup), o None."""
+    file = os.path.join(WARM_PATH, f"{symbol}.json")
+    if not os.path.exists(file):
+        return None
+    try:
+        with open(file, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+@traced("parquet.load")
+def _read_parquet_cached(file: str) -> pd.DataFrame | None:
+    """
+    Lee un parquet de velas ordenado por time. Con FRAME_CACHE activo guarda
+    el DataFrame en memoria y lo reutiliza mientras el mtime del archivo no
+    cambie (procesos de larga vida, ver strategy_ai.service).
+    """
+    try:
+        mtime = os.stat(file).st_mtime_ns
+    except OSError:
+        return None
+    if FRAME_CACHE:
+        with _frame_lock:
+            hit = _frame_cache.get(file)
+            if hit is not None and hit[0] == mtime:
+                _frame_cache.move_to_end(file)
+            else:
+                hit = None
+        if hit is not None:
+            FRAME_CACHE_LOOKUPS.inc(result="hit")
+            return hit[1]
+        FRAME_CACHE_LOOKUPS.inc(result="miss")
+    try:
+        table = pq.read_table(file)
+    except Exception:
+        return None
+    if "time" not in table.column_names:
+        return None
+    # self_destruct libera cada columna Arrow al convertirla: el pico de
+    # memoria es ~1 copia de las velas en vez de 2
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    del table
+    if not df["time"].is_monotonic_increasing:
+        df = df.sort_values("time").reset_index(drop=True)
+    _cache_frame(file, mtime, df)
+    return df
+
+
+def _cache_frame(file: str, mtime: int, df: pd.DataFrame):
+    """Guarda `df` en el caché en memoria y descarta los menos usados por encima de FRAME_CACHE_MB."""
+    if not FRAME_CACHE:
+        return
+    size = int(df.memory_usage(index=False).sum())
+    limit = FRAME_CACHE_MB * 1024 * 1024
+    with _frame_lock:
+        _frame_cache.pop(file, None)
+        _frame_bytes.pop(file, None)
+        if size > limit:            # no cabe: no desalojar todo por un solo parquet
+            return
+        _frame_cache[file] = (mtime, df)
+        _frame_bytes[file] = size
+        total = sum(_frame_bytes.values())
+        while total > limit:
+            old, _ = _frame_cache.popitem(last=False)
+            total -= _frame_bytes.pop(old)
+            FRAME_CACHE_LOOKUPS.inc(result="evict")
+
+
+def time_slice(df: pd.DataFrame, start: int, end: int, reset_index: bool = False) -> pd.DataFrame:
+    """
+    Filas con time en [start, end] de un DataFrame ordenado por time: corte
+    por posición (searchsorted) en lugar de máscara + copia. No modificar el
+    resultado en sitio: comparte datos con `df` (y con el caché en memoria).
+    `reset_index` renumera 0..n-1 sin copiar las columnas.
+    """
+    times = df["time"].to_numpy()
+    lo = int(np.searchsorted(times, start, side="left"))
+    hi = int(np.searchsorted(times, end, side="right"))
+    out = df.iloc[lo:hi]
+    if reset_index:
+        out.index = pd.RangeIndex(len(out))
+    return out
+
+
 def loader_file(symb: str, start: int, end: int, path: str = DATA_LOADER_PATH):
     """
     Carga el parquet de un símbolo y retorna solo las filas dentro de [start, end].
@@ -61,30 +250,30 @@ def loader_file(symb: str, start: int, end: int, path: str = DATA_LOADER_PATH):
     file = os.path.join(path, f"{symb}.parquet")
     if not os.path.exists(file):
         return None, None
-    try:
-        df = pd.read_parquet(file, engine="pyarrow")
-    except Exception:
+    df = _read_parquet_cached(file)
+    if df is None:
         return None, None
-    if "time" not in df.columns:
-        return None, None
-    df = df.sort_values("time").reset_index(drop=True)
-    df_range = df[(df["time"] >= start) & (df["time"] <= end)].copy()
-    return df_range, df
+    return time_slice(df, start, end), df
 
 
+@traced("parquet.save")
 def save_parquet(df: pd.DataFrame, symb: str, path: str = DATA_LOADER_PATH):
     """Guarda el DataFrame procesado como parquet para reutilización futura."""
     os.makedirs(path, exist_ok=True)
     file = os.path.join(path, f"{symb}.parquet")
-    df.to_parquet(file, engine="pyarrow", index=False)
+    df.to_parquet(file, engine="pyarrow", index=False, row_group_size=PARQUET_ROW_GROUP)
+    if FRAME_CACHE:
+        _cache_frame(file, os.stat(file).st_mtime_ns, df)
     return file
 
 
+@traced("pipeline.fetch_from_api")
 def fetch_from_api(symbol, timeframe, start_unix, end_unix, max_candles):
     """Descarga velas desde la API de Capital.com en el rango unix dado."""
     security_token, cst = sesion_capitalcom()
     tf_seconds = TIMEFRAME_SECONDS.get(timeframe, 60)
     intervalos = date_ranges(start_unix, end_unix, time=tf_seconds)
+    API_CHUNKS.inc(len(intervalos), timeframe=timeframe)
 
     dataframe = []
     for from_, to_ in intervalos:
@@ -100,18 +289,211 @@ def fetch_from_api(symbol, timeframe, start_unix, end_unix, max_candles):
     df = pd.concat(valid, ignore_index=True)
     #print('no estandar',df)
     df_norm = standar_data(df)
-    return df_norm.drop_duplicates(subset=["time"]).sort_values("time").reset_index(drop=True)
+    API_CANDLES.inc(len(df_norm), timeframe=timeframe)
+    return merge_and_deduplicate(None, df_norm)
 
 
 def merge_and_deduplicate(old_df: pd.DataFrame | None, new_df: pd.DataFrame) -> pd.DataFrame:
-    """Combina datos existentes con nuevos, elimina duplicados y ordena por time."""
+    """
+    Combina datos existentes con nuevos, elimina duplicados (queda la primera
+    aparición, la de `old_df`) y ordena por time. Una sola copia de las velas:
+    el orden se resuelve sobre el array de time y se aplica con un `take`.
+    """
     if old_df is not None and not old_df.empty:
         combined = pd.concat([old_df, new_df], ignore_index=True)
     else:
-        combined = new_df.copy()
-    return combined.drop_duplicates(subset=["time"]).sort_values("time").reset_index(drop=True)
+        combined = new_df
+    times = combined["time"].to_numpy()
+    order = np.argsort(times, kind="stable")
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = times[order[1:]] != times[order[:-1]]
+    order = order[keep]
+    if len(order) == len(combined) and (np.diff(order) > 0).all():
+        # Ya ordenado y sin duplicados: solo normalizar el índice
+        result = combined.iloc[:]
+    else:
+        result = combined.take(order)
+    result.index = pd.RangeIndex(len(result))
+    return result
+
+
+# ── Cobertura (sidecar JSON) ──────────────────────────────────────────
+#
+# Los parquets de SimpleFX guardan ventanas sueltas (una caja por día), así
+# que la detección de huecos por bordes de load_or_fetch no sirve: junto al
+# parquet se guarda la lista de intervalos [desde, hasta] ya descargados.
+
+def _coverage_file(name: str, path: str) -> str:
+    return os.path.join(path, f"{name}.coverage.json")
+
+
+def load_coverage(name: str, path: str) -> list[tuple[int, int]]:
+    """Intervalos [desde, hasta] (unix) cubiertos por el parquet `name`."""
+    try:
+        with open(_coverage_file(name, path), encoding="utf-8") as f:
+            return [tuple(iv) for iv in json.load(f)["intervals"]]
+    except (OSError, ValueError, KeyError):
+        return []
+
+
+def save_coverage(name: str, path: str, intervals: list[tuple[int, int]]):
+    os.makedirs(path, exist_ok=True)
+    file = _coverage_file(name, path)
+    tmp = f"{file}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"intervals": [list(iv) for iv in merge_intervals(intervals)]}, f)
+    os.replace(tmp, file)
+
+
+def merge_intervals(intervals: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Ordena y une intervalos solapados o contiguos (a, b) + (b + 1, c)."""
+    merged: list[tuple[int, int]] = []
+    for lo, hi in sorted(intervals):
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], hi))
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def missing_ranges(intervals: list[tuple[int, int]], start: int, end: int) -> list[tuple[int, int]]:
+    """Tramos de [start, end] que no cubre ningún intervalo."""
+    gaps, cursor = [], start
+    for lo, hi in merge_intervals(intervals):
+        if hi < cursor:
+            continue
+        if lo > end:
+            break
+        if lo > cursor:
+            gaps.append((cursor, lo - 1))
+        cursor = max(cursor, hi + 1)
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
 
 
+@traced("pipeline.load_or_fetch_simple")
+def load_or_fetch_simple(symbol: str, tf_seconds: int, start_unix: int, end_unix: int,
+                         use_cache: bool = True) -> pd.DataFrame:
+    """
+    Velas de SimpleFX (precios de ejecución) con caché propio en
+    SIMPLE_LOADER_PATH/{symbol}_{tf}.parquet + sidecar de cobertura.
+    Descarga solo los tramos de [start, end] no cubiertos; las velas aún
+    abiertas no se marcan como cubiertas.
+    """
+    name = f"{symbol}_{tf_seconds}"
+    covered = load_coverage(name, SIMPLE_LOADER_PATH) if use_cache else []
+    gaps = missing_ranges(covered, start_unix, end_unix)
+    df_range, df_full = loader_file(symb=name, start=start_unix, end=end_unix, path=SIMPLE_LOADER_PATH)
+
+    if not gaps:
+        CACHE_LOOKUPS.inc(kind="simple", result="hit")
+        if df_range is None:    # ventana cubierta pero sin velas (mercado cerrado)
+            return pd.DataFrame()
+        log.info("[simple-cache] %s: ventana en caché (%d filas)", symbol, len(df_range))
+        return time_slice(df_range, start_unix, end_unix, reset_index=True)
+
+    CACHE_LOOKUPS.inc(kind="simple", result="partial" if covered else "miss")
+    log.info("[simple-api] %s: descargando %d tramo(s) de SimpleFX", symbol, len(gaps))
+    parts = []
+    for gap_start, gap_end in gaps:
+        df_gap = price_simple(symbol, tf_seconds, gap_start, gap_end)
+        if df_gap is not None and not df_gap.empty:
+            parts.append(df_gap)
+
+    if parts:
+        df_new = pd.concat(parts, ignore_index=True)
+        df_new["time"] = df_new["time"].astype("int64")
+        SIMPLE_CANDLES.inc(len(df_new), timeframe=str(tf_seconds))
+        df_full = merge_and_deduplicate(df_full, df_new)
+        save_parquet(df_full, name, path=SIMPLE_LOADER_PATH)
+
+    closed_until = int(time.time()) - tf_seconds
+    covered += [(lo, min(hi, closed_until)) for lo, hi in gaps if min(hi, closed_until) >= lo]
+    save_coverage(name, SIMPLE_LOADER_PATH, covered)
+
+    if df_full is None or df_full.empty:
+        return pd.DataFrame()
+    return time_slice(df_full, start_unix, end_unix, reset_index=True)
+
+
+def _get_io_pool() -> ThreadPoolExecutor:
+    """Pool compartido para las cargas de I/O que corren en paralelo por símbolo."""
+    global _io_pool
+    with _io_pool_lock:
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(max_workers=PREPROCESS_IO_WORKERS,
+                                          thread_name_prefix="preprocess-io")
+    return _io_pool
+
+
+def _submit_io(fn, *args):
+    # copy_context: los spans del hilo de I/O cuelgan del span del símbolo
+    return _get_io_pool().submit(contextvars.copy_context().run, fn, *args)
+
+
+@traced("pipeline.box_window")
+def load_box_window(symbol: str, timeframe: str, box_from: int, box_to: int,
+                    max_candles: int = 500, use_cache: bool = True
+                    ) -> tuple[pd.DataFrame, tuple[int, int] | None]:
+    """
+    Velas solo de la ventana de la caja (BOX_START–BOX_END).
+    Usa el parquet si cubre la ventana completa; si no, descarga únicamente
+    esa ventana (desde el final del caché si cabe en la misma petición).
+    Lo descargado aquí NO se guarda: un bloque aislado en el parquet crearía
+    huecos internos que la detección por bordes no ve; se pasa a
+    `load_or_fetch` (prefetched) para no pedirlo dos veces.
+    Retorna (df_caja, (desde, hasta) descargado o None si vino del caché).
+    """
+    tf_seconds = TIMEFRAME_SECONDS.get(timeframe, 60)
+    fetch_from = box_from
+    if use_cache:
+        df_box, df_full = loader_file(symb=symbol, start=box_from, end=box_to)
+        if (
+            df_box is not None and not df_box.empty
+            and int(df_box["time"].min()) < box_from + tf_seconds
+            and int(df_box["time"].max()) > box_to - tf_seconds
+        ):
+            log.info("[box-cache] %s: ventana de caja en caché (%d filas)", symbol, len(df_box))
+            CACHE_LOOKUPS.inc(kind="box", result="hit")
+            return df_box, None
+        if df_full is not None and not df_full.empty:
+            # Hueco del caché hasta la caja en la misma petición: la cola de
+            # load_or_fetch reutiliza esta descarga en lugar de repetirla
+            cached_max = int(df_full["time"].iloc[-1])
+            if cached_max < box_from and (box_to - cached_max) // tf_seconds <= max_candles:
+                fetch_from = cached_max + 1
+
+    CACHE_LOOKUPS.inc(kind="box", result="miss")
+
+    log.info("[box-api] %s: descargando solo la ventana de caja ts=%d..%d", symbol, fetch_from, box_to)
+    return fetch_from_api(symbol, timeframe, fetch_from, box_to, max_candles), (fetch_from, box_to)
+
+
+def _fetch_missing(symbol: str, timeframe: str, start_unix: int, end_unix: int, max_candles: int,
+                   prefetched: tuple[int, int, pd.DataFrame] | None = None) -> pd.DataFrame:
+    """
+    fetch_from_api de [start, end] sin volver a pedir la ventana `prefetched`
+    (desde, hasta, velas) ya descargada: se piden solo los tramos a sus
+    lados, salvo que partir el rango cueste más peticiones que repetirla.
+    """
+    if prefetched is None or prefetched[1] < start_unix or prefetched[0] > end_unix:
+        return fetch_from_api(symbol, timeframe, start_unix, end_unix, max_candles)
+    lo, hi, df_pre = prefetched
+    tf_seconds = TIMEFRAME_SECONDS.get(timeframe, 60)
+    sides = [(a, b) for a, b in ((start_unix, lo - 1), (hi + 1, end_unix)) if a <= b]
+    if sum(len(date_ranges(a, b, time=tf_seconds)) for a, b in sides) > \
+            len(date_ranges(start_unix, end_unix, time=tf_seconds)):
+        return fetch_from_api(symbol, timeframe, start_unix, end_unix, max_candles)
+    parts = [time_slice(df_pre, start_unix, end_unix)] if not df_pre.empty else []
+    parts += [fetch_from_api(symbol, timeframe, a, b, max_candles) for a, b in sides]
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return pd.DataFrame()
+    return merge_and_deduplicate(None, pd.concat(parts, ignore_index=True))
+
+
+@traced("pipeline.load_or_fetch_vp")
 def load_or_fetch_vp(symbol: str, start_unix: int, end_unix: int, max_candles: int = 500) -> pd.DataFrame:
     """
     Carga o descarga datos de 1 minuto exclusivos para Volume Profile.
@@ -135,8 +517,11 @@ def load_or_fetch_vp(symbol: str, start_unix: int, end_unix: int, max_candles: i
 
         if not missing:
             log.info("[vp-cache] %s: rango completo (%d filas 1min)", symbol, len(df_in_range))
+            CACHE_LOOKUPS.inc(kind="vp", result="hit")
             return df_in_range
 
+        CACHE_LOOKUPS.inc(kind="vp", result="partial")
+
         log.info("[vp-cache] %s: %d filas, descargando %d rango(s)",
                  symbol, len(df_in_range), len(missing))
         parts = [df_in_range]
@@ -151,15 +536,15 @@ def load_or_fetch_vp(symbol: str, start_unix: int, end_unix: int, max_candles: i
         save_parquet(df_full_updated, vp_symb, path=VP_LOADER_PATH)
         log.info("[vp-update] %s: parquet VP actualizado -> %d filas", symbol, len(df_full_updated))
 
-        return df_vp[
-            (df_vp["time"] >= start_unix) & (df_vp["time"] <= end_unix)
-        ].reset_index(drop=True)
+        return time_slice(df_vp, start_unix, end_unix, reset_index=True)
 
     # Sin caché o parquet vacío en rango -> descargar completo
     if df_full is not None:
         log.info("[vp-cache] %s: parquet VP existe pero sin datos en rango", symbol)
+        CACHE_LOOKUPS.inc(kind="vp", result="refetch")
     else:
         log.info("[vp-api] %s: sin parquet VP, descargando completo 1min", symbol)
+        CACHE_LOOKUPS.inc(kind="vp", result="miss")
 
     df_new = fetch_from_api(symbol, "MINUTE", start_unix, end_unix, max_candles)
     if df_new.empty:
@@ -177,56 +562,141 @@ def load_or_fetch_vp(symbol: str, start_unix: int, end_unix: int, max_candles: i
     return df_new
 
 
-def preprocess_data(
-    symbol: str | None = None,
-    timeframe: str | None = None,
-    start_date: str | None = None,
-    end_date: str | None = None,
-    box_date: str | None = None,
-    box_start_hour: str | None = None,
-    box_end_hour: str | None = None,
-    max_candles: int = 500,
-    use_cache: bool = True,
-):
+def parquet_time_bounds(file: str) -> tuple[int, int] | None:
+    """(min, max) de time según las estadísticas de los row groups, sin leer datos."""
+    try:
+        meta = pq.ParquetFile(file).metadata
+    except Exception:
+        return None
+    col = meta.schema.names.index("time") if "time" in meta.schema.names else None
+    if col is None or meta.num_row_groups == 0:
+        return None
+    lows, highs = [], []
+    for i in range(meta.num_row_groups):
+        stats = meta.row_group(i).column(col).statistics
+        if stats is None or not stats.has_min_max:
+            return None
+        lows.append(stats.min)
+        highs.append(stats.max)
+    return int(min(lows)), int(max(highs))
+
+
+def iter_parquet_batches(file: str, start_unix: int, end_unix: int, columns: list[str],
+                         batch_rows: int = VP_BATCH_ROWS):
     """
-    Descarga, normaliza y calcula features para cualquier símbolo y rango.
+    Lotes {columna: array numpy} con time en [start, end]. Solo lee los row
+    groups cuyas estadísticas solapan el rango y de a `batch_rows` filas.
+    """
+    # pre_buffer=False: con el prebuffer por defecto Arrow retiene los
+    # column chunks ya leídos y la memoria crece con el rango
+    pf = pq.ParquetFile(file, pre_buffer=False)
+    meta = pf.metadata
+    col = meta.schema.names.index("time")
+    groups = []
+    for i in range(meta.num_row_groups):
+        stats = meta.row_group(i).column(col).statistics
+        if stats is None or not stats.has_min_max or (stats.max >= start_unix and stats.min <= end_unix):
+            groups.append(i)
+    if not groups:
+        return
+    names = ["time", *[c for c in columns if c != "time"]]
+    for batch in pf.iter_batches(batch_size=batch_rows, row_groups=groups, columns=names):
+        arrays = {name: batch.column(name).to_numpy(zero_copy_only=False) for name in names}
+        mask = (arrays["time"] >= start_unix) & (arrays["time"] <= end_unix)
+        if mask.all():
+            yield arrays
+        elif mask.any():
+            yield {name: values[mask] for name, values in arrays.items()}
 
-    Parámetros
-    ----------
-    symbol         : str  – símbolo del instrumento (ej. "US500", "EURUSD").
-                            Por defecto usa SYMBOL del .env.
-    timeframe      : str  – resolución Capital.com (MINUTE, MINUTE_5, HOUR, DAY …).
-                            Por defecto usa TIMEFRAME del .env.
-    start_date     : str  – fecha/hora inicio "YYYY-MM-DD" o "YYYY-MM-DDTHH:MM:SS".
-                            Por defecto usa START_VP del .env.
-    end_date       : str  – fecha/hora fin. Por defecto usa END_VP del .env.
-    box_date       : str  – fecha de la caja "YYYY-MM-DD". Por defecto usa end_date.
-    box_start_hour : str  – hora inicio de la caja ("HH:MM"). Por defecto "08:00".
-    box_end_hour   : str  – hora fin de la caja ("HH:MM"). Por defecto "09:55".
-    max_candles    : int  – máximo de velas por petición (API limit).
-    use_cache      : bool – si True, intenta cargar datos previos de parquet.
 
-    Retorna
-    -------
-    PreprocessResult con la ruta del parquet y las features calculadas.
+def merge_into_parquet(file: str, df_new: pd.DataFrame, batch_rows: int = VP_BATCH_ROWS):
     """
-    # ── Resolver valores por defecto ──────────────────────────────────
-    symbol = symbol or DEFAULT_SYMBOL
-    timeframe = timeframe or DEFAULT_TIMEFRAME
-    start_date = start_date or DEFAULT_START
-    end_date = end_date or DEFAULT_END
+    Une velas nuevas a un parquet ordenado por time reescribiéndolo por lotes
+    en un temporal: la memoria es la de un lote más las velas nuevas, no la
+    del archivo. Ante duplicados gana la fila existente (merge_and_deduplicate).
+    No pasa por el caché en memoria y descarta la entrada del archivo.
+    """
+    df_new = merge_and_deduplicate(None, df_new)
+    new_times = df_new["time"].to_numpy()
+    tmp = f"{file}.tmp"
+    writer, cursor = None, 0
 
-    box_start_hour = box_start_hour or DEFAULT_BOX_START
-    box_end_hour = box_end_hour or DEFAULT_BOX_END
-    # box_date: si no se pasa, usa la parte fecha de end_date ("YYYY-MM-DD")
-    box_date = box_date or DEFAULT_BOX_DATE or (end_date[:10] if end_date else None)
+    def write(df):
+        nonlocal writer
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(tmp, table.schema)
+        writer.write_table(table.cast(writer.schema), row_group_size=PARQUET_ROW_GROUP)
 
-    if not symbol or not start_date or not end_date:
-        raise ValueError("Se requieren symbol, start_date y end_date.")
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    try:
+        if os.path.exists(file):
+            # Lotes contiguos y ordenados: cada vela nueva va con el lote que cubre su time
+            for batch in pq.ParquetFile(file, pre_buffer=False).iter_batches(batch_size=batch_rows):
+                old = batch.to_pandas()
+                upto = int(np.searchsorted(new_times, old["time"].iloc[-1], side="right"))
+                write(merge_and_deduplicate(old, df_new.iloc[cursor:upto]) if upto > cursor else old)
+                cursor = upto
+        if cursor < len(df_new) or writer is None:
+            write(df_new.iloc[cursor:])
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp, file)
+    with _frame_lock:
+        _frame_cache.pop(file, None)
+        _frame_bytes.pop(file, None)
 
-    # ── Convertir fechas a unix timestamps ────────────────────────────
-    start_unix, end_unix = unix_time(start_date, end_date)
 
+@traced("pipeline.vp_stream")
+def vp_features_out_of_core(symbol: str, start_unix: int, end_unix: int,
+                            max_candles: int = 500) -> dict | None:
+    """
+    Volume Profile de [start, end] leyendo el parquet VP de 1 minuto por
+    lotes (build_vp_stream): el rango nunca se carga completo en memoria.
+    Solo se descargan los tramos que no cubren el sidecar de cobertura ni
+    los bordes del parquet; se unen con `merge_into_parquet` (sin caché en
+    memoria) y las velas ya cerradas quedan marcadas como cubiertas.
+    """
+    name = f"{symbol}_vp"
+    file = os.path.join(VP_LOADER_PATH, f"{name}.parquet")
+    bounds = parquet_time_bounds(file) if os.path.exists(file) else None
+    covered = load_coverage(name, VP_LOADER_PATH) + ([bounds] if bounds else [])
+    gaps = missing_ranges(covered, start_unix, end_unix)
+
+    if gaps:
+        CACHE_LOOKUPS.inc(kind="vp", result="partial" if covered else "miss")
+        log.info("[vp-stream] %s: descargando %d tramo(s) sin cubrir", symbol, len(gaps))
+        parts = [fetch_from_api(symbol, "MINUTE", a, b, max_candles) for a, b in gaps]
+        parts = [part for part in parts if not part.empty]
+        if parts:
+            merge_into_parquet(file, pd.concat(parts, ignore_index=True))
+        closed_until = int(time.time()) - 60
+        covered += [(lo, min(hi, closed_until)) for lo, hi in gaps if min(hi, closed_until) >= lo]
+        save_coverage(name, VP_LOADER_PATH, covered)
+    else:
+        CACHE_LOOKUPS.inc(kind="vp", result="hit")
+    if not os.path.exists(file):
+        return None
+
+    columns = ["open", "high", "low", "close", "volume"]
+    vp_data = vp_features_stream(partial(iter_parquet_batches, file, start_unix, end_unix, columns))
+    log.info("[vp-stream] %s: VP de %.1f días por lotes de %d filas",
+             symbol, (end_unix - start_unix) / 86400, VP_BATCH_ROWS)
+    return vp_data
+
+
+@traced("pipeline.load_or_fetch")
+def load_or_fetch(symbol: str, timeframe: str, start_unix: int, end_unix: int,
+                  max_candles: int = 500, use_cache: bool = True,
+                  prefetched: tuple[int, int, pd.DataFrame] | None = None) -> tuple[pd.DataFrame, str]:
+    """
+    Carga velas del timeframe principal desde el parquet del símbolo y
+    descarga solo los huecos al inicio/final del rango pedido. `prefetched`
+    (desde, hasta, velas) es una ventana ya descargada (la caja de
+    load_box_window) que se une sin volver a pedirla.
+    Retorna (df_en_rango, ruta_parquet).
+    """
     # ── Flujo de caché + descarga de rangos faltantes ─────────────────
     df_unico = None
     needs_save = False
@@ -251,17 +721,19 @@ def preprocess_data(
             if not missing_ranges:
                 # El caché cubre todo el rango
                 log.info("[cache] %s: rango completo (%d filas)", symbol, len(df_in_range))
+                CACHE_LOOKUPS.inc(kind="candles", result="hit")
                 df_unico = df_in_range
             else:
                 # Descargar solo los rangos faltantes
                 log.info("[cache] %s: %d filas en caché, descargando %d rango(s) faltante(s)",
                          symbol, len(df_in_range), len(missing_ranges))
-                security_token, cst = None, None
+                CACHE_LOOKUPS.inc(kind="candles", result="partial")
                 parts = [df_in_range]
 
                 for gap_start, gap_end in missing_ranges:
                     log.debug("  -> descargando ts=%d..%d", gap_start, gap_end)
-                    df_gap = fetch_from_api(symbol, timeframe, gap_start, gap_end, max_candles)
+                    df_gap = _fetch_missing(symbol, timeframe, gap_start, gap_end, max_candles,
+                                            prefetched)
                     if not df_gap.empty:
                         parts.append(df_gap)
 
@@ -276,14 +748,13 @@ def preprocess_data(
                 needs_save = False  # ya se guardó
 
                 # Filtrar al rango solicitado
-                df_unico = df_unico[
-                    (df_unico["time"] >= start_unix) & (df_unico["time"] <= end_unix)
-                ].reset_index(drop=True)
+                df_unico = time_slice(df_unico, start_unix, end_unix, reset_index=True)
 
         elif df_full is not None:
             # Existe parquet pero no tiene datos en el rango → descargar todo el rango
             log.info("[cache] %s: parquet existe pero sin datos en rango, descargando completo", symbol)
-            df_new = fetch_from_api(symbol, timeframe, start_unix, end_unix, max_candles)
+            CACHE_LOOKUPS.inc(kind="candles", result="refetch")
+            df_new = _fetch_missing(symbol, timeframe, start_unix, end_unix, max_candles, prefetched)
             if not df_new.empty:
                 df_full_updated = merge_and_deduplicate(df_full, df_new)
                 save_parquet(df_full_updated, symbol)
@@ -296,9 +767,11 @@ def preprocess_data(
     # ── Descarga completa si no hay caché ─────────────────────────────
     if df_unico is None:
         log.info("[api] %s: descargando rango completo ts=%d..%d", symbol, start_unix, end_unix)
-        df_new = fetch_from_api(symbol, timeframe, start_unix, end_unix, max_candles)
+        if not use_cache or df_full is None:
+            CACHE_LOOKUPS.inc(kind="candles", result="miss")
+        df_new = _fetch_missing(symbol, timeframe, start_unix, end_unix, max_candles, prefetched)
         if df_new.empty:
-            raise RuntimeError(f"No se obtuvieron datos de la API para {symbol}")
+            raise NoCandlesError(f"No se obtuvieron datos de la API para {symbol}")
         df_unico = df_new
         needs_save = True
 
@@ -309,61 +782,302 @@ def preprocess_data(
     else:
         saved_path = os.path.join(DATA_LOADER_PATH, f"{symbol}.parquet")
 
-    # ── Calcular features ─────────────────────────────────────────────
-    rsi_series = rsi(df_unico)
-    last_rsi = float(rsi_series.iloc[-1]) if not rsi_series.empty else None
+    return df_unico, saved_path
 
+
+def rsi_pivots(df: pd.DataFrame, rsi_series: pd.Series) -> list[dict]:
+    """Picos y valles del RSI (máximos/mínimos locales) con su time y close."""
+    if len(rsi_series) < 3:
+        return []
     # RSI con timestamps y precio close alineados para detectar divergencias
-    rsi_points = []
-    if not rsi_series.empty:
-        rsi_df = pd.DataFrame({
-            "time": df_unico.loc[rsi_series.index, "time"].values,
-            "close": df_unico.loc[rsi_series.index, "close"].values,
-            "rsi": rsi_series.values,
-        })
-
-        # Detectar picos y valles del RSI (máximos/mínimos locales)
-        rsi_vals = rsi_df["rsi"].values
-        for i in range(1, len(rsi_vals) - 1):
-            is_peak = rsi_vals[i] > rsi_vals[i - 1] and rsi_vals[i] > rsi_vals[i + 1]
-            is_valley = rsi_vals[i] < rsi_vals[i - 1] and rsi_vals[i] < rsi_vals[i + 1]
-            if is_peak or is_valley:
-                rsi_points.append({
-                    "time": int(rsi_df.iloc[i]["time"]),
-                    "close": float(rsi_df.iloc[i]["close"]),
-                    "rsi": float(rsi_df.iloc[i]["rsi"]),
-                    "type": "peak" if is_peak else "valley",
-                })
-
-    # ── Box strategy (ventana horaria variable) ───────────────────────
+    times = df.loc[rsi_series.index, "time"].to_numpy()
+    closes = df.loc[rsi_series.index, "close"].to_numpy()
+    vals = rsi_series.to_numpy()
+
+    # Máximo/mínimo local estricto contra ambos vecinos (sin contar empates)
+    mid, left, right = vals[1:-1], vals[:-2], vals[2:]
+    is_peak = (mid - left > RSI_PIVOT_EPS) & (mid - right > RSI_PIVOT_EPS)
+    is_valley = (left - mid > RSI_PIVOT_EPS) & (right - mid > RSI_PIVOT_EPS)
+    idx = np.flatnonzero(is_peak | is_valley) + 1
+
+    return [
+        {"time": int(times[i]), "close": float(closes[i]), "rsi": float(vals[i]),
+         "type": "peak" if peak else "valley"}
+        for i, peak in zip(idx.tolist(), is_peak[idx - 1].tolist())
+    ]
+
+
+def compute_features(df: pd.DataFrame, df_vp_1min: pd.DataFrame, vp_start: str,
+                     timeframe: str = DEFAULT_TIMEFRAME) -> dict:
+    """
+    Parte CPU del preprocesamiento: RSI + picos/valles y Volume Profile.
+    Función pura de módulo para poder ejecutarse en un proceso worker.
+    El RSI se calcula solo sobre FEATURE_LOOKBACK["rsi"] velas de `timeframe`.
+    """
+    # Solo la ventana que declara el RSI; el VP usa su propio rango completo
+    lookback = FEATURE_LOOKBACK["rsi"]
+    df_rsi = feature_window(df, "rsi", timeframe)
+    with span("features.rsi", rows=len(df_rsi)):
+        rsi_series = rsi(df_rsi)
+    last_rsi = float(rsi_series.iloc[-1]) if not rsi_series.empty else None
+
+    with span("features.rsi_pivots"):
+        # +1: el pico más antiguo del horizonte necesita su vecino izquierdo
+        rsi_points = rsi_pivots(df_rsi, rsi_series.iloc[-(lookback.horizon(timeframe) + 1):])
+
+    if df_vp_1min is not None and not df_vp_1min.empty:
+        with span("features.vp", rows=len(df_vp_1min)):
+            vp_data = vp_features_compose(df_vp_1min, vp_start)
+    else:
+        vp_data = None
+
+    return {"rsi_last": last_rsi, "rsi_points": rsi_points, "volume_profile": vp_data}
+
+
+def _compute_features_shared(ref: SharedFrame, vp_ref: SharedFrame | None, vp_start: str,
+                             timeframe: str) -> dict:
+    """Entrada del worker de procesos: lee las velas desde memoria compartida (Arrow)."""
+    df = read_frame(ref)
+    df_vp = read_frame(vp_ref) if vp_ref is not None else None
+    return compute_features(df, df_vp, vp_start, timeframe)
+
+
+def _get_feature_pool():
+    """Pool compartido de la etapa de features según FEATURE_EXECUTOR (None = inline)."""
+    global _feature_pool
+    if FEATURE_EXECUTOR == "inline":
+        return None
+    with _feature_pool_lock:
+        if _feature_pool is None:
+            if FEATURE_EXECUTOR == "processes":
+                # spawn: no heredar locks de los hilos de I/O del proceso padre
+                _feature_pool = ProcessPoolExecutor(
+                    max_workers=FEATURE_WORKERS, mp_context=mp.get_context("spawn"),
+                )
+            else:
+                _feature_pool = ThreadPoolExecutor(
+                    max_workers=FEATURE_WORKERS, thread_name_prefix="features",
+                )
+            log.info("[features] backend=%s workers=%s", FEATURE_EXECUTOR,
+                     FEATURE_WORKERS or "auto")
+    return _feature_pool
+
+
+@traced("pipeline.features")
+def run_feature_stage(df: pd.DataFrame, df_vp_1min: pd.DataFrame, vp_start: str,
+                      timeframe: str = DEFAULT_TIMEFRAME) -> dict:
+    """
+    Ejecuta `compute_features` en el backend FEATURE_EXECUTOR:
+      inline    – en el hilo que llama
+      threads   – pool de hilos compartido
+      processes – pool de procesos; las velas viajan como Arrow IPC en
+                  memoria compartida en vez de DataFrames pickleados
+    """
+    pool = _get_feature_pool()
+    if pool is None:
+        return compute_features(df, df_vp_1min, vp_start, timeframe)
+    if FEATURE_EXECUTOR != "processes":
+        return pool.submit(compute_features, df, df_vp_1min, vp_start, timeframe).result()
+
+    blocks = []
+    try:
+        # Solo la ventana del RSI viaja al worker
+        ref, block = share_frame(feature_window(df, "rsi", timeframe))
+        blocks.append(block)
+        vp_ref = None
+        if df_vp_1min is not None and not df_vp_1min.empty:
+            vp_ref, vp_block = share_frame(df_vp_1min)
+            blocks.append(vp_block)
+        return pool.submit(_compute_features_shared, ref, vp_ref, vp_start, timeframe).result()
+    finally:
+        release(blocks)
+
+
+@traced("pipeline.feature_store")
+def load_from_store(symbol: str, timeframe: str, start_unix: int, end_unix: int,
+                    box_start: str, box_end: str, max_candles: int = 500,
+                    prefetched: tuple[int, int, pd.DataFrame] | None = None):
+    """
+    Features multi-día desde el feature store: días ya materializados + velas
+    crudas solo de los tramos sin día completo (posteriores al último estado
+    del RSI y días de VP que faltan). Materializa los días que se cerraron en
+    esos tramos. Retorna (features, last_ts, ruta_parquet) o None si el store
+    no cubre la ventana.
+    """
+    state = feature_store.rsi_state(symbol, timeframe, end_unix)
+    if state is None or state["last_time"] < start_unix:
+        return None
+
+    vp_plan = feature_store.plan_vp(symbol, start_unix, end_unix)
+    vp_futures = [(a, b, _submit_io(load_or_fetch_vp, symbol, a, b, max_candles))
+                  for a, b in vp_plan.raw_ranges]
+    tail_from = int(state["last_time"]) + TIMEFRAME_SECONDS.get(timeframe, 60)
+    df_tail = pd.DataFrame()
+    saved_path = os.path.join(DATA_LOADER_PATH, f"{symbol}.parquet")
+    if tail_from <= end_unix:
+        try:
+            df_tail, saved_path = load_or_fetch(symbol, timeframe, tail_from, end_unix, max_candles,
+                                                prefetched=prefetched)
+        except NoCandlesError:
+            log.info("[store] %s: sin velas nuevas desde %s", symbol, _unix_to_iso(tail_from))
+    vp_parts = [(a, b, f.result()) for a, b, f in vp_futures]
+    log.info("[store] %s: %d día(s) VP del store, %d tramo(s) crudos, %d velas tras el estado RSI",
+             symbol, len(vp_plan.days), len(vp_parts), len(df_tail))
+
+    with span("features.store", days=len(vp_plan.days)):
+        rsi_last, rsi_points = feature_store.rsi_features(
+            state, df_tail, FEATURE_LOOKBACK["rsi"].horizon(timeframe))
+        segments, pmin, pmax = feature_store.vp_segments(
+            vp_plan, [(a, part) for a, _, part in vp_parts])
+        vp_data = vp_features_from_segments(*segments, pmin, pmax)
+
+    feature_store.update_days(symbol, timeframe, df_tail, int(state["last_time"]) + 1, end_unix,
+                              box_start, box_end, RSI_WARMUP)
+    for a, b, part in vp_parts:
+        feature_store.update_vp(symbol, part, a, b)
+
+    features = {"rsi_last": rsi_last, "rsi_points": rsi_points, "volume_profile": vp_data}
+    last_ts = int(df_tail["time"].iloc[-1]) if not df_tail.empty else int(state["last_time"])
+    return features, last_ts, saved_path
+
+
+def materialize(symbol: str, timeframe: str, df: pd.DataFrame, df_vp_1min: pd.DataFrame,
+                start_unix: int, end_unix: int, box_start: str, box_end: str):
+    """Guarda en el feature store los días cerrados de una carga cruda completa."""
+    if not feature_store.FEATURE_STORE:
+        return
+    feature_store.update_days(symbol, timeframe, df, start_unix, end_unix,
+                              box_start, box_end, RSI_WARMUP)
+    if df_vp_1min is not None:          # None = VP calculado por lotes, sin velas en memoria
+        feature_store.update_vp(symbol, df_vp_1min, start_unix, end_unix)
+
+
+def preprocess_data(
+    symbol: str | None = None,
+    timeframe: str | None = None,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    box_date: str | None = None,
+    box_start_hour: str | None = None,
+    box_end_hour: str | None = None,
+    max_candles: int = 500,
+    use_cache: bool = True,
+):
+    """
+    Descarga, normaliza y calcula features para cualquier símbolo y rango.
+
+    Parámetros
+    ----------
+    symbol         : str  – símbolo del instrumento (ej. "US500", "EURUSD").
+                            Por defecto usa SYMBOL del .env.
+    timeframe      : str  – resolución Capital.com (MINUTE, MINUTE_5, HOUR, DAY …).
+                            Por defecto usa TIMEFRAME del .env.
+    start_date     : str  – fecha/hora inicio "YYYY-MM-DD" o "YYYY-MM-DDTHH:MM:SS".
+                            Por defecto usa START_VP del .env.
+    end_date       : str  – fecha/hora fin. Por defecto usa END_VP del .env.
+    box_date       : str  – fecha de la caja "YYYY-MM-DD". Por defecto usa end_date.
+    box_start_hour : str  – hora inicio de la caja ("HH:MM"). Por defecto "08:00".
+    box_end_hour   : str  – hora fin de la caja ("HH:MM"). Por defecto "09:55".
+    max_candles    : int  – máximo de velas por petición (API limit).
+    use_cache      : bool – si True, intenta cargar datos previos de parquet.
+
+    Retorna
+    -------
+    PreprocessResult con la ruta del parquet y las features calculadas.
+    """
+    # ── Resolver valores por defecto ──────────────────────────────────
+    symbol = symbol or DEFAULT_SYMBOL
+    timeframe = timeframe or DEFAULT_TIMEFRAME
+    start_date = start_date or DEFAULT_START
+    end_date = end_date or DEFAULT_END
+
+    box_start_hour = box_start_hour or DEFAULT_BOX_START
+    box_end_hour = box_end_hour or DEFAULT_BOX_END
+    # box_date: si no se pasa, usa la parte fecha de end_date ("YYYY-MM-DD")
+    box_date = box_date or DEFAULT_BOX_DATE or (end_date[:10] if end_date else None)
+
+    if not symbol or not start_date or not end_date:
+        raise ValueError("Se requieren symbol, start_date y end_date.")
+
+    # ── Convertir fechas a unix timestamps ────────────────────────────
+    start_unix, end_unix = unix_time(start_date, end_date)
+
+    # ── Fast path: caja + filtro de amplitud antes de la descarga masiva ─
     box_from, box_to = unix_time(
         f"{box_date}T{box_start_hour}:00",
         f"{box_date}T{box_end_hour}:00",
     )
 
-    # Box desde datos del parquet (Capital.com)
-    high_price, low_price, amplitud = box_strategy(df_unico, box_from, box_to)
-    #print('capital_box', high_price,low_price, amplitud)
+    # Box del feature store si el día ya está materializado; si no, desde
+    # Capital.com usando solo la ventana horaria de la caja
+    stored_box = feature_store.box(symbol, timeframe, box_from // 86400 * 86400,
+                                   box_start_hour, box_end_hour) if use_cache else None
+    box_prefetched = None   # ventana de caja ya pedida a la API: load_or_fetch no la repite
+    if stored_box is not None:
+        high_price, low_price, amplitud = stored_box
+        log.info("[store] %s: caja del %s desde el feature store", symbol, box_date)
+    else:
+        df_box, box_fetched = load_box_window(symbol, timeframe, box_from, box_to, max_candles, use_cache)
+        if box_fetched is not None:
+            box_prefetched = (*box_fetched, df_box)
+        if df_box is not None and not df_box.empty:
+            high_price, low_price, amplitud = box_strategy(df_box, box_from, box_to)
+        else:
+            high_price, low_price, amplitud = None, None, None
 
-    if amplitud is not None and amplitud > 1:
-        log.warning("[box] %s: amplitud=%.2f%% > 1%% -> operativa nula", symbol, amplitud)
+    if amplitud is not None and amplitud > MAX_AMPLITUD:
+        log.warning("[box] %s: amplitud=%.2f%% > %.2f%% -> operativa nula (sin descarga VP/RSI)",
+                    symbol, amplitud, MAX_AMPLITUD)
         return None
 
-    # Box desde SimpleFX (price_simple) para el mismo rango horario
-    df_simple = price_simple(symbol, 300, box_from, box_to)
+    # ── Carga de datos: caja SimpleFX en el pool de I/O; features desde el
+    #    feature store (solo velas posteriores a lo materializado) o, si no
+    #    cubre la ventana, Capital.com en este hilo y VP de 1 minuto en paralelo
+    t_fetch = time.perf_counter()
+    simple_future = _submit_io(load_or_fetch_simple, symbol, 300, box_from, box_to, use_cache)
+    stored = None
+    if use_cache and feature_store.FEATURE_STORE:
+        stored = load_from_store(symbol, timeframe, start_unix, end_unix,
+                                 box_start_hour, box_end_hour, max_candles, box_prefetched)
+    # Rangos de VP largos: histograma por lotes desde el parquet, sin velas en memoria
+    stream_vp = stored is None and end_unix - start_unix > VP_STREAM_DAYS * 86400
+    if stored is None:
+        vp_loader = vp_features_out_of_core if stream_vp else load_or_fetch_vp
+        vp_future = _submit_io(vp_loader, symbol, start_unix, end_unix, max_candles)
+        df_unico, saved_path = load_or_fetch(symbol, timeframe, start_unix, end_unix,
+                                             max_candles, use_cache, box_prefetched)
+        df_vp_1min = None if stream_vp else vp_future.result()
+        last_ts = int(df_unico["time"].iloc[-1]) if not df_unico.empty else None
+    else:
+        computed, last_ts, saved_path = stored
+    df_simple = simple_future.result()
+    fetch_s = time.perf_counter() - t_fetch
+
+    # Box desde SimpleFX para el mismo rango horario
     if df_simple is not None and not df_simple.empty:
         high_simple, low_simple, amplitud_simple = box_strategy(df_simple, box_from, box_to)
     else:
         high_simple, low_simple, amplitud_simple = None, None, None
 
-    # ── Volume Profile (datos de 1 minuto, parquet paralelo) ─────────
-    df_vp_1min = load_or_fetch_vp(symbol, start_unix, end_unix, max_candles)
-    if not df_vp_1min.empty:
-        vp_data = vp_features_compose(df_vp_1min, start_date)
+    warm = load_warm_report(symbol)
+    if warm and time.time() - warm.get("warmed_at", 0) < 86400:
+        log.info("[warm] %s: carga de datos %.2fs | warm-up previo ahorró ~%.1fs "
+                 "(caché hasta %s)", symbol, fetch_s, warm.get("saved_s", 0.0),
+                 _unix_to_iso(warm["cache_until"]))
     else:
-        vp_data = None
+        log.info("[warm] %s: carga de datos %.2fs (sin warm-up previo)", symbol, fetch_s)
 
-    last_ts = int(df_unico["time"].iloc[-1]) if not df_unico.empty else None
+    # ── Calcular features (CPU) en el backend configurado ─────────────
+    if stored is None:
+        computed = run_feature_stage(df_unico, df_vp_1min, start_date, timeframe)
+        if stream_vp:
+            computed["volume_profile"] = vp_future.result()
+        if use_cache:
+            materialize(symbol, timeframe, df_unico, df_vp_1min, start_unix, end_unix,
+                        box_start_hour, box_end_hour)
+    last_rsi = computed["rsi_last"]
+    rsi_points = computed["rsi_points"]
+    vp_data = computed["volume_profile"]
 
     features = {
         "rsi_last": last_rsi,
@@ -0,0 +1,150 @@
+"""
+Warm-up pre-mercado.
+
+Se programa antes de la ventana de la caja: inicia sesión, completa el
+parquet de velas y el de Volume Profile hasta "ahora" y materializa los
+días cerrados en el feature store (preprocess.feature_store), que es de
+donde la corrida principal lee las features históricas. Así la corrida
+principal solo descarga las últimas velas. Cada warm-up deja un reporte en
+data_loader/warm/{symbol}.json con el tiempo de descarga que la corrida
+principal ya no paga.
+
+Uso:
+    from preprocess.warmup import warmup_symbol
+    report = warmup_symbol("US500")
+"""
+
+import os
+import json
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+
+import pyarrow.parquet as pq
+
+from broker_api.login import sesion_capitalcom
+from preprocess.process_pipeline import (
+    DATA_LOADER_PATH, VP_LOADER_PATH, WARM_PATH, DEFAULT_START, DEFAULT_END,
+    DEFAULT_TIMEFRAME, DEFAULT_BOX_START, DEFAULT_BOX_END, TIMEFRAME_SECONDS,
+    load_or_fetch, load_or_fetch_vp, materialize,
+)
+from tools_bot.time_now import unix_time, _unix_to_iso
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+
+@dataclass
+class WarmupReport:
+    symbol: str
+    warmed_at: int
+    cache_until: int
+    candles_rows: int
+    vp_rows: int
+    login_s: float
+    candles_s: float
+    vp_s: float
+    features_s: float
+
+    @property
+    def saved_s(self) -> float:
+        """
+        Segundos de descarga que la corrida principal ya no paga. El login no
+        cuenta: la sesión (SESSION_TTL) expira antes del cierre de la caja y
+        la corrida principal vuelve a iniciar sesión.
+        """
+        return round(self.candles_s + self.vp_s, 2)
+
+
+def _last_closed(now: int, tf_seconds: int) -> int:
+    """Timestamp de apertura de la última vela cerrada (no cachear la vela en curso)."""
+    return (now - tf_seconds) // tf_seconds * tf_seconds
+
+
+def _cached_rows(symb: str, path: str) -> int:
+    """Filas del parquet leyendo solo los metadatos."""
+    file = os.path.join(path, f"{symb}.parquet")
+    if not os.path.exists(file):
+        return 0
+    try:
+        return pq.ParquetFile(file).metadata.num_rows
+    except Exception:
+        return 0
+
+
+def save_report(report: WarmupReport) -> str:
+    os.makedirs(WARM_PATH, exist_ok=True)
+    file = os.path.join(WARM_PATH, f"{report.symbol}.json")
+    data = asdict(report)
+    data["saved_s"] = report.saved_s
+    with open(file, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, default=str)
+    return file
+
+
+def warmup_symbol(
+    symbol: str,
+    timeframe: str | None = None,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    max_candles: int = 500,
+) -> WarmupReport:
+    """
+    Completa los cachés de `symbol` hasta la última vela cerrada (sin pasar
+    de END_VP) y materializa sus días cerrados en el feature store.
+    """
+    timeframe = timeframe or DEFAULT_TIMEFRAME
+    start_date = start_date or DEFAULT_START
+    end_date = end_date or DEFAULT_END
+    if not start_date:
+        raise ValueError("Se requiere start_date (START_VP) para el warm-up.")
+
+    now = int(datetime.now(timezone.utc).timestamp())
+    start_unix, end_cap = unix_time(start_date, end_date or _unix_to_iso(now))
+    tf_seconds = TIMEFRAME_SECONDS.get(timeframe, 60)
+    candles_end = min(end_cap, _last_closed(now, tf_seconds))
+    vp_end = min(end_cap, _last_closed(now, 60))
+
+    log.info("[warmup] %s: completando cachés %s → %s",
+             symbol, _unix_to_iso(start_unix), _unix_to_iso(candles_end))
+
+    t0 = time.perf_counter()
+    sesion_capitalcom(refresh=True)
+    login_s = time.perf_counter() - t0
+
+    rows_before = _cached_rows(symbol, DATA_LOADER_PATH)
+    t0 = time.perf_counter()
+    df_candles, _ = load_or_fetch(symbol, timeframe, start_unix, candles_end, max_candles)
+    candles_s = time.perf_counter() - t0
+    candles_rows = _cached_rows(symbol, DATA_LOADER_PATH) - rows_before
+
+    vp_before = _cached_rows(f"{symbol}_vp", VP_LOADER_PATH)
+    t0 = time.perf_counter()
+    df_vp = load_or_fetch_vp(symbol, start_unix, vp_end, max_candles)
+    vp_s = time.perf_counter() - t0
+    vp_rows = _cached_rows(f"{symbol}_vp", VP_LOADER_PATH) - vp_before
+
+    # ── Features históricas: días cerrados al feature store ─────────────
+    # (la corrida principal solo calcula sobre la sesión en curso)
+    t0 = time.perf_counter()
+    materialize(symbol, timeframe, df_candles, df_vp, start_unix, min(candles_end, vp_end),
+                DEFAULT_BOX_START, DEFAULT_BOX_END)
+    features_s = time.perf_counter() - t0
+
+    report = WarmupReport(
+        symbol=symbol,
+        warmed_at=now,
+        cache_until=candles_end,
+        candles_rows=candles_rows,
+        vp_rows=vp_rows,
+        login_s=round(login_s, 3),
+        candles_s=round(candles_s, 3),
+        vp_s=round(vp_s, 3),
+        features_s=round(features_s, 3),
+    )
+    path = save_report(report)
+    log.info("[warmup] %s: +%d velas, +%d velas VP | login=%.2fs velas=%.2fs vp=%.2fs "
+             "features=%.2fs | ~%.1fs fuera del camino crítico -> %s",
+             symbol, candles_rows, vp_rows, login_s, candles_s, vp_s, features_s,
+             report.saved_s, path)
+    return report
@@ -9,6 +9,7 @@ from pydantic import BaseModel, Field
 from broker_api.login import sesion_simple
 from broker_api.make_order import orden_pending
 from utils.logger import get_logger
+from utils.tracing import span
 from dotenv import load_dotenv
 from strategy_ai.tools.search_web import ScrapeMacroCalendarTool
 
@@ -176,41 +177,47 @@ class StrategyAi():
                 continue
 
             log.info("[order] %s: %s | Entry=%.2f | SL=%.2f | TP=%.2f | Vol=%.2f | Risk=%s | Conf=%d%%",
-                     symbol, action, entry, stop, tp, vol_half * 2, risk, decision.confidence)
+                     symbol, action, entry, stop, tp, vol_half * 2, risk, decision.confidence,
+                     extra={"symbol": symbol, "stage": "order", "action": action,
+                            "confidence": decision.confidence})
             log.info("[order] %s razones: %s", symbol, decision.reasons)
 
             try:
                 token = sesion_simple()
 
                 # ── Orden 1: mitad del volumen CON SL + TP ────────────
-                order1 = orden_pending(
-                    token=token,
-                    account=SIMPLE_ACCOUNT,
-                    symbol=symbol,
-                    side=side,
-                    reality=SIMPLE_REALITY,
-                    volumen=vol_half,
-                    entry_price=entry,
-                    stop_price=stop,
-                    takeprofit_price=tp,
-                )
+                with span("order.pending", symbol=symbol, leg=1):
+                    order1 = orden_pending(
+                        token=token,
+                        account=SIMPLE_ACCOUNT,
+                        symbol=symbol,
+                        side=side,
+                        reality=SIMPLE_REALITY,
+                        volumen=vol_half,
+                        entry_price=entry,
+                        stop_price=stop,
+                        takeprofit_price=tp,
+                    )
                 log.info("[order1] %s: %.2f vol | SL=%.2f | TP=%.2f → %s",
-                         symbol, vol_half, stop, tp, order1.json())
+                         symbol, vol_half, stop, tp, order1.json(),
+                         extra={"symbol": symbol, "stage": "order", "leg": 1})
 
                 # ── Orden 2: mitad del volumen SOLO SL (sin TP) ───────
-                order2 = orden_pending(
-                    token=token,
-                    account=SIMPLE_ACCOUNT,
-                    symbol=symbol,
-                    side=side,
-                    reality=SIMPLE_REALITY,
-                    volumen=vol_half,
-                    entry_price=entry,
-                    stop_price=stop,
-                    takeprofit_price=None,
-                )
+                with span("order.pending", symbol=symbol, leg=2):
+                    order2 = orden_pending(
+                        token=token,
+                        account=SIMPLE_ACCOUNT,
+                        symbol=symbol,
+                        side=side,
+                        reality=SIMPLE_REALITY,
+                        volumen=vol_half,
+                        entry_price=entry,
+                        stop_price=stop,
+                        takeprofit_price=None,
+                    )
                 log.info("[order2] %s: %.2f vol | SL=%.2f | TP=None (runner) → %s",
-                         symbol, vol_half, stop, order2.json())
+                         symbol, vol_half, stop, order2.json(),
+                         extra={"symbol": symbol, "stage": "order", "leg": 2})
 
             except Exception as e:
                 log.error("[order] %s: error enviando orden → %s", symbol, e, exc_info=True)
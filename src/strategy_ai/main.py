@@ -1,8 +1,11 @@
 import os
 import sys
 import json
+import time
+import subprocess
 import warnings
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
@@ -11,11 +14,14 @@ warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 load_dotenv()
 
 from utils.logger import get_logger                               # noqa: E402
+from utils import tracing, metrics                                # noqa: E402
+from utils.retry import run_budget                                # noqa: E402
+from utils.tracing import span                                    # noqa: E402
 from utils.env_validator import validate_env                      # noqa: E402
 from preprocess.process_pipeline import preprocess_data           # noqa: E402
 from preprocess.breakout_monitor import monitor_breakout          # noqa: E402
+from preprocess.warmup import warmup_symbol                       # noqa: E402
 from tools_bot.time_now import unix_time                          # noqa: E402
-from strategy_ai.crew import StrategyAi                           # noqa: E402
 
 log = get_logger(__name__)
 
@@ -25,6 +31,12 @@ MARKET  = os.getenv("MARKET", "S&P 500 / Forex")
 TZ      = ZoneInfo("America/Lima")
 BOX_END_HOUR = os.getenv("BOX_END", "09:55")
 
+# Workers por etapa del pipeline. El monitor bloquea hasta 2 h por símbolo,
+# por eso por defecto (0) se reserva un hilo por símbolo.
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", "2"))
+MONITOR_WORKERS    = int(os.getenv("MONITOR_WORKERS", "0"))
+AI_WORKERS         = int(os.getenv("AI_WORKERS", "1"))
+
 
 def _box_date() -> str:
     """Devuelve BOX_DATE del .env o la fecha de hoy (hora Lima)."""
@@ -32,155 +44,371 @@ def _box_date() -> str:
     return bd if bd else datetime.now(TZ).strftime("%Y-%m-%d")
 
 
+def _strategy_ai():
+    """
+    Importa el stack de IA (crewai, litellm, pydantic, BeautifulSoup) bajo
+    demanda: solo se paga cuando un breakout llega a la ETAPA 4.
+    """
+    if "strategy_ai.crew" not in sys.modules:
+        t0 = time.perf_counter()
+        from strategy_ai.crew import StrategyAi
+        log.info("[ia] stack de IA cargado en %.2fs", time.perf_counter() - t0)
+        return StrategyAi
+    from strategy_ai.crew import StrategyAi
+    return StrategyAi
+
+
+# ══════════════════════════════════════════════════════════════════════
+#  ETAPAS POR SÍMBOLO
+# ══════════════════════════════════════════════════════════════════════
+
+def _preprocess_symbol(sym: str, **prep_kwargs):
+    """ETAPA 1 · Descarga + features de un símbolo."""
+    with span("stage.preprocess", symbol=sym):
+        return preprocess_data(symbol=sym, **prep_kwargs)
+
+
+def _monitor_symbol(sym: str, result, box_date: str, box_end: str) -> dict | None:
+    """ETAPA 3 · Vigila el breakout de 5 min de un símbolo (máx 2 h)."""
+    box = result.features.get("box", {})
+    bh, bl = box.get("high"), box.get("low")
+    if bh is None or bl is None:
+        return None
+    _, box_end_unix = unix_time(
+        f"{box_date}T{box_end}:00",
+        f"{box_date}T{box_end}:00",
+    )
+    log.info("[monitor] %s: caja %.2f–%.2f, vigilando 5 min post caja …", sym, bl, bh)
+    with span("stage.monitor", symbol=sym):
+        return monitor_breakout(sym, bh, bl, box_end_unix)
+
+
+def _symbol_payload(sym: str, result, signal: dict) -> tuple[dict, dict]:
+    """Construye (JSON para la IA, datos de ejecución) de un símbolo con breakout."""
+    features = result.features
+    box = features.get("box", {})
+    vp  = features.get("volume_profile") or {}
+
+    bh, bl = box.get("high"), box.get("low")
+    box_mid = round((bh + bl) / 2, 2) if bh and bl else None
+
+    # Datos para ejecutar la orden (SimpleFX / fallback Capital)
+    execution = {
+        "box_high":         bh,
+        "box_low":          bl,
+        "amplitud":         box.get("amplitud"),
+        "high_simple":      box.get("high_simple"),
+        "low_simple":       box.get("low_simple"),
+        "amplitud_simple":  box.get("amplitud_simple"),
+    }
+
+    # JSON que recibe la IA (sin datos SimpleFX)
+    symbol_data = {
+        "symbol": sym,
+        "breakout_signal": signal,
+        "caja": {
+            "high": bh,
+            "low":  bl,
+            "mid":  box_mid,
+            "amp_pct": box.get("amplitud"),
+            "hour_range": box.get("hour_range"),
+        },
+        "vp": {
+            "poc":   vp.get("poc"),
+            "hva":   vp.get("vah"),
+            "lva":   vp.get("val"),
+            "peaks": vp.get("peaks", []),
+            "total_volume": vp.get("total_volume"),
+        },
+        "rsi": {
+            "last":   features.get("rsi_last"),
+            "points": features.get("rsi_points", []),
+        },
+    }
+    return symbol_data, execution
+
+
+def _run_ai(sym: str, result, signal: dict):
+    """ETAPA 4 · Lanza el crew para un símbolo con breakout y ejecuta sus órdenes."""
+    log.info("[ia] %s: breakout %s → consultando IA", sym, signal["breakout_state"])
+    symbol_data, execution = _symbol_payload(sym, result, signal)
+
+    inputs = {
+        "symbols_data": json.dumps([symbol_data], indent=2, default=str),
+        "market": MARKET,
+    }
+
+    # Crear crew e inyectar datos de ejecución para after_kickoff
+    strategy = _strategy_ai()()
+    strategy._execution_data = {sym: execution}
+    with span("crew.kickoff", symbol=sym):
+        return strategy.crew().kickoff(inputs=inputs)
+
+
 # ══════════════════════════════════════════════════════════════════════
 #  FLUJO PRINCIPAL
 # ══════════════════════════════════════════════════════════════════════
 
-def run():
-    """Ejecuta el flujo completo de la estrategia de la caja."""
+def run(
+    symbols: list[str] | None = None,
+    box_date: str | None = None,
+    box_start: str | None = None,
+    box_end: str | None = None,
+    start_vp: str | None = None,
+    end_vp: str | None = None,
+):
+    """
+    Ejecuta el flujo completo de la estrategia de la caja.
+
+    Cada símbolo avanza por su cuenta: preprocesamiento → filtro de amplitud →
+    monitoreo → IA/órdenes. Un breakout en US500 no espera a que el monitor
+    de US100 expire. Workers por etapa: PREPROCESS_WORKERS, MONITOR_WORKERS,
+    AI_WORKERS.
+
+    Sin argumentos usa la configuración del .env. El modo servicio
+    (strategy_ai.service) pasa símbolos, caja y rango VP de cada sesión.
+    """
+
+    if "--import-profile" in sys.argv:
+        import_profile()
+        return
 
     # ═══ Validación de entorno ════════════════════════════════════
     if not validate_env():
         log.error("Proceso abortado: variables de entorno incompletas")
         sys.exit(1)
 
-    box_date = _box_date()
+    metrics.start_exporter()
+    # Presupuesto de reintentos y traza propios: otra sesión del servicio no
+    # los reinicia, no los gasta ni exporta sus spans
+    with run_budget(), tracing.run_scope():
+        _run_pipeline(symbols, box_date, box_start, box_end, start_vp, end_vp)
+
+
+def _submit(pool: ThreadPoolExecutor, fn, *args, **kwargs):
+    """submit con el contexto de la corrida (presupuesto de reintentos, traza)."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def _run_pipeline(symbols, box_date, box_start, box_end, start_vp, end_vp):
+    """Cuerpo de `run` dentro del contexto de la corrida."""
+    symbols = symbols or SYMBOLS
+    box_end = box_end or BOX_END_HOUR
+    # Solo se pasa la fecha a preprocess_data si es explícita: por defecto
+    # la caja usa BOX_DATE o la fecha de END_VP
+    prep_kwargs = {
+        "box_date": box_date,
+        "box_start_hour": box_start,
+        "box_end_hour": box_end,
+        "start_date": start_vp,
+        "end_date": end_vp,
+    }
+    box_date = box_date or _box_date()
+    monitor_workers = MONITOR_WORKERS or max(1, len(symbols))
 
-    # ═══ ETAPA 1 · Preprocesamiento ══════════════════════════════════
     log.info("═" * 60)
-    log.info("  ETAPA 1 · Preprocesamiento  (%d símbolo(s))", len(SYMBOLS))
+    log.info("  Pipeline por símbolo  (%d símbolo(s))", len(symbols))
     log.info("  Fecha caja : %s", box_date)
+    log.info("  Workers    : preprocess=%d | monitor=%d | ia=%d",
+             PREPROCESS_WORKERS, monitor_workers, AI_WORKERS)
+    log.info("  Ventana máxima monitor : 2 horas post cierre de caja")
     log.info("═" * 60)
 
-    preprocessed: dict = {}
-    with ThreadPoolExecutor(max_workers=2) as pool:
-        futures = {pool.submit(preprocess_data, symbol=s): s for s in SYMBOLS}
+    tradeable: dict = {}
+    breakouts: dict = {}
+    ai_errors: dict[str, Exception] = {}
+
+    with ThreadPoolExecutor(max_workers=PREPROCESS_WORKERS, thread_name_prefix="prep") as prep_pool, \
+         ThreadPoolExecutor(max_workers=monitor_workers, thread_name_prefix="monitor") as mon_pool, \
+         ThreadPoolExecutor(max_workers=AI_WORKERS, thread_name_prefix="ia") as ai_pool:
+
+        # ═══ ETAPA 1 · Preprocesamiento ══════════════════════════════
+        pending = {
+            _submit(prep_pool, _preprocess_symbol, s, **prep_kwargs): ("preprocess", s)
+            for s in symbols
+        }
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, sym = pending.pop(future)
+                try:
+                    value = future.result()
+                except Exception as e:
+                    if stage == "ia":
+                        log.critical("[ia] %s: error ejecutando el crew → %s", sym, e, exc_info=True)
+                        ai_errors[sym] = e
+                    else:
+                        log.error("[%s] %s: ERROR → %s", stage, sym, e, exc_info=True)
+                    continue
+
+                if stage == "preprocess":
+                    # ═══ ETAPA 2 · Filtro de amplitud ════════════════
+                    if value is None:
+                        log.warning("[filtro] %s: amplitud > máx o sin datos → NO se consulta la IA", sym)
+                        continue
+                    tradeable[sym] = value
+                    # ═══ ETAPA 3 · Monitoreo breakout 5 min (máx 2 h) ═
+                    future = _submit(mon_pool, _monitor_symbol, sym, value, box_date, box_end)
+                    pending[future] = ("monitor", sym)
+
+                elif stage == "monitor":
+                    if not value:
+                        log.info("[monitor] %s: sin breakout en 2 h → NO se consulta IA", sym)
+                        continue
+                    breakouts[sym] = value
+                    log.info("[BREAKOUT] %s: %s close=%s", sym,
+                             value['breakout_state'], value['candle_close'],
+                             extra={"symbol": sym, "stage": "breakout",
+                                    "state": value['breakout_state']})
+                    # ═══ ETAPA 4 · Consulta IA + órdenes ═════════════
+                    pending[_submit(ai_pool, _run_ai, sym, tradeable[sym], value)] = ("ia", sym)
+
+                else:
+                    log.info("[ia] %s: crew finalizado correctamente.", sym)
+
+    if not tradeable:
+        log.info("[FIN] Ningún símbolo pasó el filtro de amplitud. Proceso detenido.")
+    elif not breakouts:
+        log.info("[FIN] Ningún breakout detectado en 2 h. Proceso detenido sin consultar IA.")
+    else:
+        log.info("[FIN] %d breakout(s) procesados: %s", len(breakouts), list(breakouts))
+
+    metrics.write_textfile()
+    if tracing.TRACE:
+        tracing.log_summary()
+        tracing.export(f"run_{box_date}_{datetime.now().strftime('%H%M%S')}")
+
+    # Los demás símbolos ya terminaron: un fallo de IA/órdenes no puede salir con código 0
+    if ai_errors:
+        raise RuntimeError(
+            f"Error ejecutando el crew en {len(ai_errors)} símbolo(s): {', '.join(ai_errors)}"
+        ) from next(iter(ai_errors.values()))
+
+
+def _warmup_symbols(symbols: list[str], start_vp: str | None = None,
+                    end_vp: str | None = None) -> float:
+    """Warm-up en paralelo; retorna los segundos sacados del camino crítico."""
+    saved = 0.0
+    with run_budget(), tracing.run_scope(), \
+         ThreadPoolExecutor(max_workers=PREPROCESS_WORKERS, thread_name_prefix="warmup") as pool:
+        futures = {
+            _submit(pool, warmup_symbol, s, start_date=start_vp, end_date=end_vp): s
+            for s in symbols
+        }
         for future in as_completed(futures):
             sym = futures[future]
             try:
-                preprocessed[sym] = future.result()
+                saved += future.result().saved_s
             except Exception as e:
-                log.error("[preprocess] %s: ERROR → %s", sym, e, exc_info=True)
-                preprocessed[sym] = None
+                log.error("[warmup] %s: ERROR → %s", sym, e, exc_info=True)
+        if tracing.TRACE:
+            tracing.export(f"warmup_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    return saved
 
-    # ═══ ETAPA 2 · Filtro de amplitud ════════════════════════════════
-    tradeable: dict = {}
-    for sym, result in preprocessed.items():
-        if result is None:
-            log.warning("[filtro] %s: amplitud > 1%% o sin datos → NO se consulta la IA", sym)
-            continue
-        tradeable[sym] = result
 
-    if not tradeable:
-        log.info("[FIN] Ningún símbolo pasó el filtro de amplitud. Proceso detenido.")
-        return
+def warmup():
+    """
+    Warm-up pre-mercado: completa cachés de velas/VP y precalcula features
+    para todos los SYMBOLS. Programarlo antes de BOX_START.
+    """
+    if not validate_env():
+        log.error("Warm-up abortado: variables de entorno incompletas")
+        sys.exit(1)
 
-    # ═══ ETAPA 3 · Monitoreo breakout 5 min (máx 2 h) ═══════════════
     log.info("═" * 60)
-    log.info("  ETAPA 3 · Monitoreo breakout 5 min  (%d símbolo(s))", len(tradeable))
-    log.info("  Ventana máxima : 2 horas post cierre de caja")
+    log.info("  WARM-UP pre-mercado  (%d símbolo(s))", len(SYMBOLS))
     log.info("═" * 60)
 
-    breakouts: dict = {}
+    saved = _warmup_symbols(SYMBOLS)
+    log.info("[FIN] Warm-up completado: ~%.1fs de descarga fuera del camino crítico", saved)
 
-    def _monitor_sym(sym: str):
-        result = tradeable[sym]
-        box = result.features.get("box", {})
-        bh, bl = box.get("high"), box.get("low")
-        if bh is None or bl is None:
-            return sym, None
-        _, box_end_unix = unix_time(
-            f"{box_date}T{BOX_END_HOUR}:00",
-            f"{box_date}T{BOX_END_HOUR}:00",
-        )
-        log.info("[monitor] %s: caja %.2f–%.2f, vigilando 5 min post caja …", sym, bl, bh)
-        return sym, monitor_breakout(sym, bh, bl, box_end_unix)
 
-    with ThreadPoolExecutor(max_workers=2) as pool:
-        futures = {pool.submit(_monitor_sym, s): s for s in tradeable}
-        for future in as_completed(futures):
-            sym_key = futures[future]
-            try:
-                symbol, signal = future.result()
-                if signal:
-                    breakouts[symbol] = signal
-                    log.info("[BREAKOUT] %s: %s close=%s", symbol,
-                             signal['breakout_state'], signal['candle_close'])
-                else:
-                    log.info("[monitor] %s: sin breakout en 2 h → NO se consulta IA", sym_key)
-            except Exception as e:
-                log.error("[monitor] %s: error → %s", sym_key, e, exc_info=True)
+def serve():
+    """
+    Modo servicio: proceso residente que dispara warm-up y corrida de cada
+    sesión configurada en SESSIONS (ver strategy_ai.service) todos los días hábiles.
+    """
+    if not validate_env():
+        log.error("Servicio abortado: variables de entorno incompletas")
+        sys.exit(1)
 
-    if not breakouts:
-        log.info("[FIN] Ningún breakout detectado en 2 h. Proceso detenido sin consultar IA.")
-        return
+    from strategy_ai.service import TradingService, parse_sessions, SESSIONS
 
-    # ═══ ETAPA 4 · Construir datos y lanzar IA ═══════════════════════
-    log.info("═" * 60)
-    log.info("  ETAPA 4 · Consulta IA  (%d breakout(s) detectados)", len(breakouts))
-    log.info("═" * 60)
+    sessions = parse_sessions(
+        SESSIONS, SYMBOLS,
+        os.getenv("BOX_START", "08:00"), BOX_END_HOUR,
+    )
+    service = TradingService(
+        sessions,
+        run_fn=run,
+        warmup_fn=_warmup_symbols,
+    )
+    service.install_signal_handlers()
+    metrics.start_exporter()
+    service.serve_forever()
 
-    symbols_data  = []
-    execution_data = {}
-
-    for sym, signal in breakouts.items():
-        result   = tradeable[sym]
-        features = result.features
-        box = features.get("box", {})
-        vp  = features.get("volume_profile") or {}
-
-        bh, bl = box.get("high"), box.get("low")
-        box_mid = round((bh + bl) / 2, 2) if bh and bl else None
-
-        # Datos para ejecutar la orden (SimpleFX / fallback Capital)
-        execution_data[sym] = {
-            "box_high":         bh,
-            "box_low":          bl,
-            "amplitud":         box.get("amplitud"),
-            "high_simple":      box.get("high_simple"),
-            "low_simple":       box.get("low_simple"),
-            "amplitud_simple":  box.get("amplitud_simple"),
-        }
 
-        # JSON que recibe la IA (sin datos SimpleFX)
-        symbols_data.append({
-            "symbol": sym,
-            "breakout_signal": signal,
-            "caja": {
-                "high": bh,
-                "low":  bl,
-                "mid":  box_mid,
-                "amp_pct": box.get("amplitud"),
-                "hour_range": box.get("hour_range"),
-            },
-            "vp": {
-                "poc":   vp.get("poc"),
-                "hva":   vp.get("vah"),
-                "lva":   vp.get("val"),
-                "peaks": vp.get("peaks", []),
-                "total_volume": vp.get("total_volume"),
-            },
-            "rsi": {
-                "last":   features.get("rsi_last"),
-                "points": features.get("rsi_points", []),
-            },
-        })
+# ══════════════════════════════════════════════════════════════════════
+#  Perfil de imports (--import-profile)
+# ══════════════════════════════════════════════════════════════════════
 
-    inputs = {
-        "symbols_data": json.dumps(symbols_data, indent=2, default=str),
-        "market": MARKET,
+_IMPORT_STAGES = [
+    ("arranque", "import strategy_ai.main"),
+    ("arranque + IA", "import strategy_ai.main, strategy_ai.crew"),
+]
+
+
+def _profile_stage(stmt: str, top: int) -> dict:
+    """Importa `stmt` en un proceso limpio con -X importtime y mide RSS."""
+    code = (
+        f"{stmt}\n"
+        "try:\n"
+        "    import resource\n"
+        "    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+        "except ImportError:\n"
+        "    print(-1)\n"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=os.environ.copy(),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "import falló")
+
+    # Formato: "import time: self [us] | cumulative | imported package",
+    # los submódulos llevan indentación extra en la última columna
+    top_level = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cum_us, name = line.split(":", 1)[1].split("|", 2)
+        if name[1:].startswith(" "):
+            continue
+        top_level.append((name.strip(), int(cum_us)))
+
+    rss_kb = int(proc.stdout.strip().splitlines()[-1] or -1)
+    return {
+        "total_s": round(sum(us for _, us in top_level) / 1e6, 3),
+        "rss_mb": round(rss_kb / 1024, 1) if rss_kb > 0 else None,
+        "top": sorted(top_level, key=lambda x: x[1], reverse=True)[:top],
     }
 
-    # Crear crew e inyectar datos de ejecución para after_kickoff
-    strategy = StrategyAi()
-    strategy._execution_data = execution_data
 
-    try:
-        strategy.crew().kickoff(inputs=inputs)
-        log.info("[FIN] Crew finalizado correctamente.")
-    except Exception as e:
-        log.critical("Error ejecutando el crew: %s", e, exc_info=True)
-        raise
+def import_profile(top: int = 10) -> dict:
+    """
+    Reporta el costo de arranque: tiempo de import y RSS con y sin el stack
+    de IA, y los módulos de primer nivel más caros. Uso:
+        python -m strategy_ai.main --import-profile
+    """
+    report = {}
+    for label, stmt in _IMPORT_STAGES:
+        stage = _profile_stage(stmt, top)
+        report[label] = stage
+        log.info("[import] %-14s %6.2fs | RSS %s MB", label, stage["total_s"], stage["rss_mb"])
+        for name, us in stage["top"]:
+            log.info("[import]     %-40s %8.1f ms", name, us / 1000)
+    return report
 
 
 # ══════════════════════════════════════════════════════════════════════
@@ -191,7 +419,7 @@ def train():
     """Entrena el crew por N iteraciones."""
     inputs = {"symbols_data": "[]", "market": MARKET}
     try:
-        StrategyAi().crew().train(
+        _strategy_ai()().crew().train(
             n_iterations=int(sys.argv[1]),
             filename=sys.argv[2],
             inputs=inputs,
@@ -203,7 +431,7 @@ def train():
 def replay():
     """Re-ejecuta desde una tarea específica."""
     try:
-        StrategyAi().crew().replay(task_id=sys.argv[1])
+        _strategy_ai()().crew().replay(task_id=sys.argv[1])
     except Exception as e:
         raise Exception(f"Error durante replay: {e}")
 
@@ -212,7 +440,7 @@ def test():
     """Ejecuta test del crew."""
     inputs = {"symbols_data": "[]", "market": MARKET}
     try:
-        StrategyAi().crew().test(
+        _strategy_ai()().crew().test(
             n_iterations=int(sys.argv[1]),
             eval_llm=sys.argv[2],
             inputs=inputs,
@@ -236,6 +464,13 @@ def run_with_trigger():
         "market": MARKET,
     }
     try:
-        return StrategyAi().crew().kickoff(inputs=inputs)
+        return _strategy_ai()().crew().kickoff(inputs=inputs)
     except Exception as e:
         raise Exception(f"Error con trigger: {e}")
+
+
+if __name__ == "__main__":
+    if "--import-profile" in sys.argv:
+        import_profile()
+    else:
+        run()
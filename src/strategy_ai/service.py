@@ -0,0 +1,178 @@
+"""
+Modo servicio: proceso residente con planificador diario por sesión.
+
+En lugar de arrancar un proceso en frío cada día (reimportar crewai /
+pandas_ta, releer .env, login y recarga de cachés), el servicio queda
+vivo y dispara cada ventana de caja configurada. Sesiones de login,
+parquets en memoria y el crew ya importado se reutilizan entre días.
+
+Configuración (.env):
+    SESSIONS=LONDON@07:00-08:55=UK100,DE40;NY@13:00-14:55=US500,US100
+        nombre@inicio-fin=símbolos, horas en UTC. Si falta, se usa una
+        sesión única con BOX_START/BOX_END/SYMBOLS.
+    VP_LOOKBACK_DAYS=6      días de historia para el Volume Profile
+    WARMUP_LEAD_MIN=30      minutos antes de la caja para el warm-up (0 = off)
+"""
+
+import os
+import signal
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from utils.logger import get_logger
+from utils import tracing
+
+log = get_logger(__name__)
+
+SESSIONS = os.getenv("SESSIONS", "")
+VP_LOOKBACK_DAYS = int(os.getenv("VP_LOOKBACK_DAYS", "6"))
+WARMUP_LEAD_MIN = int(os.getenv("WARMUP_LEAD_MIN", "30"))
+# Segundos tras BOX_END para que la última vela de la caja (5 min) esté cerrada
+RUN_DELAY_S = int(os.getenv("RUN_DELAY_S", "300"))
+
+
+@dataclass
+class SessionWindow:
+    name: str
+    box_start: str          # "HH:MM" UTC
+    box_end: str            # "HH:MM" UTC
+    symbols: list[str] = field(default_factory=list)
+
+    def at(self, day: str, hour: str) -> datetime:
+        return datetime.strptime(f"{day} {hour}", "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+
+    def vp_range(self, day: str) -> tuple[str, str]:
+        """Rango START_VP/END_VP móvil: VP_LOOKBACK_DAYS días hasta el cierre de la caja."""
+        start = self.at(day, "00:00") - timedelta(days=VP_LOOKBACK_DAYS)
+        return start.strftime("%Y-%m-%dT%H:%M:%S"), f"{day}T{self.box_end}:00"
+
+
+def parse_sessions(spec: str, default_symbols: list[str],
+                   default_start: str, default_end: str) -> list[SessionWindow]:
+    """Parsea SESSIONS ("NY@13:00-14:55=US500,US100;...")."""
+    if not spec.strip():
+        return [SessionWindow("DEFAULT", default_start, default_end, list(default_symbols))]
+
+    sessions = []
+    for chunk in spec.split(";"):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        try:
+            head, _, syms = chunk.partition("=")
+            name, _, hours = head.partition("@")
+            start, end = (h.strip() for h in hours.split("-"))
+            symbols = [s.strip() for s in syms.split(",") if s.strip()] or list(default_symbols)
+        except ValueError:
+            raise ValueError(f"SESSIONS inválido en '{chunk}' (formato nombre@HH:MM-HH:MM=SYM1,SYM2)")
+        sessions.append(SessionWindow(name.strip(), start, end, symbols))
+    return sessions
+
+
+def _next_weekday(day: datetime) -> datetime:
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+
+class TradingService:
+    """
+    Planificador residente. Cada sesión genera dos eventos por día hábil:
+    warm-up (WARMUP_LEAD_MIN antes de la caja) y corrida (cierre de caja +
+    RUN_DELAY_S). Cada evento se ejecuta en su propio hilo para que las
+    sesiones puedan solaparse (ej. monitor de Londres + caja de NY).
+    """
+
+    def __init__(self, sessions: list[SessionWindow], run_fn, warmup_fn=None):
+        self.sessions = sessions
+        self.run_fn = run_fn
+        self.warmup_fn = warmup_fn
+        self._stop = threading.Event()
+        self._done: set[tuple[str, str, str]] = set()   # (sesión, evento, fecha)
+        self._threads: list[threading.Thread] = []
+
+    def _events_for(self, now: datetime):
+        """Eventos (hora, tipo, sesión, fecha) de hoy y del próximo día hábil."""
+        events = []
+        for offset in (0, 1):
+            day = _next_weekday(now + timedelta(days=offset)).strftime("%Y-%m-%d")
+            for sess in self.sessions:
+                run_at = sess.at(day, sess.box_end) + timedelta(seconds=RUN_DELAY_S)
+                events.append((run_at, "run", sess, day))
+                if self.warmup_fn and WARMUP_LEAD_MIN > 0:
+                    warm_at = sess.at(day, sess.box_start) - timedelta(minutes=WARMUP_LEAD_MIN)
+                    events.append((warm_at, "warmup", sess, day))
+        return sorted(events, key=lambda e: e[0])
+
+    def _next_event(self, now: datetime):
+        # Solo hacen falta los eventos de hoy en adelante (fechas ISO: orden lexicográfico)
+        today = now.strftime("%Y-%m-%d")
+        self._done = {key for key in self._done if key[2] >= today}
+        for when, kind, sess, day in self._events_for(now):
+            if (sess.name, kind, day) in self._done:
+                continue
+            # Eventos de hoy ya vencidos: la corrida aún es útil mientras
+            # dure la ventana de monitoreo; el warm-up vencido se omite
+            if when < now and (kind == "warmup" or now - when > timedelta(hours=2)):
+                self._done.add((sess.name, kind, day))
+                continue
+            return when, kind, sess, day
+        return None
+
+    def _dispatch(self, kind: str, sess: SessionWindow, day: str):
+        start_vp, end_vp = sess.vp_range(day)
+        log.info("[service] %s %s %s | símbolos=%s | VP %s → %s",
+                 sess.name, kind.upper(), day, sess.symbols, start_vp, end_vp)
+        # Los spans de esta tarea llevan su propio id: las demás sesiones no los exportan
+        with tracing.run_scope(f"{sess.name}-{kind}-{day}") as run_id:
+            try:
+                if kind == "warmup":
+                    self.warmup_fn(sess.symbols, start_vp, end_vp)
+                else:
+                    self.run_fn(
+                        symbols=sess.symbols, box_date=day,
+                        box_start=sess.box_start, box_end=sess.box_end,
+                        start_vp=start_vp, end_vp=end_vp,
+                    )
+            except (Exception, SystemExit) as e:   # sys.exit de run() no debe tumbar el servicio
+                log.error("[service] %s %s %s: error → %s", sess.name, kind, day, e, exc_info=True)
+            finally:
+                tracing.reset(run_id)   # spans sin exportar (la tarea falló antes del export)
+
+    def serve_forever(self):
+        log.info("[service] iniciado con %d sesión(es): %s", len(self.sessions),
+                 ", ".join(f"{s.name} {s.box_start}-{s.box_end} UTC {s.symbols}" for s in self.sessions))
+        while not self._stop.is_set():
+            now = datetime.now(timezone.utc)
+            nxt = self._next_event(now)
+            if nxt is None:
+                self._stop.wait(60)
+                continue
+            when, kind, sess, day = nxt
+            wait_s = (when - now).total_seconds()
+            if wait_s > 0:
+                log.info("[service] próximo: %s %s %s a las %s UTC (en %.0f min)",
+                         sess.name, kind, day, when.strftime("%H:%M"), wait_s / 60)
+                # Despertar como máximo cada hora para recalcular (cambio de día, etc.)
+                if self._stop.wait(min(wait_s, 3600)):
+                    break
+                if wait_s > 3600:
+                    continue
+            self._done.add((sess.name, kind, day))
+            t = threading.Thread(target=self._dispatch, args=(kind, sess, day),
+                                 name=f"{sess.name}-{kind}", daemon=True)
+            t.start()
+            self._threads = [th for th in self._threads if th.is_alive()] + [t]
+
+        log.info("[service] detenido, esperando %d tarea(s) en curso", len(self._threads))
+        for t in self._threads:
+            t.join()
+
+    def stop(self, *_):
+        log.info("[service] señal de parada recibida")
+        self._stop.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
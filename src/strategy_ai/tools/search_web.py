@@ -9,6 +9,8 @@ from bs4 import BeautifulSoup
 from pydantic import BaseModel, Field
 from crewai.tools import BaseTool
 
+from broker_api import transport
+
 
 # -----------------------------------------------------------------------------
 # Deterministic scrapers for the specific sources declared in agents.yaml.
@@ -32,7 +34,7 @@ def _http_get(url: str, params: Optional[Dict[str, Any]] = None, timeout: int =
     # Some sites are sensitive to missing Referer.
     headers = dict(DEFAULT_HEADERS)
     headers["Referer"] = "https://es.investing.com/earnings-calendar"
-    r = requests.get(url, params=params, headers=headers, timeout=timeout)
+    r = transport.request("GET", url, params=params, headers=headers, timeout=timeout)
     r.raise_for_status()
     return r
 
@@ -1,13 +1,12 @@
-
 def box_strategy(df, timefrom, timeto):
-    price = df[(df["time"] >= timefrom) & (df["time"] <= timeto)].copy()
-    if price.empty:
+    # Máscara sobre los arrays de time/high/low: sin copiar el DataFrame
+    times = df["time"].to_numpy()
+    mask = (times >= timefrom) & (times <= timeto)
+    if not mask.any():
         return None, None, None
-    high_price = max(price["high"])
-    low_price = min(price["low"])
+    high_price = float(df["high"].to_numpy()[mask].max())
+    low_price = float(df["low"].to_numpy()[mask].min())
     if low_price == 0:
         return high_price, low_price, None
     amplitud = round((high_price - low_price) / low_price * 100, 2)
     return high_price, low_price, amplitud
-
-
@@ -0,0 +1,275 @@
+"""
+Motor de features en panel: todos los símbolos a la vez (tiempo × símbolo).
+
+Las velas de N símbolos se alinean en matrices (T, N) con NaN donde un
+símbolo no tiene vela (horarios de mercado distintos) y cada indicador se
+calcula con una sola operación de arrays sobre la matriz completa:
+    rsi        – RSI de Wilder (ewm alpha=1/14, min_periods=14), igual que
+                 tools_bot.utils_trading_rsi.rsi símbolo a símbolo
+    pivots     – picos/valles del RSI contra el valor válido anterior y siguiente
+    box        – máximo/mínimo y amplitud de la ventana de la caja (box_strategy)
+    breakouts  – primer cierre de 5 min fuera de la caja tras su fin
+                 (monitor_breakout), sobre el panel agregado con `resample`
+
+Filtrar un universo de 50+ índices/FX cada mañana cuesta casi lo mismo que
+un símbolo.
+
+Uso:
+    panel = load_panel(["US500", "US100", "EURUSD"], start, end)
+    table = screen(panel, box_from, box_to)
+
+    panel_screen --symbols US500,US100,EURUSD --date 2025-03-14
+"""
+
+import os
+import argparse
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+# Mismo caché que preprocess.process_pipeline (sin importar el pipeline ni la API)
+DATA_LOADER_PATH = os.path.join(os.path.dirname(__file__), "..", "data_loader")
+RSI_LENGTH = 14
+# Horizonte de picos/valles en segundos, como RSI_PIVOT_SECONDS del pipeline
+RSI_PIVOT_SECONDS = int(os.getenv("RSI_PIVOT_SECONDS", "86400"))
+RSI_PIVOT_EPS = 1e-6        # igual que process_pipeline.RSI_PIVOT_EPS (empates)
+# Velas de la señal de breakout (monitor_breakout vigila velas MINUTE_5)
+SIGNAL_SECONDS = 300
+_COLUMNS = ("open", "high", "low", "close")
+
+
+@dataclass
+class Panel:
+    """Velas alineadas: `time` (T,) y una matriz (T, N) por columna OHLC."""
+    time: np.ndarray
+    symbols: list[str]
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+
+    def frame(self, values: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(values, index=self.time, columns=self.symbols)
+
+
+def align(frames: dict[str, pd.DataFrame]) -> Panel:
+    """Une las velas de cada símbolo por `time` (outer join, NaN sin vela)."""
+    symbols = list(frames)
+    time = np.unique(np.concatenate(
+        [f["time"].to_numpy(np.int64) for f in frames.values()] or [np.empty(0, np.int64)]
+    ))
+    mats = {col: np.full((time.size, len(symbols)), np.nan) for col in _COLUMNS}
+    for j, df in enumerate(frames.values()):
+        df = df.drop_duplicates(subset=["time"])
+        rows = np.searchsorted(time, df["time"].to_numpy(np.int64))
+        for col in _COLUMNS:
+            mats[col][rows, j] = df[col].to_numpy(float)
+    return Panel(time=time, symbols=symbols, **mats)
+
+
+def load_panel(symbols: list[str], start: int | None = None, end: int | None = None,
+               path: str = DATA_LOADER_PATH) -> Panel:
+    """Panel desde los parquets del caché; los símbolos sin parquet se omiten."""
+    filters = []
+    if start is not None:
+        filters.append(("time", ">=", start))
+    if end is not None:
+        filters.append(("time", "<=", end))
+    frames = {}
+    for symbol in symbols:
+        file = os.path.join(path, f"{symbol}.parquet")
+        if not os.path.exists(file):
+            log.warning("[panel] %s: sin caché parquet, se omite", symbol)
+            continue
+        frames[symbol] = pd.read_parquet(file, engine="pyarrow", columns=["time", *_COLUMNS],
+                                         filters=filters or None)
+    return align(frames)
+
+
+def resample(panel: Panel, seconds: int = SIGNAL_SECONDS) -> Panel:
+    """
+    Panel de velas de `seconds` (apertura alineada a múltiplos de `seconds`,
+    como las de Capital.com). Cada símbolo agrega solo sus velas: sin velas
+    en el tramo queda NaN. Si el panel ya es de `seconds` se retorna tal cual.
+    """
+    step = bar_seconds(panel)
+    if step == seconds or not len(panel.time):
+        return panel
+    if step > seconds or seconds % step:
+        raise ValueError(f"No se pueden armar velas de {seconds}s desde velas de {step}s")
+    bucket = panel.time // seconds * seconds
+    how = {"open": "first", "high": "max", "low": "min", "close": "last"}
+    mats = {col: panel.frame(getattr(panel, col)).groupby(bucket).agg(agg).to_numpy()
+            for col, agg in how.items()}
+    return Panel(time=np.unique(bucket), symbols=panel.symbols, **mats)
+
+
+def bar_seconds(panel: Panel) -> int:
+    """Paso de las velas del panel (menor diferencia entre tiempos consecutivos)."""
+    return int(np.diff(panel.time).min()) if len(panel.time) > 1 else 60
+
+
+# ── Indicadores ────────────────────────────────────────────────────────
+
+def rsi(panel: Panel, length: int = RSI_LENGTH) -> np.ndarray:
+    """
+    RSI (T, N). Los huecos de un símbolo no cortan la serie: la diferencia
+    se toma contra el último cierre válido y el ewm salta los NaN, igual que
+    calcular el RSI sobre las velas del símbolo sin alinear.
+    """
+    close = panel.frame(panel.close)
+    valid = close.notna()
+    delta = close.ffill().diff().where(valid)
+    ewm = dict(alpha=1.0 / length, min_periods=length, ignore_na=True)
+    gain = delta.clip(lower=0).ewm(**ewm).mean()
+    loss = (-delta.clip(upper=0)).ewm(**ewm).mean()
+    return (100 * gain / (gain + loss)).where(valid).to_numpy()
+
+
+def pivots(values: np.ndarray, horizon: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Máscaras (peak, valley) (T, N): máximo/mínimo local estricto contra el
+    valor válido anterior y el siguiente de la misma columna. Con `horizon`
+    solo cuentan las últimas `horizon` filas válidas de cada columna.
+    """
+    df = pd.DataFrame(values)
+    prev = df.ffill().shift(1).to_numpy()
+    nxt = df.bfill().shift(-1).to_numpy()
+    with np.errstate(invalid="ignore"):
+        peak = (values - prev > RSI_PIVOT_EPS) & (values - nxt > RSI_PIVOT_EPS)
+        valley = (prev - values > RSI_PIVOT_EPS) & (nxt - values > RSI_PIVOT_EPS)
+    if horizon is not None:
+        valid = ~np.isnan(values)
+        # Posición desde el final entre las filas válidas de cada columna
+        from_end = valid[::-1].cumsum(axis=0)[::-1]
+        recent = valid & (from_end <= horizon)
+        peak &= recent
+        valley &= recent
+    return peak, valley
+
+
+def box(panel: Panel, box_from: int, box_to: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(high, low, amplitud %) (N,) de la ventana [box_from, box_to]; NaN sin velas."""
+    rows = (panel.time >= box_from) & (panel.time <= box_to)
+    # fmax/fmin ignoran NaN y dejan NaN en columnas sin velas (sin warnings de nanmax)
+    box_high = np.fmax.reduce(panel.high[rows], axis=0, initial=-np.inf)
+    box_low = np.fmin.reduce(panel.low[rows], axis=0, initial=np.inf)
+    box_high[np.isinf(box_high)] = np.nan
+    box_low[np.isinf(box_low)] = np.nan
+    with np.errstate(invalid="ignore", divide="ignore"):
+        amplitud = np.where(box_low > 0, np.round((box_high - box_low) / box_low * 100, 2), np.nan)
+    return box_high, box_low, amplitud
+
+
+def breakouts(panel: Panel, box_high: np.ndarray, box_low: np.ndarray,
+              after: int, until: int) -> dict[str, np.ndarray]:
+    """
+    Primer cierre fuera de la caja con time en (after, until] por símbolo.
+    Retorna arrays (N,): state ("ABOVE" | "BELOW" | "NONE"), signal_time
+    (-1 sin señal) y candle_close.
+    """
+    n = len(panel.symbols)
+    rows = np.flatnonzero((panel.time > after) & (panel.time <= until))
+    if rows.size == 0:
+        return {"state": np.full(n, "NONE"), "signal_time": np.full(n, -1, dtype=np.int64),
+                "candle_close": np.full(n, np.nan)}
+
+    close = panel.close[rows]
+    with np.errstate(invalid="ignore"):
+        above = close > box_high
+        below = close < box_low
+    hit = above | below
+    has = hit.any(axis=0)
+    first = np.argmax(hit, axis=0)          # primera fila True (0 si ninguna)
+    cols = np.arange(n)
+    return {
+        "state": np.where(has, np.where(above[first, cols], "ABOVE", "BELOW"), "NONE"),
+        "signal_time": np.where(has, panel.time[rows[first]], -1),
+        "candle_close": np.where(has, close[first, cols], np.nan),
+    }
+
+
+# ── Screening ──────────────────────────────────────────────────────────
+
+def pivot_points(panel: Panel, rsi_values: np.ndarray, peak: np.ndarray,
+                 valley: np.ndarray, symbol: str) -> list[dict]:
+    """Picos/valles de un símbolo en el formato de process_pipeline.rsi_pivots."""
+    j = panel.symbols.index(symbol)
+    rows = np.flatnonzero(peak[:, j] | valley[:, j])
+    return [
+        {"time": int(panel.time[i]), "close": float(panel.close[i, j]),
+         "rsi": float(rsi_values[i, j]), "type": "peak" if peak[i, j] else "valley"}
+        for i in rows.tolist()
+    ]
+
+
+def screen(panel: Panel, box_from: int, box_to: int, window_seconds: int = 7200,
+           max_amplitud: float = 1.0,
+           pivot_seconds: int | None = RSI_PIVOT_SECONDS) -> pd.DataFrame:
+    """
+    Una fila por símbolo: RSI, nº de picos/valles, caja, filtro de amplitud y
+    breakout. `pivot_seconds` se convierte a velas con el paso del panel;
+    el breakout se busca en velas de SIGNAL_SECONDS, como monitor_breakout.
+    """
+    values = rsi(panel)
+    horizon = None if pivot_seconds is None else -(-pivot_seconds // bar_seconds(panel))
+    peak, valley = pivots(values, horizon)
+    box_high, box_low, amplitud = box(panel, box_from, box_to)
+    signal = breakouts(resample(panel), box_high, box_low, box_to, box_to + window_seconds)
+
+    # Último RSI válido de cada símbolo
+    last = pd.DataFrame(values).ffill().to_numpy()[-1] if len(panel.time) else \
+        np.full(len(panel.symbols), np.nan)
+    tradeable = np.nan_to_num(amplitud, nan=np.inf) <= max_amplitud
+    return pd.DataFrame({
+        "symbol": panel.symbols,
+        "rsi_last": last,
+        "rsi_peaks": peak.sum(axis=0),
+        "rsi_valleys": valley.sum(axis=0),
+        "box_high": box_high,
+        "box_low": box_low,
+        "amplitud": amplitud,
+        "tradeable": tradeable,
+        "breakout_state": np.where(tradeable, signal["state"], "NONE"),
+        "signal_time": np.where(tradeable, signal["signal_time"], -1),
+        "candle_close": np.where(tradeable, signal["candle_close"], np.nan),
+    })
+
+
+def _day_unix(date: str, hhmm: str) -> int:
+    return int(datetime.fromisoformat(f"{date}T{hhmm}:00").replace(tzinfo=timezone.utc).timestamp())
+
+
+def main():
+    # Mismos valores por defecto que el pipeline y el monitor (importados solo en el CLI)
+    from preprocess.process_pipeline import DEFAULT_BOX_START, DEFAULT_BOX_END, MAX_AMPLITUD
+    from preprocess.breakout_monitor import MONITOR_WINDOW
+
+    parser = argparse.ArgumentParser(description="Screening en panel de la estrategia de la caja")
+    parser.add_argument("--symbols", default=os.getenv("SYMBOLS", "US500"))
+    parser.add_argument("--date", default=datetime.now(timezone.utc).strftime("%Y-%m-%d"),
+                        help="día de la caja YYYY-MM-DD (UTC)")
+    parser.add_argument("--box-start", default=DEFAULT_BOX_START)
+    parser.add_argument("--box-end", default=DEFAULT_BOX_END)
+    parser.add_argument("--max-amplitud", type=float, default=MAX_AMPLITUD)
+    parser.add_argument("--window", type=int, default=MONITOR_WINDOW)
+    parser.add_argument("--lookback-days", type=int, default=7,
+                        help="días de velas previos para el RSI")
+    args = parser.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+    box_from, box_to = _day_unix(args.date, args.box_start), _day_unix(args.date, args.box_end)
+    panel = load_panel(symbols, box_from - args.lookback_days * 86400, box_to + args.window)
+    table = screen(panel, box_from, box_to, args.window, args.max_amplitud)
+    log.info("[panel] %d símbolos × %d velas\n%s", len(panel.symbols), len(panel.time),
+             table.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
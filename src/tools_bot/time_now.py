@@ -3,11 +3,16 @@ from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
 TZ = ZoneInfo("America/Lima")
-FECHA_NOW = pd.Timestamp.now(TZ).strftime("%Y-%m-%d")
+
+
+def fecha_now(tz=TZ) -> str:
+    """Fecha actual "YYYY-MM-DD" en `tz`, calculada en cada llamada (procesos de larga vida)."""
+    return pd.Timestamp.now(tz).strftime("%Y-%m-%d")
 
 def unix_time_now( start_h: str, end_h:str, tz=TZ):
-    start= pd.Timestamp(f"{FECHA_NOW} {start_h}", tz=tz)
-    end = pd.Timestamp(f"{FECHA_NOW} {end_h}",tz=tz)
+    fecha = fecha_now(tz)
+    start= pd.Timestamp(f"{fecha} {start_h}", tz=tz)
+    end = pd.Timestamp(f"{fecha} {end_h}",tz=tz)
     return (int(start.timestamp()),int(end.timestamp()))
 
 def unix_time(start_:str, end_: str):
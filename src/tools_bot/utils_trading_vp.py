@@ -8,39 +8,65 @@ def build_vp_ohlc(df, n_bins=1000, body_w=0.70):
 
     edges = np.linspace(pmin, pmax, n_bins + 1)
     centers = (edges[:-1] + edges[1:]) / 2
-    vp = np.zeros(n_bins, dtype=float)
 
-    def add_segment(lo, hi, v):
-        if v <= 0 or hi <= lo:
-            return
-        i0 = max(0, np.searchsorted(edges, lo) - 1)
-        i1 = min(n_bins, np.searchsorted(edges, hi))
-        span = i1 - i0
-        if span > 0:
-            vp[i0:i1] += v / span
-
-    wick_w = 1.0 - body_w
-
-    for _, r in df.iterrows():
-        vol = float(r["volume"])
-        if vol <= 0:
-            continue
-
-        o, c, h, l = float(r["open"]), float(r["close"]), float(r["high"]), float(r["low"])
-        body_lo, body_hi = (o, c) if o < c else (c, o)
-
-        # 1) cuerpo
-        add_segment(body_lo, body_hi, vol * body_w)
-
-        # 2) mechas proporcional a longitudes
-        up = max(0.0, h - body_hi)
-        dn = max(0.0, body_lo - l)
-        s = up + dn
-        if s > 0:
-            add_segment(body_hi, h, vol * wick_w * (up / s))
-            add_segment(l, body_lo, vol * wick_w * (dn / s))
+    # 1) cuerpo y 2) mechas proporcionales a sus longitudes, todas las velas a la vez
+    segments = ohlc_segments(df["open"], df["high"], df["low"], df["close"], df["volume"], body_w)
+    diff, count = segment_diffs(*segments, edges)
+    return centers, histogram_from_diffs(diff, count)
+
+
+def segment_diffs(lo, hi, vol, edges):
+    """
+    Arrays de diferencias del reparto de build_vp_ohlc: el volumen de cada
+    tramo se divide por igual entre las celdas que toca (+w en la primera,
+    -w tras la última). `count` lleva cuántos tramos cubren cada celda.
+    Los de varios lotes se suman y se cierran con `histogram_from_diffs`.
+    """
+    n_bins = len(edges) - 1
+    i0 = np.maximum(np.searchsorted(edges, lo) - 1, 0)
+    i1 = np.minimum(np.searchsorted(edges, hi), n_bins)
+    span = i1 - i0
+    ok = span > 0
+    i0, i1, w = i0[ok], i1[ok], vol[ok] / span[ok]
+    diff = np.bincount(i0, weights=w, minlength=n_bins + 1)
+    diff -= np.bincount(i1, weights=w, minlength=n_bins + 1)
+    count = np.bincount(i0, minlength=n_bins + 1) - np.bincount(i1, minlength=n_bins + 1)
+    return diff, count
+
+
+def histogram_from_diffs(diff, count):
+    vp = np.cumsum(diff[:-1])
+    # Celdas sin tramos: 0 exacto (la suma acumulada deja residuos de redondeo)
+    vp[np.cumsum(count[:-1]) == 0] = 0.0
+    return vp
+
+
+def build_vp_stream(read_batches, n_bins=1000, body_w=0.70):
+    """
+    build_vp_ohlc por lotes para rangos que no caben en memoria.
+    `read_batches()` debe devolver un iterable nuevo en cada llamada con
+    lotes (dicts de arrays o DataFrames) de open/high/low/close/volume.
+    Dos pasadas: rango de precios y luego el histograma sobre esa rejilla;
+    la memoria es la de un lote, no la del rango.
+    """
+    pmin, pmax = np.inf, -np.inf
+    for batch in read_batches():
+        pmin = np.fmin.reduce(np.asarray(batch["low"], dtype=float), initial=pmin)
+        pmax = np.fmax.reduce(np.asarray(batch["high"], dtype=float), initial=pmax)
+    if not np.isfinite(pmin) or not np.isfinite(pmax) or pmax <= pmin:
+        return None, None
 
-    return centers, vp
+    edges = np.linspace(pmin, pmax, n_bins + 1)
+    centers = (edges[:-1] + edges[1:]) / 2
+    diff = np.zeros(n_bins + 1)
+    count = np.zeros(n_bins + 1, dtype=np.int64)
+    for batch in read_batches():
+        segments = ohlc_segments(batch["open"], batch["high"], batch["low"], batch["close"],
+                                 batch["volume"], body_w)
+        d, c = segment_diffs(*segments, edges)
+        diff += d
+        count += c
+    return centers, histogram_from_diffs(diff, count)
 
 
 def value_area(centers, vp, pct=0.70):
@@ -102,12 +128,9 @@ def find_peaks_simple(centers, vp, smooth=5, min_sep_bins=10, thr_q=0.85):
 
 def vp_features_compose(df:pd.DataFrame , fecha_inicio:str, freq:str="1H", n_bins:int=1000, body_w:float=0.70, va_pct:float=0.70):
     
-    df = df.copy()
-    df["dt"] = pd.to_datetime(df["time"], unit="s", utc=True)
-
-    df = df.sort_values("dt").set_index("dt")
-
-    df = df[df.index >= pd.Timestamp(fecha_inicio, tz="UTC")]
+    # Filtro sobre el array de time (sin copiar ni reindexar por fecha)
+    start = pd.Timestamp(fecha_inicio, tz="UTC").timestamp()
+    df = df[df["time"].to_numpy() >= start]
 
     if df.empty:
         return None
@@ -116,6 +139,19 @@ def vp_features_compose(df:pd.DataFrame , fecha_inicio:str, freq:str="1H", n_bin
     if centers is None:
         return None
     
+    return vp_summary(centers, vp, va_pct)
+
+
+def vp_features_stream(read_batches, n_bins:int=1000, body_w:float=0.70, va_pct:float=0.70):
+    """vp_features_compose sobre lotes (ver build_vp_stream); el filtro de fechas lo hace el lector."""
+    centers, vp = build_vp_stream(read_batches, n_bins=n_bins, body_w=body_w)
+    if centers is None:
+        return None
+    return vp_summary(centers, vp, va_pct)
+
+
+def vp_summary(centers, vp, va_pct=0.70):
+    """POC / value area / picos del histograma (dict de vp_features_compose)."""
     poc, val, vah = value_area(centers, vp, pct=va_pct)
 
     peaks = find_peaks_simple(centers, vp, smooth=7, min_sep_bins=15, thr_q=0.85)
@@ -128,4 +164,59 @@ def vp_features_compose(df:pd.DataFrame , fecha_inicio:str, freq:str="1H", n_bin
         "peaks": peaks
     }
 
-    
\ No newline at end of file
+    
+
+# ── Tramos por día (feature store) ────────────────────────────────────
+# La rejilla de build_vp_ohlc depende del rango de la ventana, así que sus
+# histogramas no se pueden sumar entre días. El store guarda los tramos de
+# cada día con su tipo; uniéndolos en el orden de ohlc_segments sobre la
+# ventana completa, segment_diffs reproduce build_vp_ohlc exactamente.
+
+def ohlc_segments(o, h, l, c, v, body_w=0.70, kinds=False):
+    """
+    Tramos (lo, hi, vol) de cuerpo y mechas de cada vela, con el reparto de
+    build_vp_ohlc. Con `kinds` agrega el tipo de cada tramo (0 cuerpo,
+    1 mecha superior, 2 mecha inferior) para `merge_segments`.
+    """
+    o, h, l, c, v = (np.asarray(x, dtype=float) for x in (o, h, l, c, v))
+    body_lo, body_hi = np.minimum(o, c), np.maximum(o, c)
+    up = np.maximum(0.0, h - body_hi)
+    dn = np.maximum(0.0, body_lo - l)
+    s = up + dn
+    with np.errstate(invalid="ignore", divide="ignore"):
+        f_up = np.where(s > 0, up / s, 0.0)
+        f_dn = np.where(s > 0, dn / s, 0.0)
+    wick_w = 1.0 - body_w
+
+    lo = np.concatenate([body_lo, body_hi, l])
+    hi = np.concatenate([body_hi, h, body_lo])
+    vol = np.concatenate([v * body_w, v * wick_w * f_up, v * wick_w * f_dn])
+    keep = (np.tile(v, 3) > 0) & (vol > 0) & (hi > lo)
+    if not kinds:
+        return lo[keep], hi[keep], vol[keep]
+    kind = np.repeat(np.arange(3, dtype=np.int8), len(v))
+    return lo[keep], hi[keep], vol[keep], kind[keep]
+
+
+def merge_segments(parts):
+    """
+    Une los tramos (lo, hi, vol, kind) de tramos de tiempo consecutivos, en
+    orden, como los daría ohlc_segments sobre todas sus velas juntas.
+    """
+    if not parts:
+        return np.empty(0), np.empty(0), np.empty(0)
+    lo, hi, vol, kind = (np.concatenate([np.asarray(p[i]) for p in parts]) for i in range(4))
+    order = np.argsort(kind, kind="stable")
+    return lo[order], hi[order], vol[order]
+
+
+def vp_features_from_segments(lo, hi, vol, pmin, pmax, n_bins=1000, va_pct=0.70):
+    """
+    Igual que vp_features_compose a partir de los tramos de la ventana
+    (merge_segments) y de su rango [pmin, pmax].
+    """
+    if not np.isfinite(pmin) or not np.isfinite(pmax) or pmax <= pmin:
+        return None
+    edges = np.linspace(pmin, pmax, n_bins + 1)
+    centers = (edges[:-1] + edges[1:]) / 2
+    return vp_summary(centers, histogram_from_diffs(*segment_diffs(lo, hi, vol, edges)), va_pct)
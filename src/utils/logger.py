@@ -1,26 +1,84 @@
-
 """"
 Uso:
     from utils.logger import get_logger
     log = get_logger(__name__)
     log.info("mensaje")
+    log.info("breakout", extra={"symbol": "US500", "stage": "monitor", "latency_s": 1.2})
+
+Configuración (.env):
+    LOG_QUEUE=1        los handlers (consola + archivo) corren en un hilo de
+                       fondo; el hilo que loguea solo encola el registro
+    LOG_FORMAT=json    el archivo se escribe como JSON por línea, con los
+                       campos de `extra` (symbol, stage, latency_s …)
 """
 
 import os
 import sys
+import json
+import queue
+import atexit
 import logging
 from pathlib import Path
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 
 _LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 _LOG_DIR = Path(__file__).resolve().parent.parent.parent / "logs"
 _LOG_FORMAT = "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s"
 _DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+_LOG_QUEUE = os.getenv("LOG_QUEUE", "0").lower() in ("1", "true", "yes")
+_LOG_JSON = os.getenv("LOG_FORMAT", "text").lower() == "json"
 _INITIALIZED = False
+_LISTENER: QueueListener | None = None
+
+# Atributos estándar de LogRecord: el resto viene de `extra`
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro: ts, level, logger, msg, thread + campos de `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(QueueHandler):
+    """Congela mensaje y traceback como texto, sin mezclarlos (el JSON los separa)."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def _stop_listener():
+    global _LISTENER
+    if _LISTENER is not None:
+        _LISTENER.stop()        # vacía la cola antes de salir
+        _LISTENER = None
 
 
 def _init_root():
-    """Configura root logger una sola vez (consola + archivo)."""
-    global _INITIALIZED
+    """Configura root logger una sola vez (consola + archivo, directo o vía cola)."""
+    global _INITIALIZED, _LISTENER
     if _INITIALIZED:
         return
     _INITIALIZED = True
@@ -34,7 +92,6 @@ def _init_root():
     console = logging.StreamHandler(sys.stdout)
     console.setLevel(logging.DEBUG)
     console.setFormatter(logging.Formatter(_LOG_FORMAT, _DATE_FORMAT))
-    root.addHandler(console)
 
     # ── Archivo rotativo ──────────────────────────────────────────
     from logging.handlers import RotatingFileHandler
@@ -46,8 +103,19 @@ def _init_root():
         encoding="utf-8",
     )
     file_h.setLevel(logging.DEBUG)
-    file_h.setFormatter(logging.Formatter(_LOG_FORMAT, _DATE_FORMAT))
-    root.addHandler(file_h)
+    file_h.setFormatter(JsonFormatter() if _LOG_JSON else logging.Formatter(_LOG_FORMAT, _DATE_FORMAT))
+
+    if _LOG_QUEUE:
+        # El hilo que loguea solo encola; E/S de consola, disco y rotación
+        # ocurren en el hilo del listener
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        root.addHandler(_QueueHandler(log_queue))
+        _LISTENER = QueueListener(log_queue, console, file_h, respect_handler_level=True)
+        _LISTENER.start()
+        atexit.register(_stop_listener)
+    else:
+        root.addHandler(console)
+        root.addHandler(file_h)
 
     # Silenciar loggers ruidosos
     for noisy in ("httpx", "httpcore", "urllib3", "openai", "litellm"):
@@ -0,0 +1,261 @@
+"""
+Registro de métricas en proceso con exportación en formato Prometheus.
+
+Contadores, gauges e histogramas con labels, thread-safe y sin
+dependencias. Se exponen por:
+    METRICS_PORT=9108           endpoint HTTP local /metrics (0 = off)
+    METRICS_TEXTFILE=/ruta.prom fichero para el textfile collector de
+                                node_exporter (se reescribe cada
+                                METRICS_FLUSH_S y al final de cada corrida)
+
+Uso:
+    from utils import metrics
+    HTTP = metrics.counter("broker_http_requests_total", "Peticiones HTTP", ["endpoint", "status"])
+    HTTP.inc(endpoint="/api/v1/session", status="200")
+    metrics.start_exporter()          # una vez por proceso
+"""
+
+import os
+import math
+import time
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", "")
+METRICS_FLUSH_S = float(os.getenv("METRICS_FLUSH_S", "15"))
+
+# Buckets de latencia (s): de llamadas locales a timeouts de la API
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_: str, labels: list[str] | tuple = ()):
+        self.name = name
+        self.help = help_
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name}: labels {sorted(labels)} != {sorted(self.labels)}")
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_value(v)}"
+                                 for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_: str, labels: list[str] | tuple = (),
+                 buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Context manager que observa la duración del bloque."""
+        return _Timer(self, labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, (list(s[0]), s[1], s[2])) for k, s in self._values.items()]
+        lines = self._header()
+        for key, (counts, total, n) in items:
+            acc = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                acc += c
+                le = 'le="%s"' % _fmt_value(bound)
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {acc}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {n}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "t0")
+
+    def __init__(self, hist: Histogram, labels: dict):
+        self.hist = hist
+        self.labels = labels
+        self.t0 = 0.0
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0, **self.labels)
+        return False
+
+
+# ── Registro ───────────────────────────────────────────────────────────
+
+_registry: dict[str, _Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name: str, help_: str, labels=(), **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help_, labels, **kwargs)
+        elif not isinstance(metric, cls) or metric.labels != tuple(labels):
+            raise ValueError(f"Métrica {name} ya registrada con otro tipo o labels")
+        return metric
+
+
+def counter(name: str, help_: str, labels=()) -> Counter:
+    return _register(Counter, name, help_, labels)
+
+
+def gauge(name: str, help_: str, labels=()) -> Gauge:
+    return _register(Gauge, name, help_, labels)
+
+
+def histogram(name: str, help_: str, labels=(), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram, name, help_, labels, buckets=buckets)
+
+
+def render() -> str:
+    """Todas las métricas en formato de texto Prometheus 0.0.4."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for m in metrics:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: str | None = None) -> str | None:
+    """Escribe render() de forma atómica (tmp + rename) para node_exporter."""
+    path = path or METRICS_TEXTFILE
+    if not path:
+        return None
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+    return path
+
+
+# ── Exportadores ───────────────────────────────────────────────────────
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+_exporter_started = False
+_exporter_lock = threading.Lock()
+
+
+def _flush_loop(path: str, every: float):
+    while True:
+        time.sleep(every)
+        try:
+            write_textfile(path)
+        except OSError as e:
+            log.warning("[metrics] no se pudo escribir %s → %s", path, e)
+
+
+def start_exporter(port: int | None = None, textfile: str | None = None):
+    """Arranca (una sola vez) el endpoint HTTP y/o el volcado periódico a textfile."""
+    global _exporter_started
+    port = METRICS_PORT if port is None else port
+    textfile = textfile if textfile is not None else METRICS_TEXTFILE
+    with _exporter_lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+    if port:
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, port), _MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            log.info("[metrics] endpoint http://%s:%d/metrics", METRICS_HOST, port)
+        except OSError as e:
+            log.warning("[metrics] no se pudo abrir el puerto %d → %s", port, e)
+    if textfile:
+        threading.Thread(target=_flush_loop, args=(textfile, METRICS_FLUSH_S),
+                         name="metrics-textfile", daemon=True).start()
+        log.info("[metrics] textfile %s cada %.0fs", textfile, METRICS_FLUSH_S)
@@ -0,0 +1,146 @@
+"""
+Rate limiter de token bucket compartido por hilos y corutinas.
+
+Cada petición reserva un token de los buckets que le aplican (host y
+endpoint) y espera lo que falte para que haya saldo: con time.sleep en
+código sync o asyncio.sleep en async, sin retener el lock durante la espera.
+Así los chunks concurrentes, los monitores y los logins salen al ritmo
+máximo sostenible en lugar de chocar con 429.
+
+Configuración (.env):
+    RATE_LIMITS="*=10/s,/api/v1/session=30/m,/api/v3/auth/key=30/m"
+
+Cada regla es `clave=N/s` o `clave=N/m`, con ráfaga opcional `:B`
+(ej. `*=10/s:20`); sin ráfaga las peticiones salen espaciadas 1/N s, que
+es lo que tolera un límite de ventana deslizante como el de Capital.com.
+
+La clave es `*` (cualquier host), un host (`api-capital.backend-capital.com`),
+un endpoint (`/api/v1/session`) o ambos (`host/api/v1/session`). Los buckets
+son por host: un endpoint limitado en Capital.com no consume cupo de
+SimpleFX. RATE_LIMITS vacío desactiva el limitador.
+
+Uso:
+    from utils import rate_limit
+    rate_limit.acquire(host, "/api/v1/prices/{epic}")
+    await rate_limit.acquire_async(host, "/api/v1/prices/{epic}")
+    rate_limit.penalize(host, endpoint, retry_after)   # 429: todos esperan
+"""
+
+import os
+import time
+import asyncio
+import threading
+
+from utils.logger import get_logger
+from utils import metrics
+
+log = get_logger(__name__)
+
+RATE_LIMITS = os.getenv("RATE_LIMITS", "*=10/s,/api/v1/session=30/m,/api/v3/auth/key=30/m")
+
+WAITS = metrics.histogram(
+    "rate_limit_wait_seconds", "Espera impuesta por el rate limiter", ["key"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+
+
+class TokenBucket:
+    """`rate` tokens/s con capacidad `capacity`; el saldo puede quedar negativo (reservas)."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, n: float = 1.0) -> float:
+        """Consume `n` tokens y devuelve los segundos a esperar antes de usarlos."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= n
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def pause(self, seconds: float):
+        """Vacía el bucket durante `seconds` (ej. el servidor respondió 429)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+def _parse(spec: str) -> list[tuple[str, float, float]]:
+    """"*=10/s:20,/api/v1/session=30/m" → [(clave, tokens/s, ráfaga), ...]"""
+    rules = []
+    for item in filter(None, (p.strip() for p in spec.split(","))):
+        try:
+            key, value = item.rsplit("=", 1)
+            value, _, burst = value.partition(":")
+            count, _, unit = value.partition("/")
+            rate = float(count) / {"s": 1, "m": 60, "h": 3600}[unit.strip() or "s"]
+            capacity = float(burst) if burst else 1.0
+        except (ValueError, KeyError):
+            log.warning("[rate_limit] regla inválida ignorada: %r", item)
+            continue
+        if rate > 0:
+            rules.append((key.strip(), rate, capacity))
+    return rules
+
+
+_RULES = _parse(RATE_LIMITS)
+_buckets: dict[tuple[str, str], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def _matches(key: str, host: str, endpoint: str) -> bool:
+    if key == "*" or key == host or key == endpoint:
+        return True
+    return key.startswith(host + "/") and key[len(host):] == endpoint
+
+
+def buckets(host: str, endpoint: str) -> list[tuple[str, TokenBucket]]:
+    """Buckets (clave, bucket) que aplican a la petición; se crean al primer uso."""
+    found = []
+    with _buckets_lock:
+        for key, rate, capacity in _RULES:
+            if not _matches(key, host, endpoint):
+                continue
+            bucket = _buckets.get((host, key))
+            if bucket is None:
+                bucket = _buckets[(host, key)] = TokenBucket(rate, capacity)
+            found.append((key, bucket))
+    return found
+
+
+def _reserve(host: str, endpoint: str) -> float:
+    wait = 0.0
+    for key, bucket in buckets(host, endpoint):
+        w = bucket.reserve()
+        if w > 0:
+            WAITS.observe(w, key=key)
+        wait = max(wait, w)
+    return wait
+
+
+def acquire(host: str, endpoint: str) -> float:
+    """Bloquea el hilo hasta tener cupo; devuelve los segundos esperados."""
+    wait = _reserve(host, endpoint)
+    if wait:
+        time.sleep(wait)
+    return wait
+
+
+async def acquire_async(host: str, endpoint: str) -> float:
+    """Igual que `acquire` sin bloquear el event loop."""
+    wait = _reserve(host, endpoint)
+    if wait:
+        await asyncio.sleep(wait)
+    return wait
+
+
+def penalize(host: str, endpoint: str, seconds: float):
+    """Frena todos los buckets de la petición `seconds` (Retry-After de un 429)."""
+    for _, bucket in buckets(host, endpoint):
+        bucket.pause(seconds)
@@ -1,38 +1,238 @@
+"""
+Reintentos con backoff exponencial para llamadas a APIs.
+
+- Full jitter: cada espera es uniforme en [0, min(max_delay, delay)], así los
+  hilos que fallan a la vez no reintentan todos juntos.
+- `deadline`: tiempo total (s) que una llamada puede pasar reintentando; si
+  la próxima espera lo supera, se abandona en el acto.
+- Presupuesto por corrida (RETRY_BUDGET_S): segundos de espera que todas
+  las llamadas de una corrida pueden consumir; agotado, los errores se
+  propagan sin reintentar. `with run_budget():` abre el de la corrida en un
+  contextvar (los hilos lanzados con contextvars.copy_context lo heredan),
+  así dos corridas simultáneas del modo servicio no comparten presupuesto.
+  Las llamadas con `budget=False` (órdenes) no lo consumen ni lo necesitan.
+- Clasificación HTTP: un 4xx no se reintenta salvo 408 y 429; 5xx y errores
+  de red sí. `Retry-After` (segundos o fecha HTTP) fija la espera mínima.
+- `CircuitOpenError` (broker_api.transport) nunca se reintenta.
+
+Configuración (.env):
+    RETRY_MAX_DELAY=30     tope de cada espera (s)
+    RETRY_BUDGET_S=600     espera total por corrida (s); 0 = sin límite
+"""
+
+import os
 import time
+import random
+import asyncio
 import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
 from utils.logger import get_logger
+from utils import metrics
 
 log = get_logger(__name__)
 
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "30"))
+RETRY_BUDGET_S = float(os.getenv("RETRY_BUDGET_S", "600"))
+
+RETRIES = metrics.counter("retry_attempts_total", "Intentos fallidos reintentados", ["func"])
+EXHAUSTED = metrics.counter("retry_exhausted_total", "Llamadas que agotaron los reintentos", ["func"])
+GIVEUPS = metrics.counter("retry_giveup_total", "Llamadas abandonadas antes de agotar intentos",
+                          ["func", "reason"])
+ATTEMPTS = metrics.histogram("retry_attempts_per_call", "Intentos usados por llamada", ["func"],
+                             buckets=(1, 2, 3, 5, 10, 20))
+
+class RetryBudget:
+    """Segundos de espera en reintentos que puede consumir una corrida."""
+
+    def __init__(self, seconds: float = RETRY_BUDGET_S):
+        self.seconds = seconds
+        self.spent = 0.0
+        self._lock = threading.Lock()
+
+    def take(self, seconds: float) -> bool:
+        """Reserva `seconds` del presupuesto; False si no alcanza."""
+        if self.seconds <= 0:
+            return True
+        with self._lock:
+            if self.spent + seconds > self.seconds:
+                return False
+            self.spent += seconds
+            return True
+
+
+# Fuera de una corrida (scripts, tests) rige un presupuesto del proceso
+_process_budget = RetryBudget()
+_budget: contextvars.ContextVar[RetryBudget | None] = contextvars.ContextVar(
+    "retry_budget", default=None)
+
+
+@contextmanager
+def run_budget(seconds: float = RETRY_BUDGET_S):
+    """Presupuesto propio para el bloque (una corrida); retorna el RetryBudget."""
+    budget = RetryBudget(seconds)
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+
+def _take_budget(seconds: float) -> bool:
+    return (_budget.get() or _process_budget).take(seconds)
+
+
+# ── Clasificación ──────────────────────────────────────────────────────
+
+def _response(exc):
+    # requests.Response es falsy con status >= 400: comparar con None
+    resp = getattr(exc, "response", None)
+    return resp if resp is not None and hasattr(resp, "status_code") else None
+
+
+def retryable(exc: BaseException) -> bool:
+    """4xx (salvo 408/429) y circuito abierto → no; red, 5xx y resto → sí."""
+    if getattr(exc, "circuit_open", False):
+        return False
+    resp = _response(exc)
+    if resp is None:
+        return True
+    status = resp.status_code
+    return not (400 <= status < 500) or status in (408, 429)
+
+
+def retry_after(exc: BaseException) -> float | None:
+    """Segundos pedidos por el header Retry-After de la respuesta, si lo hay."""
+    resp = _response(exc)
+    return parse_retry_after(resp.headers) if resp is not None else None
+
+
+def parse_retry_after(headers) -> float | None:
+    """Retry-After en segundos: valor numérico o fecha HTTP; None si falta o no se entiende."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class _Policy:
+    """Estado de los reintentos de una llamada: decide la próxima espera."""
+
+    def __init__(self, name, max_retries, backoff, initial_delay, max_delay, deadline, budget):
+        self.name = name
+        self.budget = budget
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.delay = initial_delay
+        self.max_delay = max_delay
+        self.expires = time.monotonic() + deadline if deadline else None
+
+    def next_delay(self, attempt: int, exc: BaseException) -> float | None:
+        """Segundos a esperar antes del próximo intento, o None para abandonar."""
+        if not retryable(exc):
+            return self._give_up("status", exc)
+        if attempt > self.max_retries:
+            return None
+        wait = random.uniform(0, min(self.max_delay, self.delay))
+        self.delay *= self.backoff
+        hinted = retry_after(exc)
+        if hinted is not None:
+            wait = max(wait, hinted)
+        if self.expires is not None and time.monotonic() + wait > self.expires:
+            return self._give_up("deadline", exc)
+        if self.budget and not _take_budget(wait):
+            return self._give_up("budget", exc)
+        return wait
+
+    def _give_up(self, reason: str, exc: BaseException):
+        GIVEUPS.inc(func=self.name, reason=reason)
+        log.error("%s abandona (%s): %s", self.name, reason, exc)
+        return None
+
 
 def retry(
     max_retries: int = 3,
     backoff: float = 2.0,
     initial_delay: float = 1.0,
     exceptions: tuple = (Exception,),
+    max_delay: float = RETRY_MAX_DELAY,
+    deadline: float | None = None,
+    budget: bool = True,
 ):
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            delay = initial_delay
-            last_exc = None
+            policy = _Policy(func.__name__, max_retries, backoff, initial_delay, max_delay,
+                             deadline, budget)
             for attempt in range(1, max_retries + 2):  # +2 = intento original + retries
                 try:
-                    return func(*args, **kwargs)
+                    result = func(*args, **kwargs)
+                    ATTEMPTS.observe(attempt, func=func.__name__)
+                    return result
                 except exceptions as e:
-                    last_exc = e
-                    if attempt > max_retries:
-                        break
+                    wait = policy.next_delay(attempt, e)
+                    if wait is None:
+                        _exhausted(func.__name__, attempt, max_retries, e)
+                        raise
+                    RETRIES.inc(func=func.__name__)
                     log.warning(
                         "%s intento %d/%d falló: %s → reintentando en %.1fs",
-                        func.__name__, attempt, max_retries + 1, e, delay,
+                        func.__name__, attempt, max_retries + 1, e, wait,
                     )
-                    time.sleep(delay)
-                    delay *= backoff
-            log.error(
-                "%s agotó %d intentos. Último error: %s",
-                func.__name__, max_retries + 1, last_exc,
-            )
-            raise last_exc  # type: ignore[misc]
+                    time.sleep(wait)
         return wrapper
     return decorator
+
+
+def async_retry(
+    max_retries: int = 3,
+    backoff: float = 2.0,
+    initial_delay: float = 1.0,
+    exceptions: tuple = (Exception,),
+    max_delay: float = RETRY_MAX_DELAY,
+    deadline: float | None = None,
+    budget: bool = True,
+):
+    """Equivalente de `retry` para corutinas: espera con asyncio.sleep sin bloquear el loop."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            policy = _Policy(func.__name__, max_retries, backoff, initial_delay, max_delay,
+                             deadline, budget)
+            for attempt in range(1, max_retries + 2):
+                try:
+                    result = await func(*args, **kwargs)
+                    ATTEMPTS.observe(attempt, func=func.__name__)
+                    return result
+                except exceptions as e:
+                    wait = policy.next_delay(attempt, e)
+                    if wait is None:
+                        _exhausted(func.__name__, attempt, max_retries, e)
+                        raise
+                    RETRIES.inc(func=func.__name__)
+                    log.warning(
+                        "%s intento %d/%d falló: %s → reintentando en %.1fs",
+                        func.__name__, attempt, max_retries + 1, e, wait,
+                    )
+                    await asyncio.sleep(wait)
+        return wrapper
+    return decorator
+
+
+def _exhausted(name: str, attempt: int, max_retries: int, exc: BaseException):
+    ATTEMPTS.observe(attempt, func=name)
+    if attempt > max_retries:
+        EXHAUSTED.inc(func=name)
+        log.error("%s agotó %d intentos. Último error: %s", name, max_retries + 1, exc)
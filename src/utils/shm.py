@@ -0,0 +1,112 @@
+"""
+Arrays numpy y tablas Arrow en memoria compartida para pools de procesos.
+
+El proceso padre copia los datos una sola vez a un bloque SharedMemory y
+pasa a los workers solo el handle (nombre, shape, dtype / tamaño); los
+workers leen sin pickle.
+
+Uso:
+    handles, blocks = share_arrays({"time": t, "close": c})
+    ...  # pasar `handles` al initializer del pool
+    arrays, views = attach_arrays(handles)      # en el worker
+    release(blocks)                             # en el padre al terminar
+
+    ref, block = share_frame(df)                # DataFrame → Arrow IPC
+    df = read_frame(ref)                        # en el worker
+"""
+
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    name: str
+    shape: tuple
+    dtype: str
+
+
+def share_arrays(arrays: dict[str, np.ndarray]) -> tuple[dict[str, SharedArray], list[SharedMemory]]:
+    """Copia cada array a memoria compartida. Retorna (handles, bloques a liberar)."""
+    handles, blocks = {}, []
+    for key, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        shm = SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        handles[key] = SharedArray(shm.name, arr.shape, arr.dtype.str)
+        blocks.append(shm)
+    return handles, blocks
+
+
+def _attach(name: str) -> SharedMemory:
+    try:
+        return SharedMemory(name=name, track=False)     # Python >= 3.13
+    except TypeError:
+        return SharedMemory(name=name)
+
+
+def attach_arrays(handles: dict[str, SharedArray]) -> tuple[dict[str, np.ndarray], list[SharedMemory]]:
+    """
+    Vistas de solo lectura sobre los bloques compartidos. Mantener la lista
+    de SharedMemory viva mientras se usen las vistas.
+    """
+    arrays, blocks = {}, []
+    for key, h in handles.items():
+        shm = _attach(h.name)
+        view = np.ndarray(h.shape, dtype=np.dtype(h.dtype), buffer=shm.buf)
+        view.flags.writeable = False
+        arrays[key] = view
+        blocks.append(shm)
+    return arrays, blocks
+
+
+def release(blocks: list[SharedMemory]):
+    """Cierra y elimina los bloques creados por `share_arrays`."""
+    for shm in blocks:
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+@dataclass(frozen=True)
+class SharedFrame:
+    name: str
+    size: int
+
+
+def share_frame(df: pd.DataFrame) -> tuple[SharedFrame, SharedMemory]:
+    """Serializa `df` como stream Arrow IPC en un bloque compartido."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Primero medir el stream, luego escribir directo sobre el bloque
+    mock = pa.MockOutputStream()
+    with pa.ipc.new_stream(mock, table.schema) as writer:
+        writer.write_table(table)
+    size = mock.size()
+
+    shm = SharedMemory(create=True, size=max(size, 1))
+    sink = pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf))
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    sink.close()
+    return SharedFrame(shm.name, size), shm
+
+
+def read_frame(ref: SharedFrame) -> pd.DataFrame:
+    """Lee un SharedFrame sin copiar el buffer Arrow; solo convierte a pandas."""
+    shm = _attach(ref.name)
+    try:
+        reader = pa.ipc.open_stream(pa.py_buffer(shm.buf[:ref.size]))
+        df = reader.read_all().to_pandas()
+        del reader
+        return df
+    finally:
+        try:
+            shm.close()
+        except BufferError:
+            pass
@@ -0,0 +1,228 @@
+"""
+Spans de tiempo por etapa y exportación de la traza de cada corrida.
+
+Desactivado por defecto (coste ~nulo); se activa con TRACE=1. Cada span
+registra nombre, inicio, duración, hilo y atributos. Al final de la
+corrida `export()` escribe:
+    logs/traces/{run}.trace.json   formato Chrome trace (chrome://tracing, Perfetto)
+    logs/traces/{run}.jsonl        un span por línea
+y `log_summary()` imprime la tabla por nombre (n, total, media, p95, máx).
+
+Uso:
+    from utils.tracing import span, traced
+
+    with span("parquet.load", symbol=symb):
+        ...
+
+    @traced("crew.kickoff")
+    def kickoff(...): ...
+
+Cada span lleva el id de la corrida en curso (`run_scope`, contextvar que
+heredan los hilos lanzados con contextvars.copy_context): en modo servicio
+dos sesiones simultáneas, o un warm-up y una corrida, exportan y limpian
+solo sus propios spans.
+
+Los spans de procesos worker (FEATURE_EXECUTOR=processes) no se recogen:
+solo se traza el proceso principal.
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+import functools
+import contextvars
+from pathlib import Path
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+
+import numpy as np
+
+from utils.logger import get_logger
+
+log = get_logger(__name__)
+
+TRACE = os.getenv("TRACE", "0").lower() in ("1", "true", "yes")
+TRACE_DIR = Path(os.getenv(
+    "TRACE_DIR", Path(__file__).resolve().parent.parent.parent / "logs" / "traces"
+))
+
+_EPOCH_NS = time.perf_counter_ns()
+_EPOCH_WALL_US = time.time_ns() // 1000
+_lock = threading.Lock()
+_spans: list["SpanRecord"] = []
+_parent: contextvars.ContextVar[str | None] = contextvars.ContextVar("trace_parent", default=None)
+_run: contextvars.ContextVar[str | None] = contextvars.ContextVar("trace_run", default=None)
+
+
+@dataclass
+class SpanRecord:
+    name: str
+    start_us: int           # desde el inicio del proceso
+    dur_us: int
+    thread: str
+    tid: int
+    parent: str | None = None
+    run: str | None = None
+    attrs: dict = field(default_factory=dict)
+
+
+@contextmanager
+def run_scope(run_id: str | None = None):
+    """
+    Corrida a la que pertenecen los spans del bloque. Sin `run_id` se
+    mantiene la corrida que ya esté abierta (ej. la del dispatch del
+    servicio) o se crea una nueva. Retorna el id.
+    """
+    run_id = run_id or _run.get() or uuid.uuid4().hex[:12]
+    token = _run.set(run_id)
+    try:
+        yield run_id
+    finally:
+        _run.reset(token)
+
+
+def current_run() -> str | None:
+    return _run.get()
+
+
+class span:
+    """Context manager que mide un bloque si TRACE está activo (para funciones, `traced`)."""
+
+    __slots__ = ("name", "attrs", "_t0", "_token")
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self._t0 = 0
+        self._token = None
+
+    def set(self, **attrs):
+        """Añade atributos conocidos al final del bloque (ej. status, filas)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        if TRACE:
+            self._token = _parent.set(self.name)
+            self._t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not TRACE or self._token is None:
+            return False
+        t1 = time.perf_counter_ns()
+        _parent.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        th = threading.current_thread()
+        record = SpanRecord(
+            name=self.name,
+            start_us=(self._t0 - _EPOCH_NS) // 1000,
+            dur_us=(t1 - self._t0) // 1000,
+            thread=th.name, tid=th.ident or 0,
+            parent=_parent.get(),
+            run=_run.get(),
+            attrs={k: v for k, v in self.attrs.items() if v is not None},
+        )
+        with _lock:
+            _spans.append(record)
+        return False
+
+
+def traced(name: str | None = None):
+    """Decorador: un span por llamada con el nombre dado (o módulo.función)."""
+    def deco(fn):
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACE:
+                return fn(*args, **kwargs)
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def spans(run: str | None = None) -> list[SpanRecord]:
+    """Spans acumulados: todos, o solo los de la corrida `run`."""
+    with _lock:
+        return [r for r in _spans if run is None or r.run == run]
+
+
+def reset(run: str | None = None):
+    """Descarta todos los spans, o solo los de la corrida `run`."""
+    with _lock:
+        if run is None:
+            _spans.clear()
+        else:
+            _spans[:] = [r for r in _spans if r.run != run]
+
+
+def summary(records: list[SpanRecord] | None = None) -> list[dict]:
+    """Agregado por nombre, ordenado por tiempo total descendente."""
+    records = spans() if records is None else records
+    by_name: dict[str, list[int]] = {}
+    for r in records:
+        by_name.setdefault(r.name, []).append(r.dur_us)
+    rows = []
+    for name, durs in by_name.items():
+        d = np.asarray(durs, dtype=float) / 1e6
+        rows.append({
+            "name": name, "count": int(d.size), "total_s": round(float(d.sum()), 4),
+            "mean_s": round(float(d.mean()), 4), "p95_s": round(float(np.percentile(d, 95)), 4),
+            "max_s": round(float(d.max()), 4),
+        })
+    return sorted(rows, key=lambda r: r["total_s"], reverse=True)
+
+
+def log_summary(top: int = 30, run: str | None = None):
+    """Tabla por nombre de los spans de `run` (por defecto la corrida en curso)."""
+    rows = summary(spans(run or _run.get()))
+    if not rows:
+        return
+    log.info("[trace] %-42s %6s %10s %9s %9s %9s", "span", "n", "total_s", "media_s", "p95_s", "máx_s")
+    for r in rows[:top]:
+        log.info("[trace] %-42s %6d %10.3f %9.4f %9.4f %9.4f",
+                 r["name"][:42], r["count"], r["total_s"], r["mean_s"], r["p95_s"], r["max_s"])
+
+
+def export(run_name: str | None = None, directory: Path | str | None = None,
+           clear: bool = True, run: str | None = None) -> tuple[str, str] | None:
+    """
+    Escribe Chrome trace + JSONL de los spans de `run` (por defecto la
+    corrida en curso; fuera de una corrida, todos). Retorna (trace, jsonl).
+    """
+    run = run or _run.get()
+    records = spans(run)
+    if not records:
+        return None
+    directory = Path(directory or TRACE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    run_name = run_name or datetime.now(timezone.utc).strftime("run_%Y%m%dT%H%M%S")
+    pid = os.getpid()
+
+    events = [{
+        "name": r.name, "cat": r.name.split(".", 1)[0], "ph": "X",
+        "ts": r.start_us, "dur": r.dur_us, "pid": pid, "tid": r.tid,
+        "args": {**r.attrs, **({"parent": r.parent} if r.parent else {})},
+    } for r in records]
+    events += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+               for tid, name in {r.tid: r.thread for r in records}.items()]
+
+    trace_file = directory / f"{run_name}.trace.json"
+    with open(trace_file, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                   "otherData": {"epoch_unix_us": _EPOCH_WALL_US}}, f, default=str)
+
+    jsonl_file = directory / f"{run_name}.jsonl"
+    with open(jsonl_file, "w", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(asdict(r), default=str) + "\n")
+
+    if clear:
+        reset(run)
+    log.info("[trace] %d spans -> %s", len(records), trace_file)
+    return str(trace_file), str(jsonl_file)
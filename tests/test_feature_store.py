@@ -0,0 +1,97 @@
+"""
+El feature store debe dar las mismas features que el cálculo crudo de
+process_pipeline sobre las mismas velas: VP exacto, RSI y picos/valles
+(el RSI encadenado difiere del de la ventana solo por el calentamiento).
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocess import feature_store
+from tools_bot.utils_trading_vp import vp_features_compose, vp_features_from_segments
+
+DAY = 86400
+T0 = 1_700_006_400          # 2023-11-15 00:00 UTC (miércoles)
+NOW = T0 + 30 * DAY         # todos los días de prueba ya cerrados
+
+
+def candles(days: int = 6, seed: int = 7) -> pd.DataFrame:
+    """Velas de 1 min con sábado y domingo sin mercado."""
+    rng = np.random.default_rng(seed)
+    t = T0 + np.arange(days * 1440, dtype=np.int64) * 60
+    weekday = pd.to_datetime(t, unit="s").weekday
+    t = t[weekday < 5]
+    close = 4500 + np.cumsum(rng.normal(0, 0.5, t.size)).round(2)
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) + rng.exponential(0.3, t.size).round(2)
+    low = np.minimum(open_, close) - rng.exponential(0.3, t.size).round(2)
+    volume = rng.integers(0, 200, t.size).astype(float)
+    return pd.DataFrame({"time": t, "open": open_, "high": high, "low": low,
+                         "close": close, "volume": volume})
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_store, "FEATURE_STORE_PATH", str(tmp_path))
+    monkeypatch.setattr(feature_store, "FEATURE_STORE", True)
+    return tmp_path
+
+
+def _iso(unix: int) -> str:
+    return pd.Timestamp(unix, unit="s", tz="UTC").strftime("%Y-%m-%d %H:%M:%S")
+
+
+@pytest.mark.parametrize("start, end", [
+    (T0 + 9 * 3600 + 17 * 60, T0 + 5 * DAY + 14 * 3600),   # inicio y final parciales
+    (T0 + DAY, T0 + 4 * DAY - 1),                          # solo días completos
+    (T0 + 2 * DAY + 600, T0 + 5 * DAY + 1200),             # fin de semana en medio
+])
+def test_vp_matches_raw(store, start, end):
+    df = candles()
+    feature_store.update_vp("US500", df, T0, T0 + 6 * DAY - 1, now=NOW)
+
+    plan = feature_store.plan_vp("US500", start, end)
+    times = df["time"].to_numpy()
+    raw = [(a, df[(times >= a) & (times <= b)]) for a, b in plan.raw_ranges]
+    segments, pmin, pmax = feature_store.vp_segments(plan, raw)
+    from_store = vp_features_from_segments(*segments, pmin, pmax)
+
+    expected = vp_features_compose(df[times <= end], _iso(start))
+    assert not plan.days.empty
+    assert from_store == expected
+
+
+def test_vp_without_stored_days(store):
+    df = candles(days=2)
+    start, end = int(df["time"].iloc[10]), int(df["time"].iloc[-10])
+    plan = feature_store.plan_vp("US500", start, end)
+    times = df["time"].to_numpy()
+    raw = [(a, df[(times >= a) & (times <= b)]) for a, b in plan.raw_ranges]
+    segments, pmin, pmax = feature_store.vp_segments(plan, raw)
+    assert vp_features_from_segments(*segments, pmin, pmax) == \
+        vp_features_compose(df[times <= end], _iso(start))
+
+
+def test_rsi_and_pivots_match_raw(store):
+    pytest.importorskip("pandas_ta")
+    from preprocess.process_pipeline import FEATURE_LOOKBACK, RSI_WARMUP, compute_features
+
+    df = candles(days=8)
+    end = int(df["time"].iloc[-1]) - 3 * 3600              # sesión en curso: cola cruda
+    closed = (end // DAY) * DAY - 1
+    feature_store.update_days("US500", "MINUTE", df[df["time"] <= closed],
+                              int(df["time"].iloc[0]), closed, "08:00", "09:55",
+                              RSI_WARMUP, now=NOW)
+    state = feature_store.rsi_state("US500", "MINUTE", end)
+    assert state is not None
+    tail = df[(df["time"] > state["last_time"]) & (df["time"] <= end)]
+    rsi_last, points = feature_store.rsi_features(
+        state, tail, FEATURE_LOOKBACK["rsi"].horizon("MINUTE"))
+
+    raw = compute_features(df[df["time"] <= end], None, _iso(end), "MINUTE")
+    assert rsi_last == pytest.approx(raw["rsi_last"], abs=1e-6)
+    assert [(p["time"], p["type"]) for p in points] == \
+        [(p["time"], p["type"]) for p in raw["rsi_points"]]
+    assert [p["rsi"] for p in points] == pytest.approx([p["rsi"] for p in raw["rsi_points"]],
+                                                        abs=1e-6)